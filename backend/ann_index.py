@@ -0,0 +1,546 @@
+"""
+Fábrica do índice vetorial FAISS e parâmetros de busca aproximada (ANN).
+
+O tipo de índice vem de FAISS_INDEX_FACTORY, no formato do
+faiss.index_factory (sempre com produto interno sobre vetores normalizados):
+- "Flat": busca exata (padrão; custo linear no número de chunks)
+- "HNSW32": grafo HNSW com 32 vizinhos por nó; sem treino, aceita inserções
+- "IVF256,Flat": 256 listas invertidas; precisa de treino (k-means) com
+  pelo menos ~39 vetores por lista para centróides estáveis
+
+- "SQfp16" / "SQ8": quantização escalar, 2 ou 1 byte por dimensão (1/2 e
+  1/4 do Flat); o SQ8 treina só os limites de cada dimensão
+- "PQ48": quantização por produto, 48 bytes por vetor (1/32 do Flat);
+  precisa de pelo menos 256 vetores de treino (centróides por subespaço)
+- combinações: "HNSW32,SQ8", "IVF256,PQ48"...
+
+Na ingestão, os vetores originais ficam em vectors.npy ao lado do índice: é
+deles que um índice que precisa de treino é reconstruído (re-treinado a cada
+ingestão, acompanhando o crescimento do acervo), e é com eles que a checagem
+de recall monta a busca exata de referência.
+
+Re-score (FAISS_RESCORE_FACTOR > 1, só para índices com perda): o índice
+quantizado devolve top_k × fator candidatos, reordenados pelo produto interno
+exato lido de vectors.npy via mmap. Só as linhas dos candidatos saem do disco,
+e o cache de páginas é compartilhado entre os workers.
+
+Parâmetros de busca (sem alterar o índice compartilhado entre threads):
+- efSearch (HNSW): candidatos explorados; maior = mais recall, mais lento
+- nprobe (IVF): listas visitadas por busca
+Padrões em FAISS_EF_SEARCH / FAISS_NPROBE; uma requisição pode sobrescrever
+com `ef_search` / `nprobe` no corpo do /ask (ficam num contextvar, como o
+StageTimer, e chegam à thread do executor de retrieval).
+
+Busca binária em dois estágios (DENSE_RETRIEVER=binary): os vetores de
+vectors.npy viram 1 bit por dimensão (sinal) num IndexBinaryFlat em memória
+(48 bytes por vetor, 1/32 do Flat); a distância de Hamming escolhe
+BINARY_CANDIDATES candidatos, re-pontuados pelo produto interno exato (mmap).
+O índice binário é montado na primeira busca e refeito quando vectors.npy muda.
+Nesse modo o index.faiss não é carregado pela API (só os metadados); sem
+vectors.npy, a busca volta ao índice FAISS com um aviso.
+
+CLI:
+    python -m backend.ann_index rebuild --spec HNSW32
+    python -m backend.ann_index recall --nprobe 1,4,16,64
+    python -m backend.ann_index bench --specs Flat SQfp16 SQ8 PQ48 HNSW32,SQ8 --rescore 0,4
+    python -m backend.ann_index bench --specs Flat binary --candidates 50,100,200
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Optional
+
+import faiss
+import numpy as np
+
+from . import settings
+from .tracing import get_logger
+
+logger = get_logger(__name__)
+
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2
+VECTORS_FILE = "vectors.npy"
+# Vetores de treino por lista invertida abaixo dos quais o k-means do IVF fica instável
+MIN_TRAIN_PER_LIST = 39
+
+_request_params: ContextVar[Optional[dict]] = ContextVar("ann_search_params", default=None)
+# vectors.npy abertos via mmap: caminho -> (mtime, array)
+_mmapped_vectors: dict[str, tuple[float, np.ndarray]] = {}
+# Índices binários montados de vectors.npy: caminho -> (mtime, índice)
+_binary_indexes: dict[str, tuple[float, faiss.IndexBinaryFlat]] = {}
+_binary_lock = threading.Lock()
+_binary_missing_warned: set[str] = set()
+
+
+def create_index(dim: int = EMBEDDING_DIM, spec: Optional[str] = None) -> faiss.Index:
+    """Índice vazio conforme FAISS_INDEX_FACTORY (ou `spec`)."""
+    return faiss.index_factory(dim, spec or settings.FAISS_INDEX_FACTORY, faiss.METRIC_INNER_PRODUCT)
+
+
+def build_index(vectors: np.ndarray, spec: Optional[str] = None) -> tuple[faiss.Index, str]:
+    """
+    Cria, treina (se preciso) e popula um índice com `vectors`.
+
+    Retorna (índice, spec efetivo): com poucos vetores para treinar o IVF ou
+    o PQ, cai para "Flat" e avisa; a próxima ingestão tenta de novo.
+    """
+    spec = spec or settings.FAISS_INDEX_FACTORY
+    index = create_index(vectors.shape[1], spec)
+    if not index.is_trained:
+        needed = min_training_vectors(index)
+        if len(vectors) < needed:
+            logger.warning(
+                "⚠️ %s vetores não bastam para treinar %s (mínimo %s); usando Flat por enquanto",
+                len(vectors), spec, needed
+            )
+            spec = "Flat"
+            index = create_index(vectors.shape[1], spec)
+        else:
+            started_at = time.perf_counter()
+            index.train(vectors)
+            logger.info("✓ Índice %s treinado com %s vetores (%.1fs)", spec, len(vectors), time.perf_counter() - started_at)
+    if len(vectors):
+        index.add(vectors)
+    return index, spec
+
+
+def needs_training(spec: Optional[str] = None) -> bool:
+    return not create_index(EMBEDDING_DIM, spec).is_trained
+
+
+def min_training_vectors(index: faiss.Index) -> int:
+    """Vetores de treino necessários: listas do IVF e/ou centróides por subespaço do PQ."""
+    needed = 1
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        needed = ivf.nlist * MIN_TRAIN_PER_LIST
+    pq = getattr(_codes_index(index), "pq", None)
+    if pq is not None:
+        needed = max(needed, pq.ksub)
+    return needed
+
+
+def _codes_index(index: faiss.Index) -> faiss.Index:
+    """Índice que guarda os códigos (o storage, no caso do HNSW)."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.downcast_index(index.storage)
+    return index
+
+
+def bytes_per_vector(index: faiss.Index) -> int:
+    return int(getattr(_codes_index(index), "code_size", 0) or index.d * 4)
+
+
+def is_lossy(index: faiss.Index) -> bool:
+    """True se o índice guarda os vetores com menos que float32 (SQ, PQ)."""
+    return bytes_per_vector(index) < index.d * 4
+
+
+def load_vectors(index_dir: str, index: Optional[faiss.Index] = None) -> np.ndarray:
+    """
+    Vetores originais do índice: vectors.npy, ou reconstruídos de um índice
+    que guarda os vetores sem perda (Flat, HNSW) quando o arquivo não existe.
+    """
+    path = os.path.join(index_dir, VECTORS_FILE)
+    if os.path.exists(path):
+        return np.load(path)
+    if index is None or index.ntotal == 0:
+        return np.zeros((0, index.d if index is not None else EMBEDDING_DIM), dtype=np.float32)
+    if is_lossy(index):
+        logger.warning("⚠️ %s ausente: vetores reconstruídos de um índice quantizado (com perda)", VECTORS_FILE)
+    try:
+        return index.reconstruct_n(0, index.ntotal)
+    except RuntimeError as e:
+        raise RuntimeError(f"{VECTORS_FILE} ausente e o índice não permite reconstruir os vetores: {e}")
+
+
+def save_vectors(index_dir: str, vectors: np.ndarray):
+    # Arquivo novo + rename: quem tem o anterior mapeado em memória continua lendo o antigo
+    path = os.path.join(index_dir, VECTORS_FILE)
+    tmp_path = path + ".tmp.npy"
+    np.save(tmp_path, vectors.astype(np.float32))
+    os.replace(tmp_path, path)
+
+
+def full_precision_vectors(index_dir: str) -> Optional[np.ndarray]:
+    """vectors.npy mapeado em memória (reaberto quando o arquivo muda), ou None se não existir."""
+    path = os.path.join(index_dir, VECTORS_FILE)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    cached = _mmapped_vectors.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    vectors = np.load(path, mmap_mode="r")
+    _mmapped_vectors[path] = (mtime, vectors)
+    return vectors
+
+
+def set_request_search_params(ef_search: Optional[int] = None, nprobe: Optional[int] = None):
+    """Sobrescreve efSearch/nprobe na requisição atual (None mantém o padrão)."""
+    params = {key: value for key, value in (("ef_search", ef_search), ("nprobe", nprobe)) if value}
+    _request_params.set(params or None)
+
+
+def search_params(index: faiss.Index, ef_search: Optional[int] = None, nprobe: Optional[int] = None):
+    """
+    SearchParameters do FAISS para uma busca, ou None para índices exatos.
+    Ordem de precedência: argumento > requisição atual > settings.
+    """
+    overrides = _request_params.get() or {}
+    if isinstance(faiss.downcast_index(index), faiss.IndexHNSW):
+        ef = ef_search or overrides.get("ef_search") or settings.FAISS_EF_SEARCH
+        return faiss.SearchParametersHNSW(efSearch=int(ef))
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        probes = nprobe or overrides.get("nprobe") or settings.FAISS_NPROBE
+        return faiss.SearchParametersIVF(nprobe=min(int(probes), ivf.nlist))
+    return None
+
+
+def search_index(
+    index: faiss.Index,
+    queries: np.ndarray,
+    k: int,
+    ef_search: Optional[int] = None,
+    nprobe: Optional[int] = None,
+    vectors: Optional[np.ndarray] = None,
+    rescore_factor: Optional[int] = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    index.search com os parâmetros de busca da requisição e, para índices com
+    perda, re-score exato de top k × fator candidatos contra `vectors`.
+    Mesmo formato de retorno do FAISS: (scores, ids), com -1 onde faltar resultado.
+    """
+    params = search_params(index, ef_search, nprobe)
+    factor = settings.FAISS_RESCORE_FACTOR if rescore_factor is None else rescore_factor
+    if vectors is None or factor <= 1 or not is_lossy(index):
+        return index.search(queries, k, params=params)
+
+    _, candidates = index.search(queries, min(k * factor, index.ntotal), params=params)
+    return rescore(queries, candidates, vectors, k)
+
+
+def rescore(queries: np.ndarray, candidates: np.ndarray, vectors: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Reordena os candidatos de cada consulta pelo produto interno exato e fica com os k melhores."""
+    scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    ids = np.full((len(queries), k), -1, dtype=np.int64)
+    for row, (query, found) in enumerate(zip(queries, candidates)):
+        # Ordenados: leitura sequencial do mmap
+        found = np.sort(found[found >= 0])
+        exact = np.asarray(vectors[found], dtype=np.float32) @ query
+        best = np.argsort(-exact)[:k]
+        scores[row, :len(best)] = exact[best]
+        ids[row, :len(best)] = found[best]
+    return scores, ids
+
+
+def binarize(vectors: np.ndarray) -> np.ndarray:
+    """1 bit por dimensão (sinal), empacotado em bytes: formato do IndexBinary."""
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+
+def build_binary_index(vectors: np.ndarray, batch_size: int = 65536) -> faiss.IndexBinaryFlat:
+    index = faiss.IndexBinaryFlat(vectors.shape[1])
+    # Em lotes: vectors pode ser o mmap inteiro do acervo
+    for start in range(0, len(vectors), batch_size):
+        index.add(binarize(vectors[start:start + batch_size]))
+    return index
+
+
+def binary_available(index_dir: str) -> bool:
+    """
+    Se a busca binária pode ser usada em `index_dir` (existe vectors.npy).
+    Sem o arquivo, avisa uma vez por diretório: a busca segue no índice FAISS.
+    """
+    if os.path.exists(os.path.join(index_dir, VECTORS_FILE)):
+        return True
+    if index_dir not in _binary_missing_warned:
+        _binary_missing_warned.add(index_dir)
+        logger.warning(
+            "⚠️ DENSE_RETRIEVER=binary, mas %s não existe em %s: usando o índice FAISS. "
+            "Gere o arquivo com `python -m backend.ann_index rebuild --spec <FAISS_INDEX_FACTORY>`",
+            VECTORS_FILE, index_dir
+        )
+    return False
+
+
+def binary_index(index_dir: str) -> Optional[tuple[faiss.IndexBinaryFlat, np.ndarray]]:
+    """(índice binário, vetores originais em mmap), ou None se vectors.npy não existir."""
+    vectors = full_precision_vectors(index_dir) if binary_available(index_dir) else None
+    if vectors is None:
+        return None
+    path = os.path.join(index_dir, VECTORS_FILE)
+    mtime = _mmapped_vectors[path][0]
+    cached = _binary_indexes.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1], vectors
+    with _binary_lock:
+        cached = _binary_indexes.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1], vectors
+        started_at = time.perf_counter()
+        index = build_binary_index(vectors)
+        _binary_indexes[path] = (mtime, index)
+        logger.info("✓ Índice binário montado: %s vetores, %.1fMB (%.2fs)",
+                    index.ntotal, index.ntotal * index.code_size / 1e6, time.perf_counter() - started_at)
+        return index, vectors
+
+
+def binary_search(
+    index_dir: str,
+    queries: np.ndarray,
+    k: int,
+    candidates: Optional[int] = None
+) -> Optional[tuple[np.ndarray, np.ndarray]]:
+    """
+    Primeiro estágio por Hamming no índice binário, segundo pelo produto interno
+    exato. None se não houver vectors.npy (quem chama usa o índice FAISS).
+    """
+    loaded = binary_index(index_dir)
+    if loaded is None:
+        return None
+    index, vectors = loaded
+    pool = min(max(k, candidates or settings.BINARY_CANDIDATES), index.ntotal)
+    _, found = index.search(binarize(queries), pool)
+    return rescore(queries, found, vectors, k)
+
+
+def binary_index_stats() -> dict:
+    return {
+        os.path.dirname(path): {"ntotal": index.ntotal, "bytes": index.ntotal * index.code_size}
+        for path, (_, index) in list(_binary_indexes.items())
+    }
+
+
+def describe(index: faiss.Index) -> dict:
+    """Tipo e parâmetros do índice (para /index/stats e os relatórios)."""
+    info = {
+        "type": type(faiss.downcast_index(index)).__name__,
+        "ntotal": index.ntotal,
+        "dim": index.d,
+        "bytes_per_vector": bytes_per_vector(index),
+    }
+    if is_lossy(index):
+        info["rescore_factor"] = settings.FAISS_RESCORE_FACTOR
+    params = search_params(index)
+    if isinstance(params, faiss.SearchParametersHNSW):
+        info["ef_search"] = params.efSearch
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        info["nlist"] = ivf.nlist
+        info["nprobe"] = params.nprobe
+    return info
+
+
+def _search_one_by_one(search, queries: np.ndarray) -> tuple[np.ndarray, float]:
+    """Uma consulta por vez, como no /ask (a busca em lote do FAISS mascara a latência)."""
+    started_at = time.perf_counter()
+    found = np.vstack([search(query[None, :])[1] for query in queries])
+    return found, (time.perf_counter() - started_at) * 1000 / len(queries)
+
+
+def _recall(search, vectors: np.ndarray, sample: int, k: int, seed: int) -> dict:
+    """
+    recall@k de `search` contra a busca exata, com `sample` vetores do próprio
+    acervo como consultas (levemente perturbados, para não serem o vizinho trivial).
+    """
+    rng = np.random.default_rng(seed)
+    picked = rng.choice(len(vectors), size=min(sample, len(vectors)), replace=False)
+    queries = vectors[picked] + rng.normal(0, 0.05, size=(len(picked), vectors.shape[1])).astype(np.float32)
+    faiss.normalize_L2(queries)
+
+    exact = faiss.IndexFlatIP(vectors.shape[1])
+    exact.add(vectors)
+    truth, exact_ms = _search_one_by_one(lambda q: exact.search(q, k), queries)
+    found, ann_ms = _search_one_by_one(search, queries)
+
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return {
+        "recall": round(hits / truth.size, 4),
+        "k": k,
+        "queries": len(queries),
+        "ann_ms_per_query": round(ann_ms, 4),
+        "exact_ms_per_query": round(exact_ms, 4),
+    }
+
+
+def recall_check(
+    index: faiss.Index,
+    vectors: np.ndarray,
+    sample: int = 200,
+    k: int = 10,
+    ef_search: Optional[int] = None,
+    nprobe: Optional[int] = None,
+    rescore_factor: int = 0,
+    seed: int = 0
+) -> dict:
+    """recall@k do índice FAISS (com os parâmetros de busca e re-score dados)."""
+    return _recall(
+        lambda q: search_index(index, q, k, ef_search, nprobe, vectors=vectors, rescore_factor=rescore_factor),
+        vectors, sample, k, seed
+    )
+
+
+def binary_recall_check(
+    index: faiss.IndexBinaryFlat,
+    vectors: np.ndarray,
+    sample: int = 200,
+    k: int = 10,
+    candidates: int = 200,
+    seed: int = 0
+) -> dict:
+    """recall@k da busca binária em dois estágios com `candidates` candidatos."""
+    def search(query):
+        _, found = index.search(binarize(query), min(max(k, candidates), index.ntotal))
+        return rescore(query, found, vectors, k)
+    return _recall(search, vectors, sample, k, seed)
+
+
+def scaled_vectors(vectors: np.ndarray, scale: int, seed: int = 0) -> np.ndarray:
+    """Acervo sintético `scale` vezes maior: cópias perturbadas dos vetores reais."""
+    if scale <= 1:
+        return vectors
+    rng = np.random.default_rng(seed)
+    copies = [vectors] + [
+        vectors + rng.normal(0, 0.05, size=vectors.shape).astype(np.float32) for _ in range(scale - 1)
+    ]
+    scaled = np.vstack(copies)
+    faiss.normalize_L2(scaled)
+    return scaled
+
+
+def benchmark_specs(
+    vectors: np.ndarray,
+    specs: list[str],
+    rescore_factors: list[int],
+    sample: int,
+    k: int,
+    binary_candidates: Optional[list[int]] = None
+) -> list[dict]:
+    """
+    Memória, tamanho em disco, tempo de treino, latência e recall de cada tipo
+    de índice ("binary" = busca binária em dois estágios, um pool por linha).
+    """
+    from .memory import faiss_index_bytes
+
+    rows = []
+    for spec in specs:
+        started_at = time.perf_counter()
+        if spec == "binary":
+            index = build_binary_index(vectors)
+            base = {
+                "spec": spec,
+                "built": spec,
+                "build_s": round(time.perf_counter() - started_at, 2),
+                "memory_bytes": index.ntotal * index.code_size,
+                "file_bytes": None,  # montado de vectors.npy ao carregar
+                "bytes_per_vector": index.code_size,
+            }
+            for candidates in binary_candidates or [settings.BINARY_CANDIDATES]:
+                rows.append({**base, "candidates": candidates,
+                             **binary_recall_check(index, vectors, sample, k, candidates)})
+            continue
+        index, built = build_index(vectors, spec)
+        build_s = time.perf_counter() - started_at
+        base = {
+            "spec": spec,
+            "built": built,
+            "build_s": round(build_s, 2),
+            "memory_bytes": faiss_index_bytes(faiss.downcast_index(index)),
+            "file_bytes": int(faiss.serialize_index(index).nbytes),
+            "bytes_per_vector": bytes_per_vector(index),
+        }
+        # Re-score só muda algo em índices com perda
+        for factor in (rescore_factors if is_lossy(index) else [0]):
+            rows.append({**base, "rescore_factor": factor,
+                         **recall_check(index, vectors, sample, k, rescore_factor=factor)})
+    return rows
+
+
+def main():
+    from .rag import load_or_create_index, save_index_and_metadata
+    from .retrieval_bench import git_revision
+
+    parser = argparse.ArgumentParser(description="Índice ANN do FAISS: reconstrução, recall e benchmark")
+    parser.add_argument("--index-dir", default=settings.INDEX_DIR)
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    rebuild = subcommands.add_parser("rebuild", help="Reconstrói index.faiss com outro FAISS_INDEX_FACTORY")
+    rebuild.add_argument("--spec", default=settings.FAISS_INDEX_FACTORY)
+    recall = subcommands.add_parser("recall", help="recall@k contra a busca exata")
+    recall.add_argument("--sample", type=int, default=settings.FAISS_RECALL_SAMPLE)
+    recall.add_argument("--k", type=int, default=settings.TOP_K)
+    recall.add_argument("--ef-search", default="", help="Valores a varrer (ex.: 16,64,256)")
+    recall.add_argument("--nprobe", default="", help="Valores a varrer (ex.: 1,4,16,64)")
+    recall.add_argument("--rescore", type=int, default=settings.FAISS_RESCORE_FACTOR, help="Fator de re-score exato")
+    bench = subcommands.add_parser("bench", help="Memória × latência × recall de vários tipos de índice")
+    bench.add_argument("--specs", nargs="+", default=["Flat", "HNSW32", "SQfp16", "SQ8", "PQ48", "HNSW32,SQ8"])
+    bench.add_argument("--rescore", default="0,4", help="Fatores de re-score a testar nos índices com perda")
+    bench.add_argument("--candidates", default=str(settings.BINARY_CANDIDATES),
+                       help="Tamanhos do pool de candidatos do spec 'binary' (ex.: 50,100,200)")
+    bench.add_argument("--scale", type=int, default=1, help="Multiplica o acervo com cópias perturbadas")
+    bench.add_argument("--sample", type=int, default=settings.FAISS_RECALL_SAMPLE)
+    bench.add_argument("--k", type=int, default=settings.TOP_K)
+    bench.add_argument("--output", help="Arquivo JSON de saída (padrão: bench_results/ann-<data>.json)")
+    args = parser.parse_args()
+
+    index, metadata = load_or_create_index(args.index_dir)
+    vectors = load_vectors(args.index_dir, index)
+
+    if args.command == "rebuild":
+        new_index, spec = build_index(vectors, args.spec)
+        metadata["index_factory"] = spec
+        save_index_and_metadata(new_index, metadata, args.index_dir, vectors=vectors)
+        print(f"✓ Índice reconstruído: {describe(new_index)}")
+        return
+
+    if args.command == "bench":
+        vectors = scaled_vectors(vectors, args.scale)
+        print(f"📐 {len(vectors)} vetores de {vectors.shape[1]} dimensões, specs: {' | '.join(args.specs)}")
+        rows = benchmark_specs(
+            vectors, args.specs, [int(v) for v in args.rescore.split(",") if v], args.sample, args.k,
+            binary_candidates=[int(v) for v in args.candidates.split(",") if v]
+        )
+        print(f"\n   {'spec':<16} {'re-score':>8} {'memória':>10} {'arquivo':>10} {'B/vetor':>8} "
+              f"{'recall@' + str(args.k):>9} {'ms/consulta':>12}")
+        for row in rows:
+            spec = row["spec"] if row["built"] == row["spec"] else f"{row['spec']}→{row['built']}"
+            if "candidates" in row:
+                rescored = f"{row['candidates']} c."
+            else:
+                rescored = f"×{row['rescore_factor']}" if row["rescore_factor"] else "-"
+            file_mb = f"{row['file_bytes'] / 1e6:>8.2f}MB" if row["file_bytes"] is not None else f"{'-':>10}"
+            print(f"   {spec:<16} {rescored:>8} {row['memory_bytes'] / 1e6:>8.2f}MB "
+                  f"{file_mb} {row['bytes_per_vector']:>8} {row['recall']:>9.4f} "
+                  f"{row['ann_ms_per_query']:>12.3f}")
+        output = args.output or f"bench_results/ann-{time.strftime('%Y%m%d-%H%M%S')}.json"
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({
+                "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "git_revision": git_revision(),
+                         "vectors": len(vectors), "scale": args.scale, "k": args.k},
+                "results": rows,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n✓ Resultado gravado em {output}")
+        return
+
+    print(f"🔎 {describe(index)}")
+    ef_values = [int(v) for v in args.ef_search.split(",") if v] or [None]
+    nprobe_values = [int(v) for v in args.nprobe.split(",") if v] or [None]
+    for ef in ef_values:
+        for probes in nprobe_values:
+            result = recall_check(index, vectors, args.sample, args.k, ef, probes, rescore_factor=args.rescore)
+            label = ", ".join(f"{name}={value}" for name, value in (("efSearch", ef), ("nprobe", probes)) if value)
+            print(f"   {label or 'padrão':<22} recall@{args.k}={result['recall']:.4f}  "
+                  f"{result['ann_ms_per_query']:.3f}ms/consulta (exata {result['exact_ms_per_query']:.3f}ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,31 +3,76 @@ FastAPI application for Hugging Face Spaces.
 Define endpoints:
   - GET /healthz - health check
   - POST /ask - responde pergunta com RAG
+  - POST /ask/stream - responde pergunta com RAG via Server-Sent Events
   - GET /warmup - pre-loads embedding model
+  - GET /metrics - métricas no formato do Prometheus
 """
 
+import asyncio
+import json
+import secrets
 import time
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, Depends, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from backend.models import AskRequest, AskResponse, Source, FeedbackRequest
-from backend.rag import ask_with_cache, load_embedder
+from backend.rag import (
+    ask_with_cache, load_embedder, generate_answer_stream, validate_answer, NO_INFO_ANSWER,
+    retrieve_with_routing, build_routed_extractive_answer, index_stats, is_cacheable_result
+)
+from backend.timing import StageTimer, start_request_timer
+from backend.tracing import get_logger, start_trace, current_trace_id
+from backend.profiling import (
+    start_request_profile, finish_request_profile, arm as arm_profiling, armed_remaining,
+    list_profiles, load_profile
+)
+from backend.metrics import (
+    registry, render_metrics, observe_stages, process_rss_bytes, HTTP_REQUESTS, HTTP_LATENCY
+)
+from backend.deadline import Deadline, DeadlineExceeded
+from backend.router import get_router_stats, ROUTE_CACHED, ROUTE_EXTRACTIVE, ROUTE_LIGHT
 from backend.cache import get_response_cache
+from backend.query_expansion import get_query_expander
+from backend.llm import close_llm_clients, get_providers, providers_stats
+from backend.executor import get_retrieval_executor, shutdown_retrieval_executor, RetrievalQueueFull
 from backend import settings
+from backend.memory import (
+    memory_report, record_history, load_history, last_report, start_tracemalloc, sample_periodically
+)
+from backend.query_trace import record_query_trace, close_query_trace
+from backend.ann_index import set_request_search_params, binary_available
+from backend.context_packer import load_tokenizer
 from backend.database import init_database, save_feedback, get_all_feedbacks, get_feedback_stats, get_filtered_feedbacks, get_feedback_stats_by_period
 
+logger = get_logger(__name__)
+
 # Lifespan para inicialização
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     try:
         init_database()
-        print("✓ Banco de dados inicializado")
+        logger.info("✓ Banco de dados inicializado")
     except Exception as e:
-        print(f"⚠️ Erro ao inicializar banco: {e}")
-        print("Sistema continuará funcionando, mas feedbacks podem não ser salvos")
+        logger.warning("⚠️ Erro ao inicializar banco: %s", e)
+        logger.warning("Sistema continuará funcionando, mas feedbacks podem não ser salvos")
+    # Tokenizer do context packer: pode baixar o BPE na primeira vez, então carrega fora do event loop
+    await asyncio.to_thread(load_tokenizer)
+    if settings.DENSE_RETRIEVER == "binary":
+        binary_available(settings.INDEX_DIR)  # avisa já no startup se faltar vectors.npy
+    start_tracemalloc()
+    memory_sampler = None
+    if settings.MEMORY_SAMPLE_INTERVAL_S > 0:
+        memory_sampler = asyncio.create_task(sample_periodically())
     yield
-    # Shutdown (se necessário)
+    # Shutdown: para a amostragem de memória, fecha os pools dos provedores LLM, o executor de retrieval
+    # e o registro de consultas
+    if memory_sampler is not None:
+        memory_sampler.cancel()
+    await close_llm_clients()
+    shutdown_retrieval_executor()
+    close_query_trace()
 
 # Inicializa FastAPI
 app = FastAPI(
@@ -44,8 +89,128 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
 
+@app.middleware("http")
+async def assign_trace_id(request: Request, call_next):
+    """Define o trace id da requisição (X-Request-ID do cliente ou novo) e o devolve no header."""
+    trace_id = start_trace(request.headers.get("x-request-id"))
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = trace_id
+    return response
+
+@app.middleware("http")
+async def record_http_metrics(request: Request, call_next):
+    """Conta requisições e mede latência por endpoint (rota declarada, não a URL bruta)."""
+    started_at = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        # Rotas inexistentes agrupadas para não explodir a cardinalidade
+        endpoint = getattr(route, "path", None) or "unmatched"
+        HTTP_REQUESTS.inc(method=request.method, endpoint=endpoint, status=status)
+        HTTP_LATENCY.observe(time.perf_counter() - started_at, method=request.method, endpoint=endpoint)
+
+def collect_runtime_metrics():
+    """Coletor do /metrics: estado lido dos mesmos stats expostos em /xxx/stats."""
+    caches = {"response": get_response_cache().stats(), "query_expansion": get_query_expander().stats()}
+    yield ("aiye_cache_hits_total", "counter", "Acertos por camada de cache",
+           [({"tier": tier}, stats["hits"]) for tier, stats in caches.items()])
+    yield ("aiye_cache_misses_total", "counter", "Faltas por camada de cache",
+           [({"tier": tier}, stats["misses"]) for tier, stats in caches.items()])
+    yield ("aiye_cache_hit_ratio", "gauge", "Taxa de acerto acumulada por camada de cache",
+           [({"tier": tier}, stats["hit_ratio"]) for tier, stats in caches.items()])
+    yield ("aiye_cache_entries", "gauge", "Entradas por camada de cache",
+           [({"tier": tier}, stats["size"]) for tier, stats in caches.items()])
+
+    executor = get_retrieval_executor().stats()
+    yield ("aiye_executor_queue_depth", "gauge", "Tarefas de retrieval aguardando thread",
+           [({}, executor["queued"])])
+    yield ("aiye_executor_running", "gauge", "Tarefas de retrieval em execução",
+           [({}, executor["running"])])
+    yield ("aiye_executor_rejected_total", "counter", "Tarefas recusadas com a fila cheia",
+           [({}, executor["rejected"])])
+
+    indexes = index_stats()
+    yield ("aiye_faiss_ntotal", "gauge", "Vetores no índice FAISS carregado",
+           [({"index_dir": index_dir}, info["ntotal"]) for index_dir, info in indexes["faiss"].items()])
+    yield ("aiye_bm25_vocab_size", "gauge", "Termos únicos no vocabulário do BM25",
+           [({}, indexes["bm25_vocab"])])
+
+    limiters = [(p.name, p.limiter.stats()) for p in get_providers() if p.limiter]
+    yield ("aiye_llm_queue_depth", "gauge", "Requisições aguardando no rate limiter do provedor",
+           [({"provider": name}, stats["queued"]) for name, stats in limiters])
+    yield ("aiye_llm_circuit_open", "gauge", "1 se o circuit breaker do provedor está aberto",
+           [({"provider": p.name}, int(p.breaker.is_open)) for p in get_providers()])
+
+    yield ("aiye_process_resident_memory_bytes", "gauge", "Memória residente (RSS) do processo",
+           [({}, process_rss_bytes())])
+
+    # Componentes do último relatório de memória (medir a cada scrape seria caro)
+    report = last_report()
+    if report:
+        yield ("aiye_memory_component_bytes", "gauge", "Memória estimada por componente (último relatório)",
+               [({"component": name}, value) for name, value in report["components"].items()])
+
+registry.register_collector(collect_runtime_metrics)
+
+def build_sources(answer: str, contexts: list[dict]) -> list[Source]:
+    """Agrega os contextos em fontes únicas (vazio quando não há resposta válida)."""
+    resposta_nao_encontrada = "Os documentos disponíveis tratam de"
+
+    # Não retorna fontes quando não houver resposta válida
+    if answer.strip() == NO_INFO_ANSWER or resposta_nao_encontrada in answer:
+        return []
+
+    sources_dict = {}
+    for ctx in contexts:
+        key = (ctx["title"], ctx["page_start"], ctx["page_end"], ctx["uri"])
+        if key not in sources_dict:
+            sources_dict[key] = ctx.get("score")
+    return [
+        Source(title=title, page_start=page_start, page_end=page_end, uri=uri, score=score)
+        for (title, page_start, page_end, uri), score in sources_dict.items()
+    ]
+
+def finish_timings(timer: StageTimer, start_time: float, response: Response | None = None) -> dict:
+    """Fecha o breakdown de latência (total) e o expõe no header Server-Timing."""
+    timer.add("total", (time.time() - start_time) * 1000)
+    observe_stages(timer.durations())
+    if response is not None:
+        response.headers["Server-Timing"] = timer.server_timing()
+        # Permite que o devtools mostre os tempos em requisições cross-origin
+        response.headers["Timing-Allow-Origin"] = "*"
+    return timer.to_meta()
+
+def require_admin(x_admin_token: str | None = Header(default=None)):
+    """Protege endpoints administrativos com o header X-Admin-Token (ADMIN_TOKEN)."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Endpoints administrativos desabilitados (ADMIN_TOKEN não configurado)")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Token administrativo inválido")
+
+def log_answered(endpoint: str, timings: dict, pipeline_meta: dict):
+    """Uma linha por pergunta respondida (campos estruturados no LOG_FORMAT=json)."""
+    logger.info(
+        "✓ %s respondida (rota=%s, %.0fms)", endpoint, pipeline_meta.get("route"), timings["total_ms"],
+        extra={
+            "endpoint": endpoint,
+            "route": pipeline_meta.get("route"),
+            "answer_mode": pipeline_meta.get("answer_mode", "llm"),
+            "llm_provider": pipeline_meta.get("llm_provider"),
+            "timings": timings,
+        }
+    )
+
+def sse_event(event: str, data) -> str:
+    """Formata um evento Server-Sent Events com payload JSON."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @app.get("/healthz")
 async def health():
     """Health check endpoint."""
@@ -66,117 +231,324 @@ async def cache_stats():
     cache = get_response_cache()
     return cache.stats()
 
+@app.get("/executor/stats")
+async def executor_stats():
+    """Retorna métricas do executor de retrieval (profundidade de fila, tempos)."""
+    return get_retrieval_executor().stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Métricas no formato de exposição do Prometheus (contadores, histogramas e gauges)."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/router/stats")
+async def router_stats():
+    """Retorna contagem e latência (média, p50, p95) por rota do roteador de consultas."""
+    return get_router_stats().stats()
+
+@app.get("/llm/queue")
+async def llm_queue():
+    """Retorna estado do rate limiter de cada provedor LLM (orçamento RPM/TPM, fila, espera estimada)."""
+    return {
+        provider.name: provider.limiter.stats() if provider.limiter else None
+        for provider in get_providers()
+    }
+
+@app.get("/llm/stats")
+async def llm_stats():
+    """Retorna, por provedor LLM, circuit breaker, rate limiter, TTFT p95 e hedges."""
+    return {
+        "hedging": settings.LLM_HEDGING,
+        "providers": providers_stats()
+    }
+
+@app.post("/admin/profile", dependencies=[Depends(require_admin)])
+async def admin_arm_profile(count: int = 1):
+    """Perfila as próximas `count` requisições de /ask (perfis em GET /admin/profiles)."""
+    if not 0 <= count <= 100:
+        raise HTTPException(status_code=400, detail="count deve estar entre 0 e 100")
+    return {
+        "armed": arm_profiling(count),
+        "slow_ms": settings.PROFILE_SLOW_MS,
+        "interval_ms": settings.PROFILE_INTERVAL_MS
+    }
+
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def admin_list_profiles():
+    """Lista os perfis gravados (sob demanda ou por lentidão)."""
+    return {
+        "armed_remaining": armed_remaining(),
+        "slow_ms": settings.PROFILE_SLOW_MS,
+        "profiles": list_profiles()
+    }
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def admin_get_profile(profile_id: str, format: str = "json"):
+    """
+    Retorna um perfil. `format=folded` devolve só as pilhas no formato collapsed
+    (flamegraph.pl, speedscope, inferno); `json` inclui os timings por etapa.
+    """
+    record = load_profile(profile_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado")
+    if format == "folded":
+        return PlainTextResponse(record["folded"] + "\n")
+    return record
+
+@app.get("/admin/memory", dependencies=[Depends(require_admin)])
+async def admin_memory(top: int = 15):
+    """Mede a memória por componente (índice, metadados, BM25, caches, embedder, heap) e grava no histórico."""
+    report = await asyncio.to_thread(memory_report, True, top)
+    record_history(report)
+    return report
+
+@app.get("/admin/memory/history", dependencies=[Depends(require_admin)])
+async def admin_memory_history(limit: int = 100):
+    """Evolução da memória (relatórios periódicos e sob demanda, persistidos em disco)."""
+    return {"interval_s": settings.MEMORY_SAMPLE_INTERVAL_S, "history": load_history(limit)}
+
 @app.post("/ask", response_model=AskResponse)
-async def ask(request: AskRequest) -> AskResponse:
+async def ask(request: AskRequest, response: Response) -> AskResponse:
     """Responde uma pergunta usando RAG com cache e re-ranking."""
     start_time = time.time()
+    timer = start_request_timer()
+    profile = start_request_profile(current_trace_id())
     try:
         question = request.question.strip()
         if len(question) < 3:
             raise HTTPException(status_code=400, detail="A pergunta deve ter pelo menos 3 caracteres")
 
+        set_request_search_params(request.ef_search, request.nprobe)
+
         # Usa a função integrada com cache e re-ranking
-        answer, contexts = ask_with_cache(
+        pipeline_meta = {}
+        answer, contexts = await ask_with_cache(
             question=question,
             top_k=settings.TOP_K,
             min_sim=settings.MIN_SIM,
             use_cache=True,
             use_reranking=True,
-            conversation_history=request.history
+            conversation_history=request.history,
+            meta=pipeline_meta,
+            deadline=Deadline()
         )
 
-        resposta_padrao = "Não encontrei essa informação no acervo, entre em contato com o administrador da plataforma."
-        resposta_nao_encontrada = "Os documentos disponíveis tratam de"
-        
-        # Não retorna fontes quando não houver resposta válida
-        if answer.strip() == resposta_padrao or resposta_nao_encontrada in answer:
-            sources = []
-        else:
-            sources_dict = {}
-            for ctx in contexts:
-                key = (ctx["title"], ctx["page_start"], ctx["page_end"], ctx["uri"])
-                if key not in sources_dict:
-                    sources_dict[key] = ctx["score"]
-            sources = [
-                Source(title=title, page_start=page_start, page_end=page_end, uri=uri, score=score)
-                for (title, page_start, page_end, uri), score in sources_dict.items()
-            ]
-
-        elapsed = time.time() - start_time
+        sources = build_sources(answer, contexts)
+
+        timings = finish_timings(timer, start_time, response)
+        log_answered("/ask", timings, pipeline_meta)
+        record_query_trace("/ask", question, timings, pipeline_meta, contexts)
+        profile_id = finish_request_profile(profile, "/ask", timings, question)
+        if profile_id:
+            pipeline_meta["profile_id"] = profile_id
         meta = {
-            "latency_ms": round(elapsed * 1000, 2),
+            "latency_ms": timings["total_ms"],
+            "timings": timings,
             "top_k": settings.TOP_K,
             "min_sim": settings.MIN_SIM,
-            "num_contexts": len(contexts)
+            "num_contexts": len(contexts),
+            "chunk_ids": [ctx.get("chunk_id") for ctx in contexts],
+            **pipeline_meta
         }
         return AskResponse(answer=answer, sources=sources, meta=meta)
 
     except HTTPException:
         raise
+    except RetrievalQueueFull as e:
+        logger.warning("⚠️ Retrieval saturado: %s", e)
+        raise HTTPException(status_code=503, detail="Servidor ocupado, tente novamente em instantes")
+    except DeadlineExceeded as e:
+        logger.warning("⏱️ %s", e)
+        raise HTTPException(status_code=504, detail="Tempo limite da requisição esgotado, tente novamente")
     except Exception as e:
-        print(f"✗ Erro ao processar pergunta: {e}")
+        logger.exception("✗ Erro ao processar pergunta: %s", e)
         raise HTTPException(status_code=500, detail=f"Erro ao processar pergunta: {str(e)}")
+    finally:
+        # Requisições que falharam também têm o perfil gravado (se armado)
+        finish_request_profile(profile, "/ask", timer.to_meta(), request.question)
+
+async def stream_answer_events(question: str, history: list[dict] | None, search_params: dict | None = None):
+    """
+    Gera os eventos SSE de /ask/stream:
+      1. `sources` - fontes recuperadas (enviadas antes da geração)
+      2. `token`   - fragmentos da resposta à medida que o LLM os produz
+      3. `meta`    - metadados finais com breakdown de latência
+    """
+    start_time = time.time()
+    set_request_search_params(**(search_params or {}))
+    cache = get_response_cache()
+    deadline = Deadline()
+    timer = start_request_timer()
+    profile = start_request_profile(current_trace_id())
+    pipeline_meta = {}
+
+    try:
+        with timer.stage("cache_lookup"):
+            cached = cache.get(question)
+
+        if cached:
+            route = ROUTE_CACHED
+            pipeline_meta["route"] = route
+            answer, contexts = cached["answer"], cached["contexts"]
+            yield sse_event("sources", [s.model_dump() for s in build_sources(answer, contexts)])
+            yield sse_event("token", {"text": answer})
+        else:
+            with timer.stage("retrieval"):
+                route, contexts = await retrieve_with_routing(
+                    question,
+                    top_k=settings.TOP_K,
+                    min_sim=settings.MIN_SIM,
+                    use_reranking=True,
+                    conversation_history=history,
+                    meta=pipeline_meta,
+                    deadline=deadline
+                )
+
+            # Fontes saem antes dos tokens (sem filtro de resposta, que ainda não existe)
+            preview_sources = build_sources("", contexts) if contexts else []
+            yield sse_event("sources", [s.model_dump() for s in preview_sources])
+
+            if route == ROUTE_EXTRACTIVE:
+                answer = build_routed_extractive_answer(question, contexts)
+                pipeline_meta["answer_mode"] = "extractive"
+                yield sse_event("token", {"text": answer})
+            else:
+                parts = []
+                async for token in generate_answer_stream(
+                    question,
+                    contexts,
+                    conversation_history=history,
+                    meta=pipeline_meta,
+                    small_model=(route == ROUTE_LIGHT),
+                    deadline=deadline
+                ):
+                    parts.append(token)
+                    yield sse_event("token", {"text": token})
+
+                answer = "".join(parts).strip()
+                if contexts:
+                    answer = validate_answer(answer, contexts)
+            # Popula o cache ao final (a política de admissão descarta erros, fallbacks e respostas degradadas pelo prazo)
+            cache.set(question, answer, contexts, cacheable=is_cacheable_result(pipeline_meta, deadline))
+
+        # Server-Timing não cabe aqui (headers já foram enviados): os tempos vão no evento meta
+        timings = finish_timings(timer, start_time)
+        log_answered("/ask/stream", timings, pipeline_meta)
+        record_query_trace("/ask/stream", question, timings, pipeline_meta, contexts)
+        profile_id = finish_request_profile(profile, "/ask/stream", timings, question)
+        if profile_id:
+            pipeline_meta["profile_id"] = profile_id
+        get_router_stats().record(route, timings["total_ms"])
+        yield sse_event("meta", {
+            "latency_ms": timings["total_ms"],
+            "timings": timings,
+            "cached": bool(cached),
+            "top_k": settings.TOP_K,
+            "min_sim": settings.MIN_SIM,
+            "num_contexts": len(contexts),
+            "chunk_ids": [ctx.get("chunk_id") for ctx in contexts],
+            **pipeline_meta,
+            **deadline.to_meta(),
+            # O frontend deve substituir o texto acumulado quando a validação o alterar
+            "final_answer": answer
+        })
+    except DeadlineExceeded as e:
+        logger.warning("⏱️ %s", e)
+        yield sse_event("error", {"detail": "Tempo limite da requisição esgotado, tente novamente"})
+    except Exception as e:
+        logger.exception("✗ Erro ao processar pergunta (stream): %s", e)
+        yield sse_event("error", {"detail": f"Erro ao processar pergunta: {str(e)}"})
+    finally:
+        finish_request_profile(profile, "/ask/stream", timer.to_meta(), question)
+
+@app.post("/ask/stream")
+async def ask_stream(request: AskRequest):
+    """Responde uma pergunta via Server-Sent Events (fontes → tokens → meta)."""
+    question = request.question.strip()
+    if len(question) < 3:
+        raise HTTPException(status_code=400, detail="A pergunta deve ter pelo menos 3 caracteres")
+
+    return StreamingResponse(
+        stream_answer_events(question, request.history, {"ef_search": request.ef_search, "nprobe": request.nprobe}),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.post("/ask-raw", response_model=AskResponse)
-async def ask_raw(request: Request) -> AskResponse:
+async def ask_raw(request: Request, response: Response) -> AskResponse:
     """Fallback endpoint que lê JSON bruto com cache e re-ranking."""
     start_time = time.time()
+    timer = start_request_timer()
+    profile = start_request_profile(current_trace_id())
     try:
         body = await request.json()
     except Exception as e:
-        print(f"✗ Erro ao ler JSON bruto: {e}")
+        logger.error("✗ Erro ao ler JSON bruto: %s", e)
+        finish_request_profile(profile, "/ask-raw", timer.to_meta())
         raise HTTPException(status_code=400, detail=f"JSON inválido: {e}")
 
     try:
         question = str(body.get("question", "")).strip()
         if len(question) < 3:
             raise HTTPException(status_code=400, detail="A pergunta deve ter pelo menos 3 caracteres")
+        try:
+            set_request_search_params(
+                **{key: max(1, int(body[key])) for key in ("ef_search", "nprobe") if body.get(key) is not None}
+            )
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="ef_search e nprobe devem ser inteiros")
 
         # Usa a função integrada com cache e re-ranking
-        answer, contexts = ask_with_cache(
+        pipeline_meta = {}
+        answer, contexts = await ask_with_cache(
             question=question,
             top_k=settings.TOP_K,
             min_sim=settings.MIN_SIM,
             use_cache=True,
-            use_reranking=True
+            use_reranking=True,
+            meta=pipeline_meta,
+            deadline=Deadline()
         )
 
-        resposta_padrao = "Não encontrei essa informação no acervo, entre em contato com o administrador da plataforma."
-        resposta_nao_encontrada = "Os documentos disponíveis tratam de"
-        
-        # Não retorna fontes quando não houver resposta válida
-        if answer.strip() == resposta_padrao or resposta_nao_encontrada in answer:
-            sources = []
-        else:
-            sources_dict = {}
-            for ctx in contexts:
-                key = (ctx["title"], ctx["page_start"], ctx["page_end"], ctx["uri"])
-                if key not in sources_dict:
-                    sources_dict[key] = ctx.get("score")
-            sources = [
-                Source(title=title, page_start=page_start, page_end=page_end, uri=uri, score=score)
-                for (title, page_start, page_end, uri), score in sources_dict.items()
-            ]
-
-        elapsed = time.time() - start_time
+        sources = build_sources(answer, contexts)
+
+        timings = finish_timings(timer, start_time, response)
+        log_answered("/ask-raw", timings, pipeline_meta)
+        record_query_trace("/ask-raw", question, timings, pipeline_meta, contexts)
+        profile_id = finish_request_profile(profile, "/ask-raw", timings, question)
+        if profile_id:
+            pipeline_meta["profile_id"] = profile_id
         meta = {
-            "latency_ms": round(elapsed * 1000, 2),
+            "latency_ms": timings["total_ms"],
+            "timings": timings,
             "top_k": settings.TOP_K,
             "min_sim": settings.MIN_SIM,
-            "num_contexts": len(contexts)
+            "num_contexts": len(contexts),
+            "chunk_ids": [ctx.get("chunk_id") for ctx in contexts],
+            **pipeline_meta
         }
 
         return AskResponse(answer=answer, sources=sources, meta=meta)
 
     except HTTPException:
         raise
+    except RetrievalQueueFull as e:
+        logger.warning("⚠️ Retrieval saturado: %s", e)
+        raise HTTPException(status_code=503, detail="Servidor ocupado, tente novamente em instantes")
+    except DeadlineExceeded as e:
+        logger.warning("⏱️ %s", e)
+        raise HTTPException(status_code=504, detail="Tempo limite da requisição esgotado, tente novamente")
     except Exception as e:
-        print(f"✗ Erro ao processar pergunta (raw): {e}")
+        logger.exception("✗ Erro ao processar pergunta (raw): %s", e)
         raise HTTPException(status_code=500, detail=f"Erro ao processar pergunta: {e}")
+    finally:
+        finish_request_profile(profile, "/ask-raw", timer.to_meta())
 
 @app.post("/feedback", status_code=200)
 async def submit_feedback(feedback: FeedbackRequest):
     """Endpoint para receber avaliações (1-5 estrelas) das respostas."""
+    # Avaliações ponderam a política de despejo do cache (mesmo se o banco falhar)
+    get_response_cache().record_rating(feedback.question, feedback.rating)
     try:
         result = save_feedback(
             question=feedback.question,
@@ -184,10 +556,10 @@ async def submit_feedback(feedback: FeedbackRequest):
             rating=feedback.rating,
             comment=feedback.comment
         )
-        print(f"✓ Feedback recebido: {feedback.rating} estrelas (ID: {result.get('id')})")
+        logger.info("✓ Feedback recebido: %s estrelas (ID: %s)", feedback.rating, result.get('id'))
         return {"status": "success", "message": "Feedback salvo com sucesso", "id": result.get('id')}
     except Exception as e:
-        print(f"✗ Erro ao salvar feedback: {e}")
+        logger.error("✗ Erro ao salvar feedback: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Erro ao salvar feedback: {str(e)}"
@@ -251,7 +623,7 @@ async def admin_feedbacks(
         )
         return result
     except Exception as e:
-        print(f"✗ Erro ao buscar feedbacks filtrados: {e}")
+        logger.error("✗ Erro ao buscar feedbacks filtrados: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/admin/feedbacks/stats")
@@ -275,7 +647,7 @@ async def admin_feedback_stats(period: str = "7d"):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"✗ Erro ao buscar estatísticas: {e}")
+        logger.error("✗ Erro ao buscar estatísticas: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 # Ajuste para Hugging Face Spaces: porta padrão 7860
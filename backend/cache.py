@@ -1,111 +1,260 @@
 """
-Sistema de cache LRU para respostas RAG.
+Sistema de cache para respostas RAG.
 Armazena perguntas e respostas em memória para reduzir latência e custos de API.
+
+Política:
+- Admissão: respostas de erro/fallback (quota, falha de API, "não encontrei")
+  nunca entram no cache. Quem chama informa em `cacheable` o que só os
+  metadados do pipeline sabem (resposta extrativa de fallback, prazo
+  da requisição esgotado).
+- Frequência: sketch TinyLFU (count-min com envelhecimento) estima quantas vezes
+  cada pergunta foi feita recentemente, mesmo depois de sair do cache.
+- Despejo: entre as entradas menos recentes, remove a de menor valor
+  (frequência × peso da avaliação média recebida via /feedback).
 """
 
-from functools import lru_cache
+from collections import OrderedDict
 from typing import Optional
 import hashlib
+import re
+
+from . import settings
+from .tracing import get_logger
+
+logger = get_logger(__name__)
+
+
+# Trechos que identificam respostas de erro/fallback geradas por generate_answer().
+# Respostas que contêm qualquer um deles não são admitidas no cache.
+NON_CACHEABLE_MARKERS = (
+    "Limite de requisições atingido",
+    "Erro ao gerar resposta",
+    "GROQ_API_KEY não configurada",
+    "Erro ao processar a pergunta",
+    "ocorreu um erro ao processar sua pergunta",
+    "Não encontrei essa informação no acervo",
+)
+
+
+def is_cacheable_answer(answer: str) -> bool:
+    """Retorna False para respostas vazias, de erro ou de fallback."""
+    if not answer or not answer.strip():
+        return False
+    return not any(marker in answer for marker in NON_CACHEABLE_MARKERS)
+
+
+class FrequencySketch:
+    """
+    Count-min sketch com envelhecimento (TinyLFU).
+
+    Estima a frequência recente de cada chave com memória constante.
+    Após `sample_size` incrementos todos os contadores são divididos por 2,
+    de modo que perguntas populares no passado perdem peso com o tempo.
+    """
+
+    def __init__(self, width: int = 1024, depth: int = 4, sample_size: int = 1000):
+        self.width = width
+        self.depth = depth
+        self.sample_size = sample_size
+        self._table = [[0] * width for _ in range(depth)]
+        self._additions = 0
+
+    def _indexes(self, key: str) -> list[int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=4 * self.depth).digest()
+        return [
+            int.from_bytes(digest[i * 4:(i + 1) * 4], "little") % self.width
+            for i in range(self.depth)
+        ]
+
+    def increment(self, key: str):
+        for row, col in zip(self._table, self._indexes(key)):
+            row[col] += 1
+        self._additions += 1
+        if self._additions >= self.sample_size:
+            self._age()
+
+    def estimate(self, key: str) -> int:
+        return min(row[col] for row, col in zip(self._table, self._indexes(key)))
+
+    def _age(self):
+        for row in self._table:
+            for i, value in enumerate(row):
+                row[i] = value >> 1
+        self._additions //= 2
+
+    def clear(self):
+        for row in self._table:
+            for i in range(len(row)):
+                row[i] = 0
+        self._additions = 0
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normaliza a pergunta para melhorar cache hits.
+    Remove pontuação extra, normaliza espaços, lowercase.
+    """
+    # Lowercase e remove espaços extras
+    normalized = question.lower().strip()
+    # Remove pontuação múltipla
+    normalized = re.sub(r'[?.!]+', '', normalized)
+    # Normaliza espaços
+    normalized = re.sub(r'\s+', ' ', normalized)
+    return normalized
 
 
 class ResponseCache:
-    """Cache LRU para respostas do RAG."""
-    
+    """Cache de respostas do RAG com admissão e despejo TinyLFU ponderado por avaliações."""
+
+    # Fração das entradas menos recentes considerada na escolha da vítima
+    EVICTION_WINDOW = 0.25
+    # Avaliação neutra (1-5 estrelas); acima dela a entrada ganha peso, abaixo perde
+    NEUTRAL_RATING = 3.0
+
     def __init__(self, max_size: int = 100):
         """
         Inicializa o cache com tamanho máximo.
-        
+
         Args:
             max_size: Número máximo de respostas em cache
         """
         self.max_size = max_size
-        self._cache: dict[str, dict] = {}
-        self._access_order: list[str] = []  # Para LRU
-    
-    def _normalize_question(self, question: str) -> str:
-        """
-        Normaliza a pergunta para melhorar cache hits.
-        Remove pontuação extra, normaliza espaços, lowercase.
-        """
-        import re
-        # Lowercase e remove espaços extras
-        normalized = question.lower().strip()
-        # Remove pontuação múltipla
-        normalized = re.sub(r'[?.!]+', '', normalized)
-        # Normaliza espaços
-        normalized = re.sub(r'\s+', ' ', normalized)
-        return normalized
-    
+        self._cache: OrderedDict[str, dict] = OrderedDict()  # Ordem = recência (LRU no início)
+        self._sketch = FrequencySketch(sample_size=max(10 * max_size, 100))
+        self._ratings: dict[str, tuple[int, int]] = {}  # key -> (soma, quantidade)
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._rejections = 0
+
     def _get_key(self, question: str) -> str:
         """
         Gera chave de cache usando hash da pergunta normalizada.
         """
-        normalized = self._normalize_question(question)
+        normalized = normalize_question(question)
         return hashlib.md5(normalized.encode()).hexdigest()
-    
+
+    def _rating_weight(self, key: str) -> float:
+        """Peso da avaliação média: 1★ → 0.33, 3★ (ou sem avaliação) → 1.0, 5★ → 1.67."""
+        total, count = self._ratings.get(key, (0, 0))
+        if count == 0:
+            return 1.0
+        return (total / count) / self.NEUTRAL_RATING
+
+    def _value(self, key: str) -> float:
+        """Valor de retenção de uma chave: frequência estimada × peso da avaliação."""
+        return self._sketch.estimate(key) * self._rating_weight(key)
+
+    def _select_victim(self) -> str:
+        """Escolhe, entre as entradas menos recentes, a de menor valor de retenção."""
+        window = max(1, int(len(self._cache) * self.EVICTION_WINDOW))
+        candidates = []
+        for position, key in enumerate(self._cache):
+            if position >= window:
+                break
+            candidates.append(key)
+        # min() mantém a primeira (menos recente) em caso de empate
+        return min(candidates, key=self._value)
+
     def get(self, question: str) -> Optional[dict]:
         """
         Recupera resposta do cache se existir.
-        
+
         Returns:
             dict com 'answer' e 'contexts' ou None se não encontrado
         """
         key = self._get_key(question)
-        
+        self._sketch.increment(key)
+
         if key in self._cache:
-            # Atualiza ordem de acesso (LRU)
-            self._access_order.remove(key)
-            self._access_order.append(key)
-            
-            print(f"✓ Cache HIT: '{question[:50]}...'")
+            # Atualiza ordem de acesso (recência)
+            self._cache.move_to_end(key)
+            self._hits += 1
+            logger.debug("✓ Cache HIT: '%s...'", question[:50])
             return self._cache[key]
-        
-        print(f"✗ Cache MISS: '{question[:50]}...'")
+
+        self._misses += 1
+        logger.debug("✗ Cache MISS: '%s...'", question[:50])
         return None
-    
-    def set(self, question: str, answer: str, contexts: list[dict]):
+
+    def set(self, question: str, answer: str, contexts: list[dict], cacheable: bool = True) -> bool:
         """
-        Armazena resposta no cache.
-        
+        Armazena resposta no cache, respeitando a política de admissão.
+
         Args:
             question: Pergunta original
             answer: Resposta gerada
             contexts: Contextos usados para gerar a resposta
+            cacheable: False quando o pipeline marcou a resposta como fallback
+
+        Returns:
+            True se a resposta foi armazenada
         """
+        if self.max_size <= 0:
+            return False
+
+        if not cacheable or not is_cacheable_answer(answer):
+            self._rejections += 1
+            logger.debug("⏭️ Cache SKIP (erro/fallback): '%s...'", question[:50])
+            return False
+
         key = self._get_key(question)
-        
-        # Se cache está cheio, remove o item menos recente (LRU)
+
+        # Cache cheio: TinyLFU só admite a nova pergunta se ela valer mais que a vítima
         if len(self._cache) >= self.max_size and key not in self._cache:
-            oldest_key = self._access_order.pop(0)
-            del self._cache[oldest_key]
-            print(f"⚠ Cache EVICT (LRU): removido item antigo")
-        
+            victim = self._select_victim()
+            if self._value(key) < self._value(victim):
+                self._rejections += 1
+                logger.debug("⏭️ Cache SKIP (TinyLFU): '%s...' menos frequente que a vítima", question[:50])
+                return False
+            del self._cache[victim]
+            self._evictions += 1
+            logger.debug("⚠ Cache EVICT (TinyLFU): removido item de menor valor")
+
         # Adiciona/atualiza no cache
         self._cache[key] = {
             "answer": answer,
             "contexts": contexts,
             "original_question": question
         }
-        
-        # Atualiza ordem de acesso
-        if key in self._access_order:
-            self._access_order.remove(key)
-        self._access_order.append(key)
-        
-        print(f"✓ Cache SET: '{question[:50]}...' (total: {len(self._cache)})")
-    
+        self._cache.move_to_end(key)
+
+        logger.debug("✓ Cache SET: '%s...' (total: %s)", question[:50], len(self._cache))
+        return True
+
+    def record_rating(self, question: str, rating: int):
+        """
+        Registra uma avaliação (1-5 estrelas) recebida via /feedback.
+        A média das avaliações pondera o valor da pergunta no despejo.
+        """
+        key = self._get_key(question)
+        total, count = self._ratings.get(key, (0, 0))
+        self._ratings[key] = (total + rating, count + 1)
+        # Limita memória: descarta avaliações de perguntas que saíram do cache
+        if len(self._ratings) > 10 * self.max_size:
+            for stale in [k for k in self._ratings if k not in self._cache]:
+                del self._ratings[stale]
+
     def clear(self):
         """Limpa todo o cache."""
         self._cache.clear()
-        self._access_order.clear()
-        print("✓ Cache limpo")
-    
+        self._sketch.clear()
+        self._ratings.clear()
+        logger.info("✓ Cache limpo")
+
     def stats(self) -> dict:
         """Retorna estatísticas do cache."""
+        lookups = self._hits + self._misses
         return {
             "size": len(self._cache),
             "max_size": self.max_size,
-            "usage_percent": (len(self._cache) / self.max_size) * 100 if self.max_size > 0 else 0
+            "usage_percent": (len(self._cache) / self.max_size) * 100 if self.max_size > 0 else 0,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+            "evictions": self._evictions,
+            "rejections": self._rejections,
+            "rated_questions": len(self._ratings)
         }
 
 
@@ -113,18 +262,21 @@ class ResponseCache:
 _response_cache: Optional[ResponseCache] = None
 
 
-def get_response_cache(max_size: int = 100) -> ResponseCache:
+def get_response_cache(max_size: Optional[int] = None) -> ResponseCache:
     """
     Retorna a instância global do cache de respostas.
-    
+
     Args:
-        max_size: Tamanho máximo do cache (usado apenas na primeira chamada)
-    
+        max_size: Tamanho máximo do cache (usado apenas na primeira chamada;
+            padrão RESPONSE_CACHE_SIZE, 0 desliga o cache)
+
     Returns:
         ResponseCache singleton
     """
     global _response_cache
     if _response_cache is None:
+        if max_size is None:
+            max_size = settings.RESPONSE_CACHE_SIZE
         _response_cache = ResponseCache(max_size=max_size)
-        print(f"✓ Cache de respostas inicializado (max_size={max_size})")
+        logger.info("✓ Cache de respostas inicializado (max_size=%s)", max_size)
     return _response_cache
@@ -0,0 +1,322 @@
+"""
+Simulador de dimensionamento do cache de respostas.
+
+Reproduz uma sequência histórica de perguntas e mede a taxa de acerto por
+capacidade para cada política:
+- lru: despeja a menos recente
+- lfu: despeja a menos frequente entre as que estão no cache (empate: a mais antiga)
+- tinylfu: a própria ResponseCache da aplicação (sketch de frequência com
+  envelhecimento, admissão e despejo ponderado por avaliações)
+- semantic: LRU em que uma pergunta também acerta se houver outra no cache com
+  similaridade de cosseno >= --semantic-threshold (embedder da aplicação);
+  indica quanto um cache semântico ganharia sobre o exato
+
+Fontes de perguntas (em ordem cronológica):
+- registro de consultas (backend/query_trace.py, inclusive arquivos rotacionados
+  e registros só com hash; a política semantic precisa do texto)
+- tabela feedbacks (--feedbacks): só perguntas avaliadas, amostra enviesada
+  para as populares, mas disponível sem ligar o registro de consultas
+- arquivo texto, uma pergunta por linha
+
+Para cada capacidade também estima a memória (bytes por entrada × capacidade).
+A entrada típica é medida montando uma resposta com TOP_K chunks reais do
+índice, ou informada com --entry-bytes.
+
+Uso:
+    python -m backend.cache_sim backend/data/traces/queries.jsonl*
+    python -m backend.cache_sim --feedbacks --capacities 50,100,200,500
+    python -m backend.cache_sim perguntas.txt --policies lru,tinylfu
+"""
+
+import argparse
+import json
+import time
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+from . import settings
+from .cache import ResponseCache, normalize_question
+
+DEFAULT_CAPACITIES = (25, 50, 100, 200, 500, 1000, 2000)
+POLICIES = ("lru", "lfu", "tinylfu", "semantic")
+# Resposta usada no lugar da real: só precisa passar pela admissão do cache
+_SIM_ANSWER = "resposta simulada"
+
+
+class LRUPolicy:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.entries: OrderedDict = OrderedDict()
+
+    def access(self, key: str, **_) -> bool:
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return True
+        self.entries[key] = None
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+        return False
+
+
+class LFUPolicy:
+    """LFU O(1): chaves agrupadas por frequência, cada grupo em ordem de chegada."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.freq: dict[str, int] = {}
+        self.buckets: dict[int, OrderedDict] = defaultdict(OrderedDict)
+        self.min_freq = 0
+
+    def access(self, key: str, **_) -> bool:
+        if key in self.freq:
+            count = self.freq[key]
+            del self.buckets[count][key]
+            if not self.buckets[count] and self.min_freq == count:
+                self.min_freq += 1
+            self.freq[key] = count + 1
+            self.buckets[count + 1][key] = None
+            return True
+        if len(self.freq) >= self.capacity:
+            victim, _ = self.buckets[self.min_freq].popitem(last=False)
+            del self.freq[victim]
+        self.freq[key] = 1
+        self.buckets[1][key] = None
+        self.min_freq = 1
+        return False
+
+
+class TinyLFUPolicy:
+    """A ResponseCache de produção, com avaliações repassadas quando a fonte as tiver."""
+
+    def __init__(self, capacity: int):
+        self.cache = ResponseCache(max_size=capacity)
+
+    def access(self, key: str, rating: Optional[int] = None, **_) -> bool:
+        hit = self.cache.get(key) is not None
+        if not hit:
+            self.cache.set(key, _SIM_ANSWER, [])
+        if rating is not None:
+            self.cache.record_rating(key, rating)
+        return hit
+
+
+class SemanticPolicy:
+    """LRU com acerto por similaridade (vetores normalizados, produto interno)."""
+
+    def __init__(self, capacity: int, vectors: dict[str, np.ndarray], threshold: float):
+        self.capacity = capacity
+        self.vectors = vectors
+        self.threshold = threshold
+        self.entries: OrderedDict = OrderedDict()
+
+    def access(self, key: str, **_) -> bool:
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return True
+        if self.entries:
+            keys = list(self.entries)
+            similarities = np.stack([self.vectors[k] for k in keys]) @ self.vectors[key]
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                self.entries.move_to_end(keys[best])
+                return True
+        self.entries[key] = None
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+        return False
+
+
+def load_trace_files(paths: list[str]) -> list[dict]:
+    """Registros de consulta ou linhas de texto, em ordem cronológica."""
+    events = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                if line.startswith("{"):
+                    record = json.loads(line)
+                    key = record.get("q") or record.get("q_hash")
+                    if key:
+                        events.append({"ts": record.get("ts", 0), "key": key, "text": record.get("q")})
+                else:
+                    question = normalize_question(line)
+                    events.append({"ts": 0, "key": question, "text": question})
+    # Arquivos rotacionados (queries.jsonl.1, .2...) podem vir em qualquer ordem; texto mantém a ordem do arquivo
+    events.sort(key=lambda event: event["ts"])
+    return events
+
+
+def load_feedback_questions(page_size: int = 500) -> list[dict]:
+    """Perguntas da tabela feedbacks, da mais antiga para a mais recente, com a avaliação."""
+    from .database import get_all_feedbacks
+
+    rows, offset = [], 0
+    while True:
+        page = get_all_feedbacks(limit=page_size, offset=offset)
+        rows.extend(page)
+        if len(page) < page_size:
+            break
+        offset += page_size
+    events = []
+    for row in reversed(rows):
+        question = normalize_question(row["question"])
+        events.append({"ts": 0, "key": question, "text": question, "rating": row.get("rating")})
+    return events
+
+
+def embed_questions(texts: Iterable[str]) -> dict[str, np.ndarray]:
+    import faiss
+    from .rag import load_embedder
+
+    unique = sorted(set(texts))
+    vectors = load_embedder().encode(unique, convert_to_numpy=True, batch_size=64).astype("float32")
+    faiss.normalize_L2(vectors)
+    return dict(zip(unique, vectors))
+
+
+def estimate_entry_bytes() -> int:
+    """Bytes de uma entrada típica: TOP_K chunks reais do índice + resposta de ~LLM_MAX_TOKENS."""
+    from .memory import deep_sizeof
+
+    contexts = []
+    try:
+        with open(Path(settings.INDEX_DIR) / "metadata.json", encoding="utf-8") as f:
+            chunks = json.load(f).get("chunks", [])
+        for chunk in chunks[:settings.TOP_K]:
+            contexts.append({
+                "content": chunk["content"],
+                "chunk_id": chunk.get("chunk_id", ""),
+                "title": "Título do documento",
+                "page_start": chunk["page_start"],
+                "page_end": chunk["page_end"],
+                "uri": "backend/data/pdfs/documento.pdf",
+                "score": 0.5,
+                "matched_query": "pergunta",
+            })
+    except (OSError, ValueError, KeyError):
+        pass
+    if not contexts:
+        # Sem índice legível: chunks do tamanho alvo do chunking semântico
+        contexts = [{"content": "x" * 800, "title": "Título do documento", "page_start": 1, "page_end": 1,
+                     "uri": "documento.pdf", "score": 0.5} for _ in range(settings.TOP_K)]
+    entry = {
+        "answer": "x" * (settings.LLM_MAX_TOKENS * 3),
+        "contexts": contexts,
+        "original_question": "x" * 80,
+    }
+    # + chave md5 e slot no OrderedDict
+    return deep_sizeof(entry) + deep_sizeof("0" * 32) + 100
+
+
+def simulate(events: list[dict], capacities: list[int], policies: list[str],
+             vectors: Optional[dict], threshold: float) -> dict:
+    results: dict[str, dict[int, float]] = {}
+    for policy in policies:
+        results[policy] = {}
+        for capacity in capacities:
+            if policy == "lru":
+                cache = LRUPolicy(capacity)
+            elif policy == "lfu":
+                cache = LFUPolicy(capacity)
+            elif policy == "tinylfu":
+                cache = TinyLFUPolicy(capacity)
+            else:
+                cache = SemanticPolicy(capacity, vectors, threshold)
+            hits = sum(cache.access(event["key"], rating=event.get("rating")) for event in events)
+            results[policy][capacity] = round(hits / len(events), 4)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simula taxa de acerto × capacidade do cache de respostas")
+    parser.add_argument("traces", nargs="*", help="Registros de consulta (JSONL) ou arquivos texto")
+    parser.add_argument("--feedbacks", action="store_true", help="Usa as perguntas da tabela feedbacks")
+    parser.add_argument("--capacities", default=",".join(map(str, DEFAULT_CAPACITIES)))
+    parser.add_argument("--policies", default="lru,lfu,tinylfu", help=f"Entre {','.join(POLICIES)}")
+    parser.add_argument("--semantic-threshold", type=float, default=0.92)
+    parser.add_argument("--entry-bytes", type=int, help="Bytes por entrada (padrão: estimado do índice)")
+    parser.add_argument("--target", type=float, default=0.95, help="Fração da taxa máxima usada na recomendação")
+    parser.add_argument("--output", help="Arquivo JSON de saída (padrão: bench_results/cache-sim-<data>.json)")
+    args = parser.parse_args()
+
+    events = load_trace_files(args.traces) if args.traces else []
+    if args.feedbacks:
+        events += load_feedback_questions()
+    if not events:
+        parser.error("nenhuma pergunta: informe arquivos de registro ou --feedbacks")
+
+    capacities = sorted(int(c) for c in args.capacities.split(","))
+    policies = [p.strip() for p in args.policies.split(",")]
+    unknown = set(policies) - set(POLICIES)
+    if unknown:
+        parser.error(f"políticas desconhecidas: {sorted(unknown)}")
+
+    vectors = None
+    if "semantic" in policies:
+        if any(event["text"] is None for event in events):
+            print("⚠️ Registros só com hash: política semantic ignorada")
+            policies.remove("semantic")
+        else:
+            print(f"🔄 Gerando embeddings de {len({e['text'] for e in events})} perguntas únicas...")
+            vectors = embed_questions(event["text"] for event in events)
+
+    unique = len({event["key"] for event in events})
+    # Capacidade infinita: só a primeira ocorrência de cada pergunta erra
+    ceiling = round(1 - unique / len(events), 4)
+    entry_bytes = args.entry_bytes or estimate_entry_bytes()
+    vector_bytes = next(iter(vectors.values())).nbytes if vectors else 0
+
+    print(f"📊 {len(events)} consultas, {unique} perguntas distintas; teto (capacidade infinita): {ceiling:.1%}")
+    print(f"🧠 ~{entry_bytes / 1024:.1f} KB por entrada" + (f" (+{vector_bytes} B de vetor no semantic)" if vector_bytes else ""))
+
+    results = simulate(events, capacities, policies, vectors, args.semantic_threshold)
+
+    header = f"   {'capacidade':>10} {'memória':>10} " + " ".join(f"{p:>9}" for p in policies)
+    print("\n" + header)
+    for capacity in capacities:
+        memory_mb = capacity * entry_bytes / 1024 / 1024
+        row = " ".join(f"{results[p][capacity]:>9.1%}" for p in policies)
+        print(f"   {capacity:>10} {memory_mb:>8.1f}MB {row}")
+
+    recommendations = {}
+    for policy in policies:
+        best = max(results[policy].values())
+        # Menor capacidade que alcança --target da melhor taxa simulada para a política
+        capacity = next(c for c in capacities if results[policy][c] >= best * args.target)
+        recommendations[policy] = {
+            "capacity": capacity,
+            "hit_ratio": results[policy][capacity],
+            "memory_bytes": capacity * (entry_bytes + (vector_bytes if policy == "semantic" else 0)),
+        }
+        print(f"   ➜ {policy}: {capacity} entradas ({results[policy][capacity]:.1%}, "
+              f"~{recommendations[policy]['memory_bytes'] / 1024 / 1024:.1f} MB)")
+    print(f"   (atual: RESPONSE_CACHE_SIZE={settings.RESPONSE_CACHE_SIZE})")
+
+    report = {
+        "run": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "sources": args.traces + (["feedbacks"] if args.feedbacks else []),
+            "queries": len(events),
+            "unique_questions": unique,
+            "hit_ratio_ceiling": ceiling,
+            "entry_bytes": entry_bytes,
+            "semantic_threshold": args.semantic_threshold if "semantic" in policies else None,
+        },
+        "hit_ratio": {policy: {str(c): ratio for c, ratio in by_capacity.items()} for policy, by_capacity in results.items()},
+        "memory_bytes": {str(c): c * entry_bytes for c in capacities},
+        "recommendations": recommendations,
+    }
+    output = args.output or f"bench_results/cache-sim-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✓ Resultado gravado em {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Circuit breaker para o provedor LLM.
+
+Estados:
+- closed: chamadas passam normalmente; falhas consecutivas são contadas
+- open: após `failure_threshold` falhas seguidas, chamadas falham imediatamente
+  (sem rede, sem retries) durante `recovery_timeout_s`
+- half_open: passado o timeout, até `half_open_max_calls` chamadas de prova são
+  liberadas; sucesso fecha o circuito, falha reabre
+
+Só falhas do provedor (timeout, conexão, 5xx) contam. Respostas 4xx/429 mostram
+que o provedor está de pé e não abrem o circuito.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from .tracing import get_logger
+
+logger = get_logger(__name__)
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """O circuito está aberto; a chamada foi rejeitada sem tocar no provedor."""
+
+    def __init__(self, name: str, retry_in_s: float):
+        super().__init__(f"Circuito '{name}' aberto (nova tentativa em {retry_in_s:.0f}s)")
+        self.retry_in_s = retry_in_s
+
+
+class CircuitBreaker:
+    """Circuit breaker simples (uso a partir do event loop, sem locks)."""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        recovery_timeout_s: float = 30.0,
+        half_open_max_calls: int = 1,
+        is_failure: Optional[Callable[[BaseException], bool]] = None
+    ):
+        """
+        Args:
+            name: Nome do circuito (aparece em logs e stats)
+            failure_threshold: Falhas consecutivas que abrem o circuito
+            recovery_timeout_s: Tempo aberto antes de liberar chamadas de prova
+            half_open_max_calls: Chamadas de prova simultâneas no estado half_open
+            is_failure: Classifica exceções; por padrão toda Exception é falha
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout_s = recovery_timeout_s
+        self.half_open_max_calls = half_open_max_calls
+        self._is_failure = is_failure or (lambda e: isinstance(e, Exception))
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._total_failures = 0
+        self._total_successes = 0
+        self._rejected = 0
+        self._times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout_s:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+            logger.info("🔌 Circuito '%s' half-open: liberando chamada de prova", self.name)
+        return self._state
+
+    def retry_in(self) -> float:
+        """Segundos até o circuito aberto liberar chamadas de prova."""
+        if self._state != OPEN:
+            return 0.0
+        return max(0.0, self.recovery_timeout_s - (time.monotonic() - self._opened_at))
+
+    def allow_request(self) -> bool:
+        """Retorna True (e reserva a vaga de prova, se half_open) se a chamada pode seguir."""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and self._probes_in_flight < self.half_open_max_calls:
+            self._probes_in_flight += 1
+            return True
+        self._rejected += 1
+        return False
+
+    def record_success(self):
+        self._total_successes += 1
+        self._consecutive_failures = 0
+        if self._state == HALF_OPEN:
+            logger.info("✓ Circuito '%s' fechado: provedor respondeu", self.name)
+        self._state = CLOSED
+        self._probes_in_flight = 0
+
+    def record_failure(self):
+        self._total_failures += 1
+        self._consecutive_failures += 1
+        if self._state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            if self._state != OPEN:
+                self._times_opened += 1
+                logger.error(
+                    "⛔ Circuito '%s' aberto após %d falha(s); fast-fail por %.0fs",
+                    self.name, self._consecutive_failures, self.recovery_timeout_s
+                )
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+            self._probes_in_flight = 0
+
+    def _release_probe(self):
+        if self._state == HALF_OPEN and self._probes_in_flight > 0:
+            self._probes_in_flight -= 1
+
+    @contextmanager
+    def guard(self):
+        """
+        Envolve uma chamada ao provedor e registra o resultado.
+
+        Raises:
+            CircuitOpenError: se o circuito não permitir a chamada
+        """
+        if not self.allow_request():
+            raise CircuitOpenError(self.name, self.retry_in())
+        try:
+            yield
+        except BaseException as e:
+            if not isinstance(e, Exception):
+                # Cancelamento / GeneratorExit: não diz nada sobre o provedor
+                self._release_probe()
+            elif self._is_failure(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        else:
+            self.record_success()
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == OPEN
+
+    def fast_fail(self) -> bool:
+        """Retorna True (e contabiliza a rejeição) se a chamada deve falhar sem tentar."""
+        if self.is_open:
+            self._rejected += 1
+            return True
+        return False
+
+    def stats(self) -> dict:
+        """Retorna estado e contadores do circuito."""
+        return {
+            "name": self.name,
+            "state": self.state,
+            "consecutive_failures": self._consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "recovery_timeout_s": self.recovery_timeout_s,
+            "retry_in_s": round(self.retry_in(), 1),
+            "times_opened": self._times_opened,
+            "total_failures": self._total_failures,
+            "total_successes": self._total_successes,
+            "rejected": self._rejected,
+        }
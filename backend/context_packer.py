@@ -0,0 +1,208 @@
+"""
+Empacotamento de contextos do prompt dentro de um orçamento de tokens.
+
+Em vez de concatenar todos os top_k chunks inteiros, o packer:
+- Conta tokens com o tokenizer do modelo (tiktoken, se instalado;
+  senão a estimativa de ~4 caracteres por token)
+- Preenche CONTEXT_TOKEN_BUDGET em ordem de relevância
+- Quando um chunk não cabe inteiro, corta-o em limite de sentença
+- Reserva HISTORY_TOKEN_BUDGET para o histórico da conversa (mais recente primeiro)
+
+O resultado informa tokens usados, chunks cortados e descartados, para
+que o pipeline registre no `meta` da resposta.
+"""
+
+from typing import Optional
+
+from . import settings
+from .chunking import split_into_sentences
+from .tracing import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+# Chunk cortado precisa de pelo menos este espaço para valer a pena entrar
+MIN_TRIMMED_TOKENS = 40
+
+TRIM_MARKER = " [...]"
+
+_encoding = None
+_encoding_loaded = False
+
+
+def load_tokenizer():
+    """
+    Carrega o encoding tiktoken (LLM_TOKENIZER) ou None se indisponível.
+
+    Na primeira vez o tiktoken pode baixar o arquivo BPE (rede bloqueante):
+    a aplicação chama esta função no startup, fora do event loop.
+    """
+    return _get_encoding()
+
+
+def _get_encoding():
+    """Retorna o encoding tiktoken (LLM_TOKENIZER) ou None se indisponível."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        if tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding(settings.LLM_TOKENIZER)
+                logger.info("✓ Tokenizer '%s' carregado para contagem de tokens", settings.LLM_TOKENIZER)
+            except Exception as e:
+                logger.warning("⚠️ Tokenizer '%s' indisponível (%s), usando estimativa", settings.LLM_TOKENIZER, e)
+    return _encoding
+
+
+def tokenizer_name() -> str:
+    """Nome do tokenizer em uso (para meta/stats)."""
+    return settings.LLM_TOKENIZER if _get_encoding() is not None else "chars/4"
+
+
+def count_tokens(text: str) -> int:
+    """Conta tokens do texto com o tokenizer do modelo (ou ~4 caracteres por token)."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def format_context_block(ctx: dict) -> str:
+    """Formata um contexto como bloco do prompt (cabeçalho + conteúdo)."""
+    title = ctx.get("title", "Desconhecido")
+    page_start = ctx.get("page_start", "?")
+    page_end = ctx.get("page_end", "?")
+    content = ctx.get("content", "").strip()
+    score = ctx.get("final_score", ctx.get("score", 0))
+    # Mantém estrutura interna mas não aparece na resposta ao usuário
+    return f"[DOCUMENTO] {title} (pp. {page_start}-{page_end}) | Relevância: {score:.2f}\n{content}\n\n"
+
+
+def format_history_turn(index: int, turn: dict) -> str:
+    """Formata uma pergunta/resposta do histórico."""
+    return f"Pergunta {index}: {turn.get('question', '')}\nResposta {index}: {turn.get('answer', '')}\n\n"
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> Optional[str]:
+    """
+    Corta o texto no maior prefixo de sentenças que caiba em `max_tokens`.
+    Retorna None se nem a primeira sentença couber.
+    """
+    kept = []
+    used = count_tokens(TRIM_MARKER)
+    for sentence in split_into_sentences(text):
+        sentence_tokens = count_tokens(sentence + " ")
+        if used + sentence_tokens > max_tokens:
+            break
+        kept.append(sentence)
+        used += sentence_tokens
+    if not kept:
+        return None
+    return " ".join(kept) + TRIM_MARKER
+
+
+class PackedContext:
+    """Resultado do empacotamento: contextos/histórico que cabem e contagens de tokens."""
+
+    def __init__(self):
+        self.contexts: list[dict] = []
+        self.history: list[dict] = []
+        self.context_tokens = 0
+        self.history_tokens = 0
+        self.trimmed = 0
+        self.dropped = 0
+
+    def to_meta(self) -> dict:
+        return {
+            "context_tokens": self.context_tokens,
+            "history_tokens": self.history_tokens,
+            "contexts_packed": len(self.contexts),
+            "contexts_trimmed": self.trimmed,
+            "contexts_dropped": self.dropped,
+            "tokenizer": tokenizer_name(),
+        }
+
+
+def pack_history(conversation_history: Optional[list[dict]], budget: int, max_turns: int = 3) -> tuple[list[dict], int]:
+    """
+    Seleciona as últimas `max_turns` trocas que cabem em `budget` tokens,
+    priorizando as mais recentes e cortando respostas longas em sentenças.
+
+    Returns:
+        Tupla (turnos em ordem cronológica, tokens usados)
+    """
+    if not conversation_history or budget <= 0:
+        return [], 0
+
+    selected = []
+    used = 0
+    for turn in reversed(conversation_history[-max_turns:]):
+        tokens = count_tokens(format_history_turn(len(selected) + 1, turn))
+        if used + tokens > budget:
+            question_tokens = count_tokens(format_history_turn(len(selected) + 1, {**turn, "answer": ""}))
+            answer = trim_to_tokens(turn.get("answer", ""), budget - used - question_tokens)
+            if answer is None:
+                break
+            turn = {**turn, "answer": answer}
+            tokens = count_tokens(format_history_turn(len(selected) + 1, turn))
+        selected.append(turn)
+        used += tokens
+
+    selected.reverse()
+    return selected, used
+
+
+def pack_contexts(
+    contexts: list[dict],
+    conversation_history: Optional[list[dict]] = None,
+    budget: Optional[int] = None,
+    history_budget: Optional[int] = None
+) -> PackedContext:
+    """
+    Preenche o orçamento de tokens com os contextos em ordem de relevância.
+
+    Args:
+        contexts: Contextos já ordenados por relevância (saída de search())
+        conversation_history: Histórico de perguntas/respostas anteriores
+        budget: Orçamento para os contextos (padrão CONTEXT_TOKEN_BUDGET)
+        history_budget: Orçamento para o histórico (padrão HISTORY_TOKEN_BUDGET)
+
+    Returns:
+        PackedContext com cópias dos contextos (conteúdo possivelmente cortado)
+    """
+    if budget is None:
+        budget = settings.CONTEXT_TOKEN_BUDGET
+    if history_budget is None:
+        history_budget = settings.HISTORY_TOKEN_BUDGET
+
+    packed = PackedContext()
+    packed.history, packed.history_tokens = pack_history(conversation_history, history_budget)
+
+    for ctx in contexts:
+        remaining = budget - packed.context_tokens
+        tokens = count_tokens(format_context_block(ctx))
+        if tokens <= remaining:
+            packed.contexts.append(ctx)
+            packed.context_tokens += tokens
+            continue
+
+        # Não cabe inteiro: tenta um prefixo de sentenças no espaço restante
+        header_tokens = count_tokens(format_context_block({**ctx, "content": ""}))
+        content = None
+        if remaining - header_tokens >= MIN_TRIMMED_TOKENS:
+            content = trim_to_tokens(ctx.get("content", ""), remaining - header_tokens)
+        if content is None:
+            packed.dropped += 1
+            continue
+
+        trimmed_ctx = {**ctx, "content": content}
+        packed.contexts.append(trimmed_ctx)
+        packed.context_tokens += count_tokens(format_context_block(trimmed_ctx))
+        packed.trimmed += 1
+
+    return packed
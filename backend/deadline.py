@@ -0,0 +1,91 @@
+"""
+Deadline de ponta a ponta para uma requisição.
+
+Cada /ask recebe um orçamento de tempo (REQUEST_DEADLINE_S, abaixo do timeout
+de 30s do frontend) que acompanha a requisição por todas as etapas:
+- Etapas obrigatórias (embedding, FAISS, LLM) verificam se o prazo já venceu
+  e abortam com DeadlineExceeded
+- Etapas opcionais (expansão, BM25/fusão, re-ranking) são puladas quando o
+  tempo restante fica abaixo da reserva da geração (DEADLINE_LLM_RESERVE_S)
+- A geração usa o tempo restante como limite de espera na fila e de streaming
+
+As etapas degradadas ficam registradas e vão para o `meta` da resposta.
+"""
+
+import threading
+import time
+from typing import Optional
+
+from . import settings
+from .tracing import get_logger
+
+logger = get_logger(__name__)
+
+
+class DeadlineExceeded(TimeoutError):
+    """O prazo da requisição venceu antes de uma etapa obrigatória."""
+
+    def __init__(self, stage: str, overrun_ms: float):
+        super().__init__(f"Prazo da requisição esgotado antes de '{stage}' (+{overrun_ms:.0f}ms)")
+        self.stage = stage
+
+
+class Deadline:
+    """Prazo absoluto de uma requisição, compartilhado entre as etapas do pipeline."""
+
+    def __init__(self, budget_s: Optional[float] = None, reserve_s: Optional[float] = None):
+        """
+        Args:
+            budget_s: Orçamento total (padrão REQUEST_DEADLINE_S)
+            reserve_s: Tempo reservado para a geração; etapas opcionais só rodam
+                acima dele (padrão DEADLINE_LLM_RESERVE_S)
+        """
+        self.budget_s = budget_s if budget_s is not None else settings.REQUEST_DEADLINE_S
+        self.reserve_s = reserve_s if reserve_s is not None else settings.DEADLINE_LLM_RESERVE_S
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + self.budget_s
+        self._lock = threading.Lock()  # Etapas rodam no executor de retrieval
+        self.degraded: list[str] = []
+
+    def remaining(self) -> float:
+        """Segundos restantes (negativo se já venceu)."""
+        return self.expires_at - time.monotonic()
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self, stage: str):
+        """
+        Verifica o prazo antes de uma etapa obrigatória.
+
+        Raises:
+            DeadlineExceeded: se o prazo já venceu
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(stage, -remaining * 1000)
+
+    def allows(self, stage: str, reserve_s: Optional[float] = None) -> bool:
+        """
+        Indica se uma etapa opcional cabe no tempo restante (acima da reserva).
+        Se não couber, registra a etapa como degradada.
+        """
+        reserve = self.reserve_s if reserve_s is None else reserve_s
+        if self.remaining() > reserve:
+            return True
+        self.degrade(stage)
+        return False
+
+    def degrade(self, stage: str):
+        """Registra uma etapa pulada ou encurtada pelo prazo."""
+        with self._lock:
+            if stage not in self.degraded:
+                self.degraded.append(stage)
+        logger.warning("⏱️ Etapa '%s' degradada (%.0fms restantes)", stage, self.remaining() * 1000)
+
+    def to_meta(self) -> dict:
+        return {
+            "deadline_ms": round(self.budget_s * 1000),
+            "deadline_remaining_ms": round(self.remaining() * 1000, 2),
+            "degraded_stages": list(self.degraded),
+        }
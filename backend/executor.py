@@ -0,0 +1,159 @@
+"""
+Executor dedicado para o pipeline de retrieval (CPU-bound).
+
+Embedding, FAISS, BM25 e re-ranking rodam em um pool de threads de tamanho
+fixo (RETRIEVAL_WORKERS), fora do event loop. Assim /healthz, cache hits e
+a geração assíncrona continuam respondendo enquanto buscas estão em andamento.
+
+A fila de espera é limitada (RETRIEVAL_MAX_QUEUE): acima disso novas buscas são
+rejeitadas com RetrievalQueueFull em vez de acumular latência indefinidamente.
+FAISS e numpy liberam o GIL nas partes pesadas, por isso threads bastam aqui.
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from . import settings
+from .tracing import get_logger
+from .profiling import profiled_call
+
+logger = get_logger(__name__)
+
+
+class RetrievalQueueFull(RuntimeError):
+    """A fila do executor de retrieval atingiu o limite configurado."""
+
+
+class RetrievalExecutor:
+    """Pool de threads limitado com métricas de profundidade de fila."""
+
+    def __init__(self, max_workers: int = 2, max_queue: int = 32):
+        """
+        Args:
+            max_workers: Número de threads executando buscas em paralelo
+            max_queue: Máximo de buscas aguardando uma thread livre
+        """
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="retrieval")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._peak_queued = 0
+        self._total_wait_ms = 0.0
+        self._total_run_ms = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        """Número de tarefas aguardando uma thread livre."""
+        return self._queued
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Executa `fn(*args, **kwargs)` no pool e aguarda o resultado sem bloquear o loop.
+
+        Raises:
+            RetrievalQueueFull: se a fila já estiver no limite
+        """
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._rejected += 1
+                raise RetrievalQueueFull(
+                    f"Fila de retrieval cheia ({self._queued}/{self.max_queue})"
+                )
+            self._queued += 1
+            self._peak_queued = max(self._peak_queued, self._queued)
+
+        submitted_at = time.perf_counter()
+        # Propaga contextvars (ex.: trace id) para a thread de execução
+        ctx = contextvars.copy_context()
+
+        def task():
+            started_at = time.perf_counter()
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._total_wait_ms += (started_at - submitted_at) * 1000
+            ok = False
+            try:
+                # profiled_call amostra esta thread se a requisição estiver sendo perfilada
+                result = ctx.run(profiled_call, fn, *args, **kwargs)
+                ok = True
+                return result
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._total_run_ms += (time.perf_counter() - started_at) * 1000
+                    if ok:
+                        self._completed += 1
+                    else:
+                        self._failed += 1
+
+        future: Future = self._pool.submit(task)
+
+        def on_done(f: Future):
+            # Tarefa cancelada antes de começar: nunca decrementou a fila
+            if f.cancelled():
+                with self._lock:
+                    self._queued -= 1
+
+        future.add_done_callback(on_done)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> dict:
+        """Retorna métricas do executor (profundidade de fila, tempos médios)."""
+        with self._lock:
+            finished = self._completed + self._failed
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self._queued,
+                "running": self._running,
+                "peak_queued": self._peak_queued,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._total_wait_ms / finished, 2) if finished else 0.0,
+                "avg_run_ms": round(self._total_run_ms / finished, 2) if finished else 0.0,
+            }
+
+    def shutdown(self):
+        """Encerra o pool (aguarda tarefas em andamento)."""
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+# Instância global (singleton)
+_retrieval_executor: Optional[RetrievalExecutor] = None
+
+
+def get_retrieval_executor() -> RetrievalExecutor:
+    """
+    Retorna o executor global de retrieval, criando-o na primeira chamada
+    com RETRIEVAL_WORKERS threads e fila de RETRIEVAL_MAX_QUEUE.
+    """
+    global _retrieval_executor
+    if _retrieval_executor is None:
+        _retrieval_executor = RetrievalExecutor(
+            max_workers=settings.RETRIEVAL_WORKERS,
+            max_queue=settings.RETRIEVAL_MAX_QUEUE,
+        )
+        logger.info(
+            "✓ Executor de retrieval inicializado (workers=%d, fila=%d)",
+            settings.RETRIEVAL_WORKERS, settings.RETRIEVAL_MAX_QUEUE
+        )
+    return _retrieval_executor
+
+
+def shutdown_retrieval_executor():
+    """Encerra o executor global (chamado no shutdown da aplicação)."""
+    global _retrieval_executor
+    if _retrieval_executor is not None:
+        _retrieval_executor.shutdown()
+        _retrieval_executor = None
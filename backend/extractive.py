@@ -0,0 +1,139 @@
+"""
+Resposta extrativa de fallback (sem LLM).
+
+Quando o LLM está indisponível ou sem quota, em vez de devolver só uma
+mensagem de erro, montamos uma resposta com as sentenças mais relevantes
+dos contextos já recuperados por search():
+- Sinal semântico: similaridade densa do chunk (embedding já calculado na busca)
+- Sinal lexical: sobreposição de termos da pergunta ponderada pelo IDF do BM25
+- Sentenças quase repetidas são descartadas
+- A ordem final segue a relevância do chunk e a ordem de leitura dentro dele
+
+Tudo roda em CPU em poucos milissegundos (nenhum embedding novo é calculado).
+"""
+
+from typing import Optional
+
+from . import settings
+from .chunking import split_into_sentences
+from .hybrid_search import BM25
+
+
+# Marcador da resposta extrativa (também impede que ela entre no cache)
+EXTRACTIVE_HEADER = "📄 **Resposta extraída do acervo**"
+
+# Sentenças menores que isso raramente fazem sentido fora do contexto
+MIN_SENTENCE_CHARS = 30
+
+# Peso do sinal semântico vs. lexical no score da sentença
+DENSE_WEIGHT = 0.5
+
+# Similaridade de termos (Jaccard) acima da qual duas sentenças são "a mesma"
+DUPLICATE_THRESHOLD = 0.7
+
+_fallback_bm25 = BM25()
+
+
+def _lexical_score(query_terms: set, sentence_terms: set, idf: dict) -> float:
+    """Fração do peso IDF dos termos da pergunta presente na sentença (0-1)."""
+    if not query_terms:
+        return 0.0
+    total = sum(idf.get(term, 1.0) for term in query_terms)
+    matched = sum(idf.get(term, 1.0) for term in query_terms & sentence_terms)
+    return matched / total if total else 0.0
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def select_sentences(
+    question: str,
+    contexts: list[dict],
+    max_sentences: int = 4,
+    bm25: Optional[BM25] = None
+) -> list[dict]:
+    """
+    Seleciona as sentenças mais relevantes para a pergunta.
+
+    Args:
+        question: Pergunta do usuário
+        contexts: Saída de search() (com score denso e, se houver, final_score)
+        max_sentences: Máximo de sentenças na resposta
+        bm25: Índice BM25 já ajustado (usa seu IDF); sem ele, todos os termos pesam 1
+
+    Returns:
+        Lista de dicts {text, title, page_start, page_end, score} em ordem de leitura
+    """
+    bm25 = bm25 or _fallback_bm25
+    query_terms = set(bm25._tokenize(question))
+    if not contexts:
+        return []
+
+    dense_scores = [ctx.get("score", 0.0) for ctx in contexts]
+    top_dense = max(dense_scores) or 1.0
+
+    candidates = []
+    for ctx_rank, ctx in enumerate(contexts):
+        dense = max(0.0, ctx.get("score", 0.0)) / top_dense
+        for position, sentence in enumerate(split_into_sentences(ctx.get("content", ""))):
+            if len(sentence) < MIN_SENTENCE_CHARS:
+                continue
+            terms = set(bm25._tokenize(sentence))
+            lexical = _lexical_score(query_terms, terms, bm25.idf)
+            # Leve preferência pelo início do chunk (costuma introduzir o tema)
+            score = DENSE_WEIGHT * dense + (1 - DENSE_WEIGHT) * lexical - 0.01 * position
+            candidates.append({
+                "text": sentence,
+                "terms": terms,
+                "lexical": lexical,
+                "score": score,
+                "ctx_rank": ctx_rank,
+                "position": position,
+                "title": ctx.get("title", "Desconhecido"),
+                "page_start": ctx.get("page_start", "?"),
+                "page_end": ctx.get("page_end", "?"),
+            })
+
+    # Prefere sentenças que mencionam algum termo da pergunta
+    candidates.sort(key=lambda c: (c["lexical"] > 0, c["score"]), reverse=True)
+
+    selected = []
+    for candidate in candidates:
+        if any(_jaccard(candidate["terms"], s["terms"]) >= DUPLICATE_THRESHOLD for s in selected):
+            continue
+        selected.append(candidate)
+        if len(selected) >= max_sentences:
+            break
+
+    selected.sort(key=lambda c: (c["ctx_rank"], c["position"]))
+    return [
+        {key: c[key] for key in ("text", "title", "page_start", "page_end", "score")}
+        for c in selected
+    ]
+
+
+def build_extractive_answer(
+    question: str,
+    contexts: list[dict],
+    max_sentences: Optional[int] = None,
+    bm25: Optional[BM25] = None,
+    note: str = "o gerador de respostas está indisponível no momento; seguem os trechos mais relevantes encontrados"
+) -> Optional[str]:
+    """
+    Monta a resposta extrativa formatada (markdown) ou None se nada for aproveitável.
+    `note` explica ao usuário por que a resposta é extrativa.
+    """
+    if max_sentences is None:
+        max_sentences = settings.EXTRACTIVE_MAX_SENTENCES
+    sentences = select_sentences(question, contexts, max_sentences=max_sentences, bm25=bm25)
+    if not sentences:
+        return None
+
+    lines = [f"{EXTRACTIVE_HEADER} ({note}):", ""]
+    for s in sentences:
+        pages = f"p. {s['page_start']}" if s["page_start"] == s["page_end"] else f"pp. {s['page_start']}-{s['page_end']}"
+        lines.append(f"- {s['text']} *({s['title']}, {pages})*")
+    return "\n".join(lines)
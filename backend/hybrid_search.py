@@ -14,6 +14,10 @@ from collections import Counter
 import math
 import re
 
+from .tracing import get_logger
+
+logger = get_logger(__name__)
+
 
 class BM25:
     """
@@ -64,7 +68,7 @@ class BM25:
             # IDF suavizado (evita divisão por zero)
             self.idf[term] = math.log((num_docs - freq + 0.5) / (freq + 0.5) + 1)
         
-        print(f"✓ BM25 indexado: {num_docs} documentos, {len(self.idf)} termos únicos")
+        logger.info("✓ BM25 indexado: %s documentos, %s termos únicos", num_docs, len(self.idf))
     
     def _tokenize(self, text: str) -> List[str]:
         """
@@ -200,7 +204,7 @@ class HybridSearch:
         # Indexa BM25
         self.bm25.fit(self.corpus)
         
-        print(f"✓ Hybrid Search indexado: {len(self.corpus)} documentos")
+        logger.info("✓ Hybrid Search indexado: %s documentos", len(self.corpus))
     
     def search(
         self,
@@ -279,7 +283,7 @@ class HybridSearch:
                 result['bm25_boosted'] = idx in [i for i, _ in sparse_ranking[:5]]
                 hybrid_results.append(result)
         
-        print(f"🔀 Hybrid Search: {len(dense_results)} dense → {len(hybrid_results)} hybrid")
+        logger.debug("🔀 Hybrid Search: %s dense → %s hybrid", len(dense_results), len(hybrid_results))
         
         return hybrid_results
 
@@ -0,0 +1,511 @@
+"""
+Camada de provedores LLM (endpoints OpenAI-compatible) com failover e hedging.
+
+Provedores:
+- Lista ordenada em LLM_PROVIDERS (JSON); sem ela, um único provedor Groq
+  montado a partir de GROQ_API_KEY / GROQ_BASE_URL / GROQ_MODEL
+- Cada provedor mantém um AsyncOpenAI de vida longa (pool HTTP com keep-alive),
+  seu próprio circuit breaker e, se tiver rpm/tpm, seu próprio rate limiter
+- O servidor local backend/mock_llm.py pode entrar na lista como stand-in
+
+Hedging (LLM_HEDGING):
+- A geração começa no primeiro provedor disponível da lista
+- Se ele não produzir o primeiro token dentro do p95 do seu time-to-first-token
+  (ou LLM_HEDGE_DELAY_S enquanto houver poucas amostras), o próximo provedor é
+  disparado em paralelo
+- O primeiro a produzir um token vence; o perdedor é cancelado
+- Erro antes do primeiro token faz failover imediato para o próximo provedor
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Optional
+
+import httpx
+from openai import AsyncOpenAI, APIConnectionError, APITimeoutError, APIStatusError, RateLimitError
+
+from . import settings
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .context_packer import count_tokens
+from .timing import record_stage
+from .metrics import LLM_REQUESTS, LLM_TOKENS, LLM_RATE_LIMITED
+from .rate_limiter import LLMRateLimiter, RateLimitExceeded, Ticket, PRIORITY_INTERACTIVE
+from .tracing import get_logger
+
+logger = get_logger(__name__)
+
+
+class NoProviderAvailable(RuntimeError):
+    """Nenhum provedor LLM configurado, ou todos com circuito aberto."""
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """
+    Indica se o erro aponta indisponibilidade do provedor (conta para o circuit breaker).
+    Timeouts, falhas de conexão e 5xx contam; 4xx (incluindo 429) não.
+    """
+    if isinstance(error, (APIConnectionError, APITimeoutError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code >= 500
+    return isinstance(error, Exception)
+
+
+def estimate_tokens(text: str) -> int:
+    """Tokens do texto para reserva no rate limiter (tokenizer do context packer)."""
+    return count_tokens(text)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Extrai o header retry-after de um erro 429, se presente."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_token_quota_error(error: Exception) -> bool:
+    """
+    Indica se o 429 é de quota de tokens (TPM) e não de requisições: Groq manda
+    `type: "tokens"` no corpo, a OpenAI cita "tokens per min" na mensagem, e
+    ambos zeram o header x-ratelimit-remaining-tokens.
+    """
+    body = getattr(error, "body", None)
+    if isinstance(body, dict):
+        body = body.get("error", body)
+        if isinstance(body, dict) and body.get("type") == "tokens":
+            return True
+    if "tokens per min" in str(error).lower():
+        return True
+    response = getattr(error, "response", None)
+    if response is None:
+        return False
+    return response.headers.get("x-ratelimit-remaining-tokens") == "0"
+
+
+def _outcome(error: Exception) -> str:
+    """Rótulo do resultado de uma tentativa para aiye_llm_requests_total."""
+    if isinstance(error, RateLimitError):
+        return "rate_limited"
+    if isinstance(error, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(error, RateLimitExceeded):
+        return "queue_timeout"
+    return "error"
+
+
+def _fill_usage(usage: Optional[dict], reported) -> None:
+    if usage is not None and reported is not None:
+        usage["prompt_tokens"] = reported.prompt_tokens
+        usage["completion_tokens"] = reported.completion_tokens
+        usage["total_tokens"] = reported.total_tokens
+
+
+class LLMProvider:
+    """Endpoint OpenAI-compatible com cliente, circuit breaker e rate limiter próprios."""
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        api_key: str,
+        model: str,
+        small_model: Optional[str] = None,
+        rpm: Optional[int] = None,
+        tpm: Optional[int] = None
+    ):
+        """
+        Args:
+            name: Nome do provedor (aparece em logs, stats e meta)
+            base_url: URL base da API OpenAI-compatible
+            api_key: Chave da API
+            model: Modelo usado nas completions
+            small_model: Modelo menor para rotas baratas (padrão: o próprio `model`)
+            rpm, tpm: Orçamentos por minuto; sem eles o provedor não tem limiter
+        """
+        self.name = name
+        self.base_url = base_url
+        self.api_key = api_key
+        self.model = model
+        self.small_model = small_model or model
+        self.breaker = CircuitBreaker(
+            name=name,
+            failure_threshold=settings.LLM_BREAKER_FAILURES,
+            recovery_timeout_s=settings.LLM_BREAKER_RECOVERY_S,
+            is_failure=is_provider_failure,
+        )
+        self.limiter = LLMRateLimiter(rpm=rpm, tpm=tpm) if rpm and tpm else None
+        self._client: Optional[AsyncOpenAI] = None
+        self._ttft_samples: deque = deque(maxlen=200)
+        self.wins = 0
+        self.hedges = 0
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        """
+        AsyncOpenAI do provedor, criado na primeira chamada.
+
+        Retries ficam a cargo de generate_answer() (max_retries=0 aqui),
+        para não multiplicar tentativas em duas camadas.
+        """
+        if self._client is None:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+                    keepalive_expiry=30.0,
+                ),
+                timeout=httpx.Timeout(settings.LLM_TIMEOUT_S, connect=5.0),
+            )
+            self._client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                max_retries=0,
+                http_client=http_client,
+            )
+            logger.info("✓ Cliente LLM '%s' inicializado (pool=%s conexões)", self.name, settings.LLM_MAX_CONNECTIONS)
+        return self._client
+
+    async def close(self):
+        """Fecha o pool de conexões do provedor."""
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    def record_ttft(self, seconds: float):
+        self._ttft_samples.append(seconds)
+
+    def ttft_p95(self) -> Optional[float]:
+        """p95 do time-to-first-token observado (None com poucas amostras)."""
+        if len(self._ttft_samples) < settings.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._ttft_samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def hedge_delay(self) -> float:
+        """Quanto esperar pelo primeiro token antes de disparar o próximo provedor."""
+        p95 = self.ttft_p95()
+        return p95 if p95 is not None else settings.LLM_HEDGE_DELAY_S
+
+    async def stream(
+        self,
+        prompt: str,
+        max_tokens: int = 800,
+        temperature: float = 0.2,
+        usage: Optional[dict] = None,
+        model: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Gera uma completion em streaming, produzindo os fragmentos de texto.
+        Se `usage` for informado, é preenchido quando o último chunk reportar tokens.
+        """
+        stream = await self.client.chat.completions.create(
+            model=model or self.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        async for chunk in stream:
+            _fill_usage(usage, getattr(chunk, "usage", None))
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+    def stats(self) -> dict:
+        """Retorna vitórias, hedges, TTFT e estado do breaker/limiter do provedor."""
+        p95 = self.ttft_p95()
+        return {
+            "name": self.name,
+            "model": self.model,
+            "small_model": self.small_model,
+            "base_url": self.base_url,
+            "wins": self.wins,
+            "hedges": self.hedges,
+            "ttft_samples": len(self._ttft_samples),
+            "ttft_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "hedge_delay_ms": round(self.hedge_delay() * 1000, 1),
+            "circuit_breaker": self.breaker.stats(),
+            "rate_limiter": self.limiter.stats() if self.limiter else None,
+        }
+
+
+def load_providers() -> list[LLMProvider]:
+    """
+    Monta a lista ordenada de provedores a partir de LLM_PROVIDERS, por exemplo:
+
+        [{"name": "groq", "base_url": "https://api.groq.com/openai/v1",
+          "api_key_env": "GROQ_API_KEY", "model": "llama-3.3-70b-versatile",
+          "small_model": "llama-3.1-8b-instant", "rpm": 30, "tpm": 6000},
+         {"name": "local", "base_url": "http://127.0.0.1:8001/v1",
+          "api_key": "local", "model": "mock-echo"}]
+
+    Sem LLM_PROVIDERS, usa só o Groq (GROQ_*). Provedores sem API key são ignorados.
+    """
+    if settings.LLM_PROVIDERS:
+        configs = json.loads(settings.LLM_PROVIDERS)
+    else:
+        configs = [{
+            "name": "groq",
+            "base_url": settings.GROQ_BASE_URL,
+            "api_key": settings.GROQ_API_KEY,
+            "model": settings.GROQ_MODEL or "llama-3.3-70b-versatile",
+            "small_model": settings.LLM_SMALL_MODEL,
+            "rpm": settings.GROQ_RPM,
+            "tpm": settings.GROQ_TPM,
+        }]
+
+    providers = []
+    for config in configs:
+        api_key = config.get("api_key") or os.getenv(config.get("api_key_env", ""), "")
+        if not api_key:
+            logger.warning("⚠️ Provedor LLM '%s' sem API key, ignorado", config.get('name'))
+            continue
+        providers.append(LLMProvider(
+            name=config["name"],
+            base_url=config["base_url"],
+            api_key=api_key,
+            model=config["model"],
+            small_model=config.get("small_model"),
+            rpm=config.get("rpm"),
+            tpm=config.get("tpm"),
+        ))
+    return providers
+
+
+# Provedores globais (criados sob demanda, fechados no shutdown da aplicação)
+_providers: Optional[list[LLMProvider]] = None
+
+
+def get_providers() -> list[LLMProvider]:
+    """Retorna a lista global e ordenada de provedores LLM."""
+    global _providers
+    if _providers is None:
+        _providers = load_providers()
+        names = ", ".join(p.name for p in _providers) or "nenhum"
+        logger.info("✓ Provedores LLM: %s (hedging=%s)", names, 'on' if settings.LLM_HEDGING else 'off')
+    return _providers
+
+
+async def close_llm_clients():
+    """Fecha os pools de conexões de todos os provedores (chamado no shutdown)."""
+    global _providers
+    if _providers is not None:
+        for provider in _providers:
+            await provider.close()
+        _providers = None
+
+
+def providers_stats() -> list[dict]:
+    """Retorna as estatísticas de cada provedor, na ordem de preferência."""
+    return [provider.stats() for provider in get_providers()]
+
+
+class _Attempt:
+    """Uma tentativa de geração em um provedor; publica eventos numa fila compartilhada."""
+
+    def __init__(self, provider: LLMProvider, events: asyncio.Queue, model: str):
+        self.provider = provider
+        self.model = model
+        self.events = events
+        self.usage: dict = {}
+        self.ticket: Optional[Ticket] = None
+        self.task: Optional[asyncio.Task] = None
+        self.started_at = time.monotonic()
+        self.got_first_token = False
+
+    async def run(self, prompt: str, max_tokens: int, temperature: float, priority: int, max_wait_s: float):
+        provider = self.provider
+        prompt_tokens = estimate_tokens(prompt)
+        try:
+            if provider.limiter:
+                self.ticket = await provider.limiter.acquire(
+                    prompt_tokens + max_tokens,
+                    priority=priority,
+                    max_wait_s=max_wait_s
+                )
+            with provider.breaker.guard():
+                async for delta in provider.stream(
+                    prompt, max_tokens, temperature, usage=self.usage, model=self.model
+                ):
+                    if not self.got_first_token:
+                        self.got_first_token = True
+                        provider.record_ttft(time.monotonic() - self.started_at)
+                    self.events.put_nowait((self, "token", delta))
+            if self.ticket:
+                provider.limiter.release(self.ticket, self.usage.get("total_tokens"))
+            LLM_REQUESTS.inc(provider=provider.name, outcome="ok")
+            for kind in ("prompt", "completion"):
+                if self.usage.get(f"{kind}_tokens"):
+                    LLM_TOKENS.inc(self.usage[f"{kind}_tokens"], provider=provider.name, kind=kind)
+            self.events.put_nowait((self, "done", None))
+        except asyncio.CancelledError:
+            # Perdedor do hedge ou failover: cobra só o que foi de fato consumido
+            if self.ticket:
+                provider.limiter.release(self.ticket, self.usage.get("total_tokens") or prompt_tokens)
+            raise
+        except Exception as e:
+            if self.ticket and isinstance(e, CircuitOpenError):
+                provider.limiter.release(self.ticket, used_tokens=0)
+            if isinstance(e, RateLimitError):
+                LLM_RATE_LIMITED.inc(provider=provider.name)
+                if provider.limiter:
+                    # 429 apesar do limiter: pausa pelo retry-after ou esvazia o balde da quota estourada
+                    provider.limiter.on_rate_limited(retry_after_seconds(e), token_quota=is_token_quota_error(e))
+            LLM_REQUESTS.inc(provider=provider.name, outcome=_outcome(e))
+            self.events.put_nowait((self, "error", e))
+
+    def cancel(self):
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
+
+async def stream_llm(
+    prompt: str,
+    max_tokens: int = 800,
+    temperature: float = 0.2,
+    priority: int = PRIORITY_INTERACTIVE,
+    meta: Optional[dict] = None,
+    small_model: bool = False,
+    max_queue_wait_s: Optional[float] = None
+) -> AsyncIterator[str]:
+    """
+    Gera a resposta em streaming com failover e hedging entre os provedores.
+
+    `meta`, se fornecido, recebe provedor e modelo vencedores, se houve hedge,
+    quantos failovers ocorreram, posição/espera na fila do limiter e tokens usados.
+    Com `small_model`, cada provedor usa seu modelo menor (rota light do roteador).
+    `max_queue_wait_s` limita a espera na fila do limiter (padrão LLM_QUEUE_MAX_WAIT_S).
+
+    Raises:
+        NoProviderAvailable: sem provedores configurados ou todos com circuito aberto
+        Exception: o erro da última tentativa, se todos os provedores falharem
+    """
+    providers = get_providers()
+    if not providers:
+        raise NoProviderAvailable("Nenhum provedor LLM configurado")
+    pending = deque(p for p in providers if not p.breaker.fast_fail())
+    if not pending:
+        raise NoProviderAvailable("Todos os provedores LLM estão com circuito aberto")
+
+    if max_queue_wait_s is None:
+        max_queue_wait_s = settings.LLM_QUEUE_MAX_WAIT_S
+    events: asyncio.Queue = asyncio.Queue()
+    attempts: list[_Attempt] = []
+    in_flight: set[_Attempt] = set()
+
+    def launch() -> _Attempt:
+        provider = pending.popleft()
+        attempt = _Attempt(provider, events, provider.small_model if small_model else provider.model)
+        attempt.task = asyncio.get_running_loop().create_task(
+            attempt.run(prompt, max_tokens, temperature, priority, max_queue_wait_s)
+        )
+        attempts.append(attempt)
+        in_flight.add(attempt)
+        return attempt
+
+    started_at = time.perf_counter()
+    hedged = False
+    failovers = 0
+    winner: Optional[_Attempt] = None
+    first_kind, first_payload = None, None
+
+    try:
+        current = launch()
+        hedge_at = time.monotonic() + current.provider.hedge_delay()
+
+        # Fase 1: aguarda o primeiro token (ou fim) de qualquer tentativa
+        while winner is None:
+            timeout = None
+            if settings.LLM_HEDGING and pending and len(in_flight) == 1:
+                timeout = max(0.0, hedge_at - time.monotonic())
+            try:
+                attempt, kind, payload = await asyncio.wait_for(events.get(), timeout)
+            except asyncio.TimeoutError:
+                hedge = launch()
+                hedge.provider.hedges += 1
+                hedged = True
+                logger.info(
+                    "🔀 Hedge: '%s' sem primeiro token em %.0fms, disparando '%s'",
+                    current.provider.name, current.provider.hedge_delay() * 1000, hedge.provider.name
+                )
+                continue
+
+            if kind != "error":
+                winner, first_kind, first_payload = attempt, kind, payload
+                break
+
+            in_flight.discard(attempt)
+            if in_flight:
+                logger.warning("✗ Provedor '%s' falhou (%s); aguardando a outra tentativa", attempt.provider.name, payload)
+                continue
+            if not pending:
+                raise payload
+            failovers += 1
+            current = launch()
+            hedge_at = time.monotonic() + current.provider.hedge_delay()
+            logger.warning("↪️ Failover: '%s' falhou (%s), tentando '%s'", attempt.provider.name, payload, current.provider.name)
+
+        # Cancela o perdedor do hedge
+        for attempt in attempts:
+            if attempt is not winner:
+                attempt.cancel()
+        winner.provider.wins += 1
+
+        if meta is not None:
+            meta["llm_provider"] = winner.provider.name
+            meta["llm_model"] = winner.model
+            meta["llm_hedged"] = hedged
+            meta["llm_failovers"] = failovers
+            if winner.ticket:
+                meta["llm_queue_position"] = winner.ticket.position
+                meta["llm_queue_wait_ms"] = winner.ticket.wait_ms
+
+        record_stage("llm_ttft", (time.perf_counter() - started_at) * 1000)
+
+        # Fase 2: repassa os tokens do vencedor
+        if first_kind == "token":
+            yield first_payload
+            while True:
+                attempt, kind, payload = await events.get()
+                if attempt is not winner:
+                    continue
+                if kind == "token":
+                    yield payload
+                elif kind == "done":
+                    break
+                else:
+                    raise payload
+
+        record_stage("llm_total", (time.perf_counter() - started_at) * 1000)
+        if meta is not None and winner.usage:
+            meta["llm_usage"] = dict(winner.usage)
+    finally:
+        # Cliente desconectou ou erro: nenhuma tentativa fica rodando em segundo plano
+        for attempt in attempts:
+            attempt.cancel()
+
+
+async def complete_llm(
+    prompt: str,
+    max_tokens: int = 800,
+    temperature: float = 0.2,
+    priority: int = PRIORITY_INTERACTIVE,
+    meta: Optional[dict] = None,
+    small_model: bool = False,
+    max_queue_wait_s: Optional[float] = None
+) -> str:
+    """Versão não-streaming de stream_llm(): retorna o texto completo."""
+    parts = []
+    async for delta in stream_llm(prompt, max_tokens, temperature, priority, meta, small_model, max_queue_wait_s):
+        parts.append(delta)
+    return "".join(parts).strip()
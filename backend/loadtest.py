@@ -0,0 +1,327 @@
+"""
+Teste de carga do /ask com varredura de concorrência.
+
+Para cada configuração (workers do uvicorn × RETRIEVAL_WORKERS × cache
+ligado/desligado) sobe a aplicação em um subprocesso apontando para o LLM
+local (backend/mock_llm.py), e dispara uma mistura de perguntas em níveis
+crescentes de concorrência (laço fechado: cada cliente virtual manda a
+próxima pergunta assim que recebe a resposta). Por nível, reporta vazão,
+p50/p95/p99, taxa de erro por status e cache hits observados; por
+configuração, o ponto de saturação.
+
+Ponto de saturação: primeiro nível em que a vazão deixa de crescer mais que
+--knee (ex.: 10%) sobre o melhor nível anterior, ou em que a taxa de erro
+passa de --max-error-rate. A partir dele, mais concorrência só aumenta fila.
+
+Mistura de perguntas: com probabilidade --hit-ratio a requisição usa uma
+pergunta do conjunto "quente" (repetida, servida do cache após o
+aquecimento); senão, uma pergunta com sufixo único (sempre cache miss).
+
+Uso:
+    python -m backend.loadtest --workers 1,2 --executor 2,4 --cache on,off
+    python -m backend.loadtest --concurrency 1,4,16 --duration 15 --hit-ratio 0.5
+    python -m backend.loadtest --url http://127.0.0.1:8000   # servidor já rodando
+
+O LLM local herda as variáveis MOCK_LLM_* (latência, 429/5xx). Resultados em
+bench_results/loadtest-<data>.json.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+DEFAULT_QUESTIONS = [
+    "O que é Umbanda?",
+    "Quem são os Orixás cultuados na Umbanda?",
+    "O que são os pretos-velhos?",
+    "Qual o papel dos caboclos nas giras?",
+    "O que é um ponto riscado?",
+    "Como funciona o desenvolvimento mediúnico?",
+    "Quem é Exu na Umbanda?",
+    "O que é uma gira?",
+    "Qual a diferença entre Umbanda e Candomblé?",
+    "O que são as linhas de trabalho?",
+]
+
+
+def load_questions(path: Optional[str]) -> list[str]:
+    """Perguntas de um arquivo .txt (uma por linha) ou JSONL com `question` (formato do retrieval_bench)."""
+    if not path:
+        return DEFAULT_QUESTIONS
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            questions.append(json.loads(line)["question"] if line.startswith("{") else line)
+    return questions
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_healthy(url: str, process: subprocess.Popen, timeout_s: float):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Processo saiu com código {process.returncode} antes de ficar pronto ({url})")
+        try:
+            if httpx.get(f"{url}/healthz", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} não respondeu /healthz em {timeout_s:.0f}s")
+
+
+def stop(process: Optional[subprocess.Popen]):
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def start_mock_llm(port: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "backend.mock_llm", "--port", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def start_app(port: int, workers: int, executor: int, cache: bool, llm_url: str, log_path: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "GROQ_BASE_URL": llm_url,
+        "GROQ_API_KEY": os.getenv("LOADTEST_LLM_API_KEY", "local"),
+        "LLM_PROVIDERS": "",
+        "RETRIEVAL_WORKERS": str(executor),
+        "RESPONSE_CACHE_SIZE": os.getenv("RESPONSE_CACHE_SIZE", "100") if cache else "0",
+        # O limitador de cota do Groq (30 RPM) mediria a cota, não a aplicação
+        "GROQ_RPM": os.getenv("LOADTEST_GROQ_RPM", "100000"),
+        "GROQ_TPM": os.getenv("LOADTEST_GROQ_TPM", "100000000"),
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+    }
+    log = open(log_path, "w")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.app:app",
+         "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+
+
+class Workload:
+    """Gera a sequência de perguntas com a proporção de cache hits pedida."""
+
+    def __init__(self, questions: list[str], hit_ratio: float, hot_set: int, seed: int):
+        self.rng = random.Random(seed)
+        self.hot = questions[:max(1, hot_set)]
+        self.cold = questions
+        self.hit_ratio = hit_ratio
+        self._unique = itertools.count()
+
+    def next_question(self) -> str:
+        if self.rng.random() < self.hit_ratio:
+            return self.rng.choice(self.hot)
+        # Sufixo único: chave de cache nova, mesma busca semântica
+        return f"{self.rng.choice(self.cold)} (variação {next(self._unique)})"
+
+
+def percentile(values: list[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))], 1)
+
+
+async def run_level(url: str, endpoint: str, workload: Workload, concurrency: int,
+                    duration_s: float, timeout_s: float) -> dict:
+    """Laço fechado com `concurrency` clientes virtuais por `duration_s` segundos."""
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    cached = 0
+    stop_at = time.monotonic() + duration_s
+
+    async def client(http: httpx.AsyncClient):
+        nonlocal cached
+        while time.monotonic() < stop_at:
+            started_at = time.perf_counter()
+            try:
+                response = await http.post(f"{url}{endpoint}", json={"question": workload.next_question()})
+                status = str(response.status_code)
+                if response.status_code == 200 and response.json().get("meta", {}).get("route") == "cached":
+                    cached += 1
+            except httpx.TimeoutException:
+                status = "timeout"
+            except httpx.HTTPError:
+                status = "connection_error"
+            latencies.append((time.perf_counter() - started_at) * 1000)
+            statuses[status] += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    started_at = time.perf_counter()
+    async with httpx.AsyncClient(timeout=timeout_s, limits=limits) as http:
+        await asyncio.gather(*(client(http) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started_at
+
+    total = sum(statuses.values())
+    ok = statuses.get("200", 0)
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "throughput_rps": round(ok / elapsed, 2),
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "error_rate": round((total - ok) / total, 4) if total else 0.0,
+        "statuses": dict(statuses),
+        "cache_hit_ratio": round(cached / ok, 4) if ok else 0.0,
+    }
+
+
+def saturation_point(levels: list[dict], knee: float, max_error_rate: float) -> Optional[int]:
+    """Concorrência a partir da qual a vazão parou de crescer (ou os erros passaram do limite)."""
+    best = 0.0
+    for level in levels:
+        if level["error_rate"] > max_error_rate:
+            return level["concurrency"]
+        if best and level["throughput_rps"] < best * (1 + knee):
+            return level["concurrency"]
+        best = max(best, level["throughput_rps"])
+    return None
+
+
+async def warm_up(url: str, endpoint: str, workload: Workload, timeout_s: float):
+    """Carrega modelo/índice e popula o cache com as perguntas quentes."""
+    async with httpx.AsyncClient(timeout=timeout_s) as http:
+        for question in workload.hot:
+            await http.post(f"{url}{endpoint}", json={"question": question})
+
+
+def run_configuration(url: str, args, label: dict) -> dict:
+    levels = []
+    workload = Workload(args.questions, args.hit_ratio, args.hot_set, args.seed)
+    asyncio.run(warm_up(url, args.endpoint, workload, args.timeout))
+    print(f"\n🚦 {label or url}")
+    print(f"   {'conc':>5} {'req':>6} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'erros':>7} {'hits':>6}")
+    for concurrency in args.concurrency:
+        level = asyncio.run(run_level(url, args.endpoint, workload, concurrency, args.duration, args.timeout))
+        levels.append(level)
+        print(
+            f"   {concurrency:>5} {level['requests']:>6} {level['throughput_rps']:>8.1f} "
+            f"{level['p50_ms'] or 0:>7.0f}ms {level['p95_ms'] or 0:>7.0f}ms {level['p99_ms'] or 0:>7.0f}ms "
+            f"{level['error_rate']:>7.1%} {level['cache_hit_ratio']:>6.0%}"
+        )
+    saturated_at = saturation_point(levels, args.knee, args.max_error_rate)
+    best = max(levels, key=lambda level: level["throughput_rps"])
+    print(f"   ➜ vazão máxima {best['throughput_rps']:.1f} rps (concorrência {best['concurrency']}); "
+          f"saturação: {saturated_at if saturated_at else 'não atingida'}")
+    return {
+        "config": label,
+        "levels": levels,
+        "max_throughput_rps": best["throughput_rps"],
+        "max_throughput_concurrency": best["concurrency"],
+        "saturated_at": saturated_at,
+    }
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(item) for item in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do /ask com varredura de concorrência")
+    parser.add_argument("--url", help="Servidor já rodando (não sobe app nem LLM local; ignora --workers/--executor/--cache)")
+    parser.add_argument("--llm-url", help="LLM OpenAI-compatible já rodando (padrão: sobe backend.mock_llm)")
+    parser.add_argument("--endpoint", default="/ask", choices=["/ask", "/ask-raw"])
+    parser.add_argument("--workers", type=_int_list, default=[1], help="Workers do uvicorn (ex.: 1,2)")
+    parser.add_argument("--executor", type=_int_list, default=[2], help="RETRIEVAL_WORKERS (ex.: 2,4)")
+    parser.add_argument("--cache", default="on", help="on, off ou on,off")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--duration", type=float, default=20, help="Segundos por nível de concorrência")
+    parser.add_argument("--timeout", type=float, default=60, help="Timeout por requisição (s)")
+    parser.add_argument("--questions", help="Arquivo .txt ou JSONL com as perguntas")
+    parser.add_argument("--hit-ratio", type=float, default=0.3, help="Fração de requisições com pergunta repetida")
+    parser.add_argument("--hot-set", type=int, default=5, help="Quantidade de perguntas repetidas")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--knee", type=float, default=0.10, help="Ganho mínimo de vazão para não considerar saturado")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--startup-timeout", type=float, default=180, help="Espera pelo /healthz (carga do modelo)")
+    parser.add_argument("--output", help="Arquivo JSON de saída (padrão: bench_results/loadtest-<data>.json)")
+    args = parser.parse_args()
+    args.questions = load_questions(args.questions)
+
+    report = {
+        "run": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "endpoint": args.endpoint,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "hit_ratio": args.hit_ratio,
+            "hot_set": args.hot_set,
+            "questions": len(args.questions),
+            "mock_llm": {key: value for key, value in os.environ.items() if key.startswith("MOCK_LLM_")},
+        },
+        "configurations": [],
+    }
+
+    if args.url:
+        report["configurations"].append(run_configuration(args.url.rstrip("/"), args, {}))
+    else:
+        mock = None
+        llm_url = args.llm_url
+        try:
+            if not llm_url:
+                mock_port = free_port()
+                mock = start_mock_llm(mock_port)
+                wait_healthy(f"http://127.0.0.1:{mock_port}", mock, 30)
+                llm_url = f"http://127.0.0.1:{mock_port}/v1"
+            report["run"]["llm_url"] = llm_url
+
+            cache_modes = [mode.strip() == "on" for mode in args.cache.split(",")]
+            for workers, executor, cache in itertools.product(args.workers, args.executor, cache_modes):
+                label = {"workers": workers, "executor": executor, "cache": cache}
+                port = free_port()
+                log_path = os.path.join(tempfile.gettempdir(), f"loadtest-app-{port}.log")
+                app = start_app(port, workers, executor, cache, llm_url, log_path)
+                try:
+                    wait_healthy(f"http://127.0.0.1:{port}", app, args.startup_timeout)
+                    report["configurations"].append(run_configuration(f"http://127.0.0.1:{port}", args, label))
+                except RuntimeError as e:
+                    print(f"❌ {label}: {e} (log em {log_path})")
+                finally:
+                    stop(app)
+        finally:
+            stop(mock)
+
+    output = args.output or f"bench_results/loadtest-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✓ Resultado gravado em {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from backend.models import AskRequest, AskResponse, Source, FeedbackRequest
 from backend.rag import search, generate_answer, load_embedder
+from backend.executor import get_retrieval_executor
 from backend import settings
 
 
@@ -78,14 +79,15 @@ async def ask(request: AskRequest) -> AskResponse:
             )
         
         # Busca contextos relevantes
-        contexts = search(
+        contexts = await get_retrieval_executor().run(
+            search,
             query=question,
             top_k=settings.TOP_K,
             min_sim=settings.MIN_SIM
         )
         
         # Gera resposta
-        answer = generate_answer(question, contexts)
+        answer = await generate_answer(question, contexts)
         
         # Se resposta padrão de não encontrado, não retorna fontes
         resposta_padrao = "Não encontrei essa informação no acervo, entre em contato com o administrador da plataforma."
@@ -149,8 +151,8 @@ async def ask_raw(request: Request) -> AskResponse:
         if len(question) < 3:
             raise HTTPException(status_code=400, detail="A pergunta deve ter pelo menos 3 caracteres")
 
-        contexts = search(query=question, top_k=settings.TOP_K, min_sim=settings.MIN_SIM)
-        answer = generate_answer(question, contexts)
+        contexts = await get_retrieval_executor().run(search, query=question, top_k=settings.TOP_K, min_sim=settings.MIN_SIM)
+        answer = await generate_answer(question, contexts)
 
         resposta_padrao = "Não encontrei essa informação no acervo, entre em contato com o administrador da plataforma."
         if answer.strip() == resposta_padrao:
@@ -0,0 +1,291 @@
+"""
+Contabilidade de memória do processo (índice, caches, modelos).
+
+Componentes medidos:
+- faiss: bytes dos vetores/códigos de cada índice carregado
+- faiss_binary: códigos do índice binário (DENSE_RETRIEVER=binary)
+- chunk_metadata: metadata.json já carregado (docs + chunks)
+- bm25: estruturas do BM25/HybridSearch (IDF, frequências, corpus)
+- cache_response / cache_query_expansion: cada camada de cache
+- embedder: pesos e buffers do modelo de embedding
+- rss: memória residente total do processo
+- top_allocators: maiores alocadores do heap Python (tracemalloc), quando
+  MEMORY_TRACEMALLOC=true (tem custo de CPU e memória; use só para investigar)
+
+Objetos compartilhados (ex.: o texto de um chunk citado no cache) são contados
+uma única vez, no primeiro componente medido, na ordem acima. As medidas de
+estruturas Python são estimativas (sys.getsizeof recursivo).
+
+Cada relatório é anexado a MEMORY_HISTORY_PATH (JSONL), que sobrevive a um
+OOM-kill; com MEMORY_SAMPLE_INTERVAL_S > 0 a aplicação grava periodicamente.
+O arquivo guarda só os últimos MEMORY_HISTORY_MAX_ENTRIES relatórios.
+
+CLI:
+    python -m backend.memory            # carrega índice/modelo e mostra o relatório
+    python -m backend.memory --history  # mostra a evolução gravada
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+import types
+from collections import deque
+from typing import Optional
+
+import faiss
+
+from . import settings
+from .ann_index import binary_index_stats
+from .cache import get_response_cache
+from .metrics import process_rss_bytes
+from .query_expansion import get_query_expander
+from .rag import loaded_components
+from .tracing import get_logger
+
+logger = get_logger(__name__)
+
+# Tipos que não são percorridos (código, não dados)
+_OPAQUE_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+
+def deep_sizeof(obj, seen: Optional[set] = None) -> int:
+    """
+    Tamanho estimado de `obj` e de tudo que ele referencia (dicts, listas,
+    sets, tuplas e atributos de objetos). `seen` evita contar duas vezes o
+    mesmo objeto entre chamadas.
+    """
+    if seen is None:
+        seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, _OPAQUE_TYPES):
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current, 0)
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset, deque)):
+            stack.extend(current)
+        elif isinstance(current, (str, bytes, bytearray, int, float, bool)) or current is None:
+            continue
+        else:
+            if hasattr(current, "__dict__"):
+                stack.append(vars(current))
+            for slot in getattr(type(current), "__slots__", ()):
+                if hasattr(current, slot):
+                    stack.append(getattr(current, slot))
+    return total
+
+
+def faiss_index_bytes(index) -> int:
+    """Bytes dos vetores/códigos armazenados no índice FAISS (sem copiar o índice)."""
+    hnsw = getattr(index, "hnsw", None)
+    if hnsw is not None:
+        # HNSW: vetores no índice de armazenamento + listas de vizinhos (int32) do grafo
+        return faiss_index_bytes(faiss.downcast_index(index.storage)) + int(hnsw.neighbors.size() * 4)
+    nlist = getattr(index, "nlist", None)
+    if nlist:
+        # IVF: códigos + ids (int64) nas listas invertidas + centróides do quantizador
+        return int(index.ntotal * (index.code_size + 8)) + faiss_index_bytes(faiss.downcast_index(index.quantizer))
+    code_size = getattr(index, "code_size", None)
+    if code_size:
+        return int(index.ntotal * code_size)
+    return int(index.ntotal * index.d * 4)
+
+
+def model_bytes(model) -> Optional[int]:
+    """Bytes de parâmetros e buffers de um modelo PyTorch (None se não for um)."""
+    if not hasattr(model, "parameters"):
+        return None
+    tensors = list(model.parameters()) + list(getattr(model, "buffers", lambda: [])())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def start_tracemalloc():
+    """Liga o tracemalloc se MEMORY_TRACEMALLOC estiver ativo (idempotente)."""
+    if settings.MEMORY_TRACEMALLOC and not tracemalloc.is_tracing():
+        tracemalloc.start(settings.MEMORY_TRACEMALLOC_FRAMES)
+        logger.info("🧠 tracemalloc ligado (%d frames)", settings.MEMORY_TRACEMALLOC_FRAMES)
+
+
+def top_allocators(limit: int = 15) -> Optional[list[dict]]:
+    """Maiores alocadores do heap Python por linha (None se tracemalloc estiver desligado)."""
+    if not tracemalloc.is_tracing():
+        return None
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    return [
+        {
+            "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "bytes": stat.size,
+            "blocks": stat.count,
+        }
+        for stat in snapshot.statistics("lineno")[:limit]
+    ]
+
+
+def memory_report(include_allocators: bool = True, top: int = 15) -> dict:
+    """Mede cada componente já carregado; componentes ainda não carregados ficam None."""
+    started_at = time.perf_counter()
+    components = loaded_components()
+    seen: set = set()
+
+    faiss_bytes = {
+        index_dir: faiss_index_bytes(faiss_index)
+        for index_dir, (faiss_index, _) in components["indexes"].items()
+        if faiss_index is not None  # DENSE_RETRIEVER=binary: índice float não carregado
+    }
+    metadata_bytes = sum(
+        deep_sizeof(metadata, seen) for _, metadata in components["indexes"].values()
+    ) if components["indexes"] else None
+    binary = binary_index_stats()
+    searcher = components["hybrid_searcher"]
+    bm25_bytes = deep_sizeof(searcher, seen) if searcher is not None else None
+
+    report = {
+        "timestamp": time.time(),
+        "rss_bytes": process_rss_bytes(),
+        "components": {
+            "faiss": sum(faiss_bytes.values()) if faiss_bytes else None,
+            "faiss_binary": sum(info["bytes"] for info in binary.values()) if binary else None,
+            "chunk_metadata": metadata_bytes,
+            "bm25": bm25_bytes,
+            "cache_response": deep_sizeof(get_response_cache(), seen),
+            "cache_query_expansion": deep_sizeof(get_query_expander().cache, seen),
+            "embedder": model_bytes(components["embedder"]) if components["embedder"] is not None else None,
+        },
+        "faiss_by_index": faiss_bytes,
+    }
+    known = sum(v for v in report["components"].values() if v)
+    report["accounted_bytes"] = known
+    if report["rss_bytes"]:
+        report["unaccounted_bytes"] = report["rss_bytes"] - known
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        report["python_heap"] = {"current_bytes": current, "peak_bytes": peak}
+        if include_allocators:
+            report["top_allocators"] = top_allocators(top)
+    report["elapsed_ms"] = round((time.perf_counter() - started_at) * 1000, 2)
+    return report
+
+
+_last_report: Optional[dict] = None
+_history_entries: Optional[int] = None  # Linhas em MEMORY_HISTORY_PATH (contadas na 1ª gravação)
+
+
+def last_report() -> Optional[dict]:
+    """Relatório mais recente (base dos gauges de memória em /metrics)."""
+    return _last_report
+
+
+def _trim_history(path: str, keep: int) -> int:
+    """Reescreve o histórico só com as últimas `keep` linhas; retorna quantas ficaram."""
+    with open(path, encoding="utf-8") as f:
+        lines = deque(f, maxlen=keep)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+    os.replace(tmp_path, path)
+    return len(lines)
+
+
+def record_history(report: dict):
+    """
+    Anexa o relatório (sem a lista de alocadores) ao histórico em disco.
+    Passando de MEMORY_HISTORY_MAX_ENTRIES (+10%, para não reescrever a cada
+    amostra), o arquivo é aparado para as últimas MEMORY_HISTORY_MAX_ENTRIES.
+    """
+    global _last_report, _history_entries
+    _last_report = report
+    entry = {key: value for key, value in report.items() if key != "top_allocators"}
+    path = settings.MEMORY_HISTORY_PATH
+    max_entries = settings.MEMORY_HISTORY_MAX_ENTRIES
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if _history_entries is None:
+            _history_entries = 0
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    _history_entries = sum(1 for _ in f)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        _history_entries += 1
+        if max_entries > 0 and _history_entries > max_entries + max_entries // 10:
+            _history_entries = _trim_history(path, max_entries)
+    except OSError as e:
+        logger.warning("⚠️ Erro ao gravar histórico de memória: %s", e)
+
+
+async def sample_periodically():
+    """Grava um relatório a cada MEMORY_SAMPLE_INTERVAL_S (tarefa de fundo da aplicação)."""
+    while True:
+        await asyncio.sleep(settings.MEMORY_SAMPLE_INTERVAL_S)
+        try:
+            # Fora do event loop e fora do executor de retrieval (não ocupa a fila)
+            report = await asyncio.to_thread(memory_report, False)
+            record_history(report)
+        except Exception as e:
+            logger.warning("⚠️ Erro na amostragem de memória: %s", e)
+
+
+def load_history(limit: int = 100) -> list[dict]:
+    """Últimos `limit` relatórios gravados."""
+    if not os.path.exists(settings.MEMORY_HISTORY_PATH):
+        return []
+    with open(settings.MEMORY_HISTORY_PATH, encoding="utf-8") as f:
+        lines = deque(f, maxlen=limit)
+    return [json.loads(line) for line in lines if line.strip()]
+
+
+def _mb(value: Optional[int]) -> str:
+    return "—" if value is None else f"{value / 1024 / 1024:,.1f} MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relatório de memória do backend")
+    parser.add_argument("--history", type=int, nargs="?", const=20, help="Mostra os últimos N relatórios gravados")
+    parser.add_argument("--no-load", action="store_true", help="Não carrega índice/modelo antes de medir")
+    parser.add_argument("--top", type=int, default=15, help="Quantidade de alocadores (com MEMORY_TRACEMALLOC=true)")
+    parser.add_argument("--record", action="store_true", help="Anexa o relatório ao histórico")
+    args = parser.parse_args()
+
+    if args.history:
+        for entry in load_history(args.history):
+            when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["timestamp"]))
+            parts = ", ".join(f"{name}={_mb(value)}" for name, value in entry["components"].items())
+            print(f"{when}  rss={_mb(entry.get('rss_bytes'))}  {parts}")
+        return
+
+    start_tracemalloc()
+    if not args.no_load:
+        from .rag import load_embedder, get_index, search
+        print("🔄 Carregando modelo, índice e BM25 (como no primeiro /ask)...")
+        load_embedder()
+        get_index(settings.INDEX_DIR)
+        search("umbanda", index_dir=settings.INDEX_DIR, use_reranking=False)
+
+    report = memory_report(top=args.top)
+    print(f"\n🧠 Memória do processo: rss={_mb(report['rss_bytes'])}")
+    for name, value in report["components"].items():
+        print(f"   {name:<24} {_mb(value):>12}")
+    print(f"   {'(contabilizado)':<24} {_mb(report['accounted_bytes']):>12}")
+    if report.get("unaccounted_bytes") is not None:
+        print(f"   {'(resto: runtime, libs)':<24} {_mb(report['unaccounted_bytes']):>12}")
+    for allocator in report.get("top_allocators") or []:
+        print(f"   {_mb(allocator['bytes']):>12}  {allocator['location']}")
+    if args.record:
+        record_history(report)
+        print(f"✓ Relatório anexado a {settings.MEMORY_HISTORY_PATH}")
+
+
+if __name__ == "__main__":
+    main()
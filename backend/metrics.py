@@ -0,0 +1,208 @@
+"""
+Métricas no formato de exposição do Prometheus (GET /metrics).
+
+Implementação mínima (sem prometheus_client) com dois tipos de métrica:
+- Counter / Histogram: instrumentados no caminho da requisição (HTTP por
+  endpoint, etapas do pipeline, tokens e 429s por provedor LLM)
+- Coletores: funções chamadas a cada scrape que leem o estado já exposto
+  pelos /xxx/stats (cache, executor, índice, RSS do processo)
+
+Tudo fica em memória do processo: com mais de um worker do uvicorn, cada
+worker expõe seus próprios valores.
+"""
+
+import os
+import resource
+import threading
+from typing import Callable, Iterable, Optional
+
+from .tracing import get_logger
+
+logger = get_logger(__name__)
+
+
+# Buckets em segundos: de etapas rápidas (FAISS, cache) até a geração do LLM
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0)
+
+# (nome, tipo, ajuda, [(labels, valor)]) produzido pelos coletores
+MetricFamily = tuple[str, str, str, list[tuple[dict, float]]]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Contador monotônico com labels."""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                labels = dict(zip(self.labelnames, key))
+                lines.append(f"{self.name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Histograma cumulativo (buckets `le`, `_sum` e `_count`) com labels."""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple, list] = {}  # labels -> [contagens por bucket, soma, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total_sum, count) in sorted(self._series.items()):
+                labels = dict(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    bucket_labels = _format_labels({**labels, "le": _format_value(bound)})
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total_sum)}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Registro das métricas instrumentadas e dos coletores avaliados a cada scrape."""
+
+    def __init__(self):
+        self._metrics: list = []
+        self._collectors: list[Callable[[], Iterable[MetricFamily]]] = []
+
+    def counter(self, name: str, help_text: str, labelnames: tuple = ()) -> Counter:
+        metric = Counter(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[MetricFamily]]):
+        if collector not in self._collectors:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Texto no formato de exposição do Prometheus (text/plain; version=0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                # Um coletor quebrado não derruba o scrape inteiro
+                logger.warning("⚠️ Erro no coletor de métricas %s: %s", getattr(collector, '__name__', collector), e)
+                continue
+            for name, kind, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def process_rss_bytes() -> Optional[int]:
+    """RSS atual do processo (via /proc); fora do Linux, o pico (ru_maxrss)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak * 1024 if peak else None
+
+
+# Registro global e métricas instrumentadas no pipeline
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.counter(
+    "aiye_http_requests_total",
+    "Requisições HTTP por endpoint, método e status",
+    ("method", "endpoint", "status"),
+)
+HTTP_LATENCY = registry.histogram(
+    "aiye_http_request_duration_seconds",
+    "Latência HTTP por endpoint (em /ask/stream, até o envio dos headers)",
+    ("method", "endpoint"),
+)
+STAGE_LATENCY = registry.histogram(
+    "aiye_stage_duration_seconds",
+    "Duração de cada etapa do pipeline de /ask (mesmas etapas de meta.timings)",
+    ("stage",),
+)
+LLM_REQUESTS = registry.counter(
+    "aiye_llm_requests_total",
+    "Tentativas de geração por provedor LLM e resultado",
+    ("provider", "outcome"),
+)
+LLM_TOKENS = registry.counter(
+    "aiye_llm_tokens_total",
+    "Tokens reportados pelo provedor LLM (prompt/completion)",
+    ("provider", "kind"),
+)
+LLM_RATE_LIMITED = registry.counter(
+    "aiye_llm_rate_limited_total",
+    "Respostas 429 recebidas do provedor LLM",
+    ("provider",),
+)
+
+
+def observe_stages(stage_ms: dict[str, float]):
+    """Registra no histograma de etapas as durações de um StageTimer ({etapa: ms})."""
+    for stage, elapsed_ms in stage_ms.items():
+        STAGE_LATENCY.observe(elapsed_ms / 1000, stage=stage)
+
+
+def render_metrics() -> str:
+    return registry.render()
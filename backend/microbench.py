@@ -0,0 +1,315 @@
+"""
+Micro-benchmarks das funções quentes do pipeline.
+
+Funções medidas:
+- bm25.fit / bm25.get_scores (hybrid_search.BM25)
+- rrf (reciprocal_rank_fusion com os rankings ponderados do HybridSearch)
+- rerank (reranker.rerank_results)
+- chunking (chunking.chunk_text_semantic)
+- synonyms (query_expansion.expand_query_with_synonyms)
+- cache.get / cache.set (cache.ResponseCache, com o cache cheio)
+- faiss.search (IndexFlatIP.search de uma query)
+
+Corpora:
+- real: chunks e vetores do índice em INDEX_DIR (pulado se não existir)
+- synthetic-Nx: --base-chunks chunks × N (1x/10x/100x por padrão), gerados
+  embaralhando palavras dos chunks reais (ou de um vocabulário sintético, sem
+  índice), com vetores aleatórios normalizados da mesma dimensão. Mostra como
+  cada função cresce com o tamanho do corpus.
+
+Medição no estilo do timeit: GC desligado, número de chamadas por amostra
+calibrado para ~--min-sample-ms e --repeat amostras; reporta mediana e mínimo
+por chamada. Tudo é semeado (--seed), então duas execuções na mesma máquina
+medem exatamente o mesmo trabalho.
+
+Uso:
+    python -m backend.microbench
+    python -m backend.microbench --only bm25 --scales 1,10
+    python -m backend.microbench --output bench_results/micro-base.json
+    python -m backend.microbench --compare bench_results/micro-base.json --threshold 1.2
+"""
+
+import argparse
+import gc
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+import faiss
+import numpy as np
+
+from . import settings
+from .cache import ResponseCache
+from .chunking import chunk_text_semantic
+from .hybrid_search import BM25, reciprocal_rank_fusion
+from .query_expansion import UMBANDA_SYNONYMS, expand_query_with_synonyms
+from .reranker import rerank_results
+from .retrieval_bench import git_revision
+
+QUERIES = [
+    "O que é um ponto riscado na Umbanda?",
+    "Qual a função do preto velho na gira?",
+    "Como é feita a oferenda para Iemanjá?",
+    "Quem é Exu e qual o seu papel no terreiro?",
+    "Quais ervas são usadas no banho de descarrego?",
+]
+DEFAULT_DIM = 384
+
+
+class Corpus:
+    """Textos e vetores de um cenário de benchmark."""
+
+    def __init__(self, name: str, texts: list[str], vectors: np.ndarray):
+        self.name = name
+        self.texts = texts
+        self.vectors = vectors
+
+    def __len__(self):
+        return len(self.texts)
+
+
+def load_real_corpus(index_dir: str) -> Optional[Corpus]:
+    """Chunks e vetores do índice real (sem carregar o modelo de embedding)."""
+    index_path = os.path.join(index_dir, "index.faiss")
+    metadata_path = os.path.join(index_dir, "metadata.json")
+    if not (os.path.exists(index_path) and os.path.exists(metadata_path)):
+        return None
+    try:
+        index = faiss.read_index(index_path)
+        with open(metadata_path, encoding="utf-8") as f:
+            chunks = json.load(f).get("chunks", [])
+    except (RuntimeError, ValueError) as e:
+        # Ex.: ponteiros do Git LFS no lugar dos arquivos
+        print(f"⚠️ Índice em {index_dir} ilegível, usando só corpora sintéticos: {e}")
+        return None
+    vectors = index.reconstruct_n(0, index.ntotal).astype("float32")
+    return Corpus("real", [chunk["content"] for chunk in chunks], vectors)
+
+
+def _random_vectors(rng: np.random.Generator, count: int, dim: int) -> np.ndarray:
+    vectors = rng.standard_normal((count, dim), dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def synthetic_corpus(base_texts: list[str], size: int, dim: int, seed: int, name: str) -> Corpus:
+    """`size` chunks com as palavras dos textos base embaralhadas (mesma distribuição de vocabulário)."""
+    rng = random.Random(seed)
+    texts = []
+    for i in range(size):
+        words = base_texts[i % len(base_texts)].split()
+        rng.shuffle(words)
+        texts.append(" ".join(words))
+    return Corpus(name, texts, _random_vectors(np.random.default_rng(seed), size, dim))
+
+
+def vocabulary_texts(count: int, seed: int, words_per_text: int = 130) -> list[str]:
+    """Textos sintéticos quando não há índice real: vocabulário do domínio + palavras aleatórias."""
+    rng = random.Random(seed)
+    domain = [word for term, synonyms in UMBANDA_SYNONYMS.items() for word in [term, *synonyms]]
+    filler = ["".join(rng.choice("aeioubcdfglmnprstv") for _ in range(rng.randint(3, 10))) for _ in range(5000)]
+    texts = []
+    for _ in range(count):
+        words = [rng.choice(domain) if rng.random() < 0.1 else rng.choice(filler) for _ in range(words_per_text)]
+        texts.append(" ".join(words) + ".")
+    return texts
+
+
+def _candidates(corpus: Corpus, count: int, seed: int) -> list[dict]:
+    """Resultados no formato do FAISS/search() para o re-ranking."""
+    rng = random.Random(seed)
+    picked = rng.sample(range(len(corpus)), min(count, len(corpus)))
+    return [
+        {"content": corpus.texts[i], "score": round(0.9 - rank * 0.02, 4), "title": "Doc", "page_start": 1, "page_end": 1}
+        for rank, i in enumerate(picked)
+    ]
+
+
+def build_benchmarks(corpus: Corpus, seed: int) -> dict[str, Callable[[], object]]:
+    """Funções sem argumentos a medir para um corpus (o preparo fica fora da medição)."""
+    queries = itertools.cycle(QUERIES)
+    benchmarks: dict[str, Callable[[], object]] = {}
+
+    bm25 = BM25()
+    bm25.fit(corpus.texts)
+    benchmarks["bm25.fit"] = lambda: BM25().fit(corpus.texts)
+    benchmarks["bm25.get_scores"] = lambda: bm25.get_scores(next(queries))
+
+    # Mesmos rankings ponderados que HybridSearch.search monta (alpha 0.65 → 65 + 35 cópias)
+    dense_ranking = [(i, 1.0 - i * 0.01) for i in range(settings.TOP_K * 3)]
+    sparse_ranking = list(reversed(dense_ranking))
+    dense_weight = int(settings.HYBRID_ALPHA * 100)
+    weighted = [dense_ranking] * dense_weight + [sparse_ranking] * (100 - dense_weight)
+    benchmarks["rrf"] = lambda: reciprocal_rank_fusion(weighted)
+
+    candidates = _candidates(corpus, settings.TOP_K * 3, seed)
+    benchmarks["rerank"] = lambda: rerank_results(next(queries), [dict(c) for c in candidates])
+
+    # ~3 chunks por página, como nos PDFs do acervo
+    pages = [" ".join(corpus.texts[i:i + 3]) for i in range(0, len(corpus), 3)]
+    benchmarks["chunking"] = lambda: chunk_text_semantic(pages)
+
+    benchmarks["synonyms"] = lambda: expand_query_with_synonyms(next(queries))
+
+    # Cache cheio do tamanho do corpus: get de uma chave presente, set com despejo
+    cache = ResponseCache(max_size=len(corpus))
+    answer = "Segundo o acervo, " + corpus.texts[0][:300]
+    contexts = candidates[:settings.TOP_K]
+    for i in range(len(corpus)):
+        cache.set(f"pergunta {i}", answer, contexts)
+    hot_keys = itertools.cycle([f"pergunta {i}" for i in range(len(corpus))])
+    new_keys = (f"nova pergunta {i}" for i in itertools.count())
+    benchmarks["cache.get"] = lambda: cache.get(next(hot_keys))
+    benchmarks["cache.set"] = lambda: cache.set(next(new_keys), answer, contexts)
+
+    index = faiss.IndexFlatIP(corpus.vectors.shape[1])
+    index.add(corpus.vectors)
+    query_vectors = _random_vectors(np.random.default_rng(seed + 1), 64, corpus.vectors.shape[1])
+    query_rows = itertools.cycle([query_vectors[i:i + 1] for i in range(len(query_vectors))])
+    benchmarks["faiss.search"] = lambda: index.search(next(query_rows), settings.TOP_K * 3)
+
+    return benchmarks
+
+
+def measure(fn: Callable[[], object], repeat: int, min_sample_ms: float) -> dict:
+    """Tempo por chamada (µs): calibra o número de chamadas por amostra e colhe `repeat` amostras."""
+    fn()  # Aquecimento
+    number = 1
+    while True:
+        started_at = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        if elapsed_ms >= min_sample_ms or number >= 1_000_000:
+            break
+        number *= 10 if elapsed_ms < min_sample_ms / 10 else 2
+
+    samples = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started_at = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - started_at) * 1e6 / number)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return {
+        "median_us": round(statistics.median(samples), 3),
+        "min_us": round(min(samples), 3),
+        "stdev_us": round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+        "calls_per_sample": number,
+        "repeat": repeat,
+    }
+
+
+def compare(current: dict, baseline_path: str, threshold: float) -> bool:
+    """Razão atual/baseline da mediana; False se alguma passar de `threshold`."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\n📐 Comparação com {baseline_path} ({baseline['run'].get('git_revision')})")
+    ok = True
+    for corpus_name, results in current["results"].items():
+        before_results = baseline["results"].get(corpus_name, {})
+        for name, stats in results.items():
+            before = before_results.get(name)
+            if not before:
+                continue
+            ratio = stats["median_us"] / before["median_us"] if before["median_us"] else float("inf")
+            flag = ""
+            if ratio > threshold:
+                flag = "  ⚠️ regressão"
+                ok = False
+            elif ratio < 1 / threshold:
+                flag = "  🚀"
+            print(f"   {corpus_name:<16} {name:<16} {before['median_us']:>12.1f}µs → {stats['median_us']:>12.1f}µs  ×{ratio:.2f}{flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks das funções quentes")
+    parser.add_argument("--index-dir", default=settings.INDEX_DIR)
+    parser.add_argument("--no-real", action="store_true", help="Pula o corpus real")
+    parser.add_argument("--base-chunks", type=int, default=500, help="Tamanho do corpus sintético 1x")
+    parser.add_argument("--scales", default="1,10,100", help="Multiplicadores do corpus sintético")
+    parser.add_argument("--only", help="Prefixos dos benchmarks a rodar (ex.: bm25,faiss)")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--min-sample-ms", type=float, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Arquivo JSON de saída (padrão: bench_results/microbench-<data>.json)")
+    parser.add_argument("--compare", help="JSON de uma execução anterior (baseline)")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Razão máxima atual/baseline aceita")
+    args = parser.parse_args()
+
+    # fit() e o cache logam a cada chamada; aqui só interessa o tempo
+    logging.getLogger("aiye").setLevel(logging.WARNING)
+    only = tuple(args.only.split(",")) if args.only else None
+
+    real = None if args.no_real else load_real_corpus(args.index_dir)
+    dim = real.vectors.shape[1] if real is not None else DEFAULT_DIM
+    if real is not None:
+        base_texts = random.Random(args.seed).sample(real.texts, min(args.base_chunks, len(real)))
+    else:
+        base_texts = vocabulary_texts(args.base_chunks, args.seed)
+
+    corpora = [real] if real is not None else []
+    for scale in (int(s) for s in args.scales.split(",")):
+        corpora.append(synthetic_corpus(base_texts, args.base_chunks * scale, dim, args.seed, f"synthetic-{scale}x"))
+
+    report = {
+        "run": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "faiss_threads": faiss.omp_get_max_threads(),
+            "seed": args.seed,
+            "corpora": {corpus.name: len(corpus) for corpus in corpora},
+        },
+        "results": {},
+    }
+
+    for corpus in corpora:
+        print(f"\n⏱️ {corpus.name} ({len(corpus)} chunks)")
+        results = report["results"][corpus.name] = {}
+        for name, fn in build_benchmarks(corpus, args.seed).items():
+            if only and not name.startswith(only):
+                continue
+            results[name] = stats = measure(fn, args.repeat, args.min_sample_ms)
+            print(f"   {name:<16} {stats['median_us']:>12.1f}µs  (min {stats['min_us']:.1f}µs, ±{stats['stdev_us']:.1f})")
+
+    # Crescimento entre escalas sintéticas consecutivas (×10 no corpus → ×? no tempo)
+    synthetic = [corpus for corpus in corpora if corpus.name.startswith("synthetic")]
+    if len(synthetic) > 1:
+        print("\n📈 Crescimento com o corpus")
+        for name in report["results"][synthetic[0].name]:
+            steps = []
+            for smaller, larger in zip(synthetic, synthetic[1:]):
+                before = report["results"][smaller.name][name]["median_us"]
+                after = report["results"][larger.name][name]["median_us"]
+                steps.append(f"×{len(larger) / len(smaller):.0f} → ×{after / before:.1f}")
+            print(f"   {name:<16} {'   '.join(steps)}")
+
+    output = args.output or f"bench_results/microbench-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✓ Resultado gravado em {output}")
+
+    if args.compare and not compare(report, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
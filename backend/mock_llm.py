@@ -0,0 +1,293 @@
+"""
+Servidor LLM local OpenAI-compatible (stand-in para testes e desenvolvimento).
+
+Atende POST /v1/chat/completions (com e sem stream) gerando uma resposta
+determinística a partir do prompt, sem chamar nenhum provedor externo. Serve
+para testes de carga, retry e streaming do /ask sem chave do Groq nem cota.
+
+Substituindo o Groq:
+
+    GROQ_BASE_URL=http://127.0.0.1:8001/v1 GROQ_API_KEY=local
+
+ou como provedor adicional em LLM_PROVIDERS:
+
+    {"name": "local", "base_url": "http://127.0.0.1:8001/v1",
+     "api_key": "local", "model": "mock-echo"}
+
+Uso:
+    python -m backend.mock_llm --port 8001
+    uvicorn backend.mock_llm:app --port 8001
+
+Variáveis (todas opcionais):
+    MOCK_LLM_MODE             document (cita o 1º [DOCUMENTO] do prompt) | echo
+                              (repete a última mensagem do usuário)
+    MOCK_LLM_DELAY_MS         atraso até o primeiro token (padrão 200)
+    MOCK_LLM_DELAY_DIST       fixed | uniform | normal | lognormal | exponential
+    MOCK_LLM_DELAY_JITTER_MS  dispersão da distribuição (meia largura no
+                              uniform, desvio padrão no normal/lognormal)
+    MOCK_LLM_TOKEN_DELAY_MS   atraso entre tokens no streaming (padrão 20)
+    MOCK_LLM_ERROR_429_RATE   fração de requisições respondidas com 429
+    MOCK_LLM_RETRY_AFTER_S    header retry-after dos 429 (vazio = sem header)
+    MOCK_LLM_ERROR_5XX_RATE   fração de requisições respondidas com 5xx
+    MOCK_LLM_5XX_STATUS       status usado nos 5xx (padrão 503)
+    MOCK_LLM_RPM              limite de requisições por minuto (0 = sem limite);
+                              acima dele responde 429 como o Groq
+    MOCK_LLM_SEED             semente do sorteio de atrasos e erros
+
+A configuração pode ser trocada em execução (ex.: no meio de um teste de
+carga) com POST /mock/config {"error_429_rate": 0.3}; GET /mock/stats mostra
+as contagens por resultado.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter, deque
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI(title="Mock LLM (OpenAI-compatible)")
+
+DELAY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def _load_config() -> dict:
+    retry_after = os.getenv("MOCK_LLM_RETRY_AFTER_S", "")
+    return {
+        "mode": os.getenv("MOCK_LLM_MODE", "document"),
+        "delay_ms": _env_float("MOCK_LLM_DELAY_MS", 200),
+        "delay_dist": os.getenv("MOCK_LLM_DELAY_DIST", "fixed"),
+        "delay_jitter_ms": _env_float("MOCK_LLM_DELAY_JITTER_MS", 0),
+        "token_delay_ms": _env_float("MOCK_LLM_TOKEN_DELAY_MS", 20),
+        "error_429_rate": _env_float("MOCK_LLM_ERROR_429_RATE", 0),
+        "retry_after_s": float(retry_after) if retry_after else None,
+        "error_5xx_rate": _env_float("MOCK_LLM_ERROR_5XX_RATE", 0),
+        "error_5xx_status": int(os.getenv("MOCK_LLM_5XX_STATUS", "503")),
+        "rpm": int(os.getenv("MOCK_LLM_RPM", "0")),
+    }
+
+
+_config = _load_config()
+_seed = os.getenv("MOCK_LLM_SEED")
+_rng = random.Random(int(_seed) if _seed else None)
+_rng_lock = threading.Lock()
+_stats: Counter = Counter()
+_recent_requests: deque = deque()  # instantes das requisições aceitas no último minuto (MOCK_LLM_RPM)
+
+
+def sample_delay_s(config: dict) -> float:
+    """Sorteia o atraso até o primeiro token conforme a distribuição configurada."""
+    mean = config["delay_ms"]
+    jitter = config["delay_jitter_ms"]
+    dist = config["delay_dist"]
+    with _rng_lock:
+        if dist == "uniform":
+            value = _rng.uniform(mean - jitter, mean + jitter)
+        elif dist == "normal":
+            value = _rng.gauss(mean, jitter)
+        elif dist == "lognormal" and mean > 0:
+            # Parâmetros escolhidos para que média e desvio fiquem em delay_ms / delay_jitter_ms
+            sigma2 = math.log(1 + (jitter / mean) ** 2)
+            value = _rng.lognormvariate(math.log(mean) - sigma2 / 2, math.sqrt(sigma2))
+        elif dist == "exponential" and mean > 0:
+            value = _rng.expovariate(1 / mean)
+        else:
+            value = mean
+    return max(0.0, value) / 1000
+
+
+def _draw(rate: float) -> bool:
+    if rate <= 0:
+        return False
+    with _rng_lock:
+        return _rng.random() < rate
+
+
+def _over_rpm(config: dict) -> bool:
+    """Janela deslizante de 60s; registra a requisição quando ela é aceita."""
+    if config["rpm"] <= 0:
+        return False
+    now = time.monotonic()
+    while _recent_requests and now - _recent_requests[0] > 60:
+        _recent_requests.popleft()
+    if len(_recent_requests) >= config["rpm"]:
+        return True
+    _recent_requests.append(now)
+    return False
+
+
+def injected_error(config: dict):
+    """Resposta de erro no formato da API OpenAI, ou None se a requisição deve seguir."""
+    if _over_rpm(config) or _draw(config["error_429_rate"]):
+        headers = {}
+        if config["retry_after_s"] is not None:
+            headers["retry-after"] = str(config["retry_after_s"])
+        _stats["rate_limited"] += 1
+        return JSONResponse(
+            status_code=429,
+            headers=headers,
+            content={"error": {
+                "message": "Rate limit reached (mock)",
+                "type": "requests",
+                "code": "rate_limit_exceeded",
+            }},
+        )
+    if _draw(config["error_5xx_rate"]):
+        _stats["server_error"] += 1
+        return JSONResponse(
+            status_code=config["error_5xx_status"],
+            content={"error": {"message": "Service unavailable (mock)", "type": "server_error"}},
+        )
+    return None
+
+
+def build_mock_answer(prompt: str) -> str:
+    """Resposta determinística: cita o primeiro documento de contexto do prompt."""
+    match = re.search(r"\[DOCUMENTO\][^\n]*\n(.+)", prompt)
+    excerpt = match.group(1).strip()[:200] if match else prompt.strip()[-200:]
+    return f"Segundo o acervo: {excerpt}"
+
+
+def build_echo_answer(messages: list[dict]) -> str:
+    """Resposta determinística: repete a última mensagem do usuário."""
+    user_messages = [m.get("content", "") for m in messages if m.get("role") == "user"]
+    return f"Eco: {user_messages[-1].strip()[:500] if user_messages else ''}"
+
+
+def _usage(prompt: str, answer: str) -> dict:
+    prompt_tokens = len(prompt) // 4 + 1
+    completion_tokens = len(answer) // 4 + 1
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+@app.get("/v1/models")
+async def models():
+    return {"object": "list", "data": [{"id": "mock-echo", "object": "model", "owned_by": "mock"}]}
+
+
+@app.get("/mock/config")
+async def get_config():
+    return _config
+
+
+@app.post("/mock/config")
+async def update_config(request: Request):
+    """Altera parâmetros em execução (só as chaves informadas)."""
+    updates = await request.json()
+    unknown = set(updates) - set(_config)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Parâmetros desconhecidos: {sorted(unknown)}")
+    if "delay_dist" in updates and updates["delay_dist"] not in DELAY_DISTRIBUTIONS:
+        raise HTTPException(status_code=400, detail=f"delay_dist deve ser um de {DELAY_DISTRIBUTIONS}")
+    _config.update(updates)
+    return _config
+
+
+@app.get("/mock/stats")
+async def stats():
+    return dict(_stats)
+
+
+@app.post("/mock/reset")
+async def reset():
+    """Zera contagens e a janela de RPM (entre rodadas de um teste de carga)."""
+    _stats.clear()
+    _recent_requests.clear()
+    return {"status": "ok"}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    config = dict(_config)
+    _stats["requests"] += 1
+
+    error = injected_error(config)
+    if error is not None:
+        return error
+
+    model = body.get("model", "mock-echo")
+    messages = body.get("messages", [])
+    prompt = "\n".join(m.get("content", "") for m in messages)
+    answer = build_echo_answer(messages) if config["mode"] == "echo" else build_mock_answer(prompt)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+
+    await asyncio.sleep(sample_delay_s(config))
+
+    if not body.get("stream"):
+        _stats["ok"] += 1
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop",
+            }],
+            "usage": _usage(prompt, answer),
+        }
+
+    include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+    token_delay = config["token_delay_ms"] / 1000
+
+    def chunk(choices: list, usage: dict = None) -> str:
+        data = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": choices,
+        }
+        if usage is not None:
+            data["usage"] = usage
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    async def events():
+        for word in re.findall(r"\S+\s*", answer):
+            yield chunk([{"index": 0, "delta": {"content": word}, "finish_reason": None}])
+            await asyncio.sleep(token_delay)
+        yield chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if include_usage:
+            yield chunk([], usage=_usage(prompt, answer))
+        yield "data: [DONE]\n\n"
+        _stats["ok"] += 1
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Servidor LLM local OpenAI-compatible")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,8 @@ class AskRequest(BaseModel):
     """Requisição de pergunta."""
     question: str = Field(..., min_length=3, max_length=1000, description="Pergunta do usuário")
     history: Optional[list[dict]] = Field(None, description="Histórico de conversa (perguntas e respostas anteriores)")
+    ef_search: Optional[int] = Field(None, ge=1, le=4096, description="efSearch da busca HNSW (padrão: FAISS_EF_SEARCH)")
+    nprobe: Optional[int] = Field(None, ge=1, le=65536, description="Listas visitadas na busca IVF (padrão: FAISS_NPROBE)")
 
 
 class Source(BaseModel):
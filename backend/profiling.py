@@ -0,0 +1,255 @@
+"""
+Profiling sob demanda das requisições /ask.
+
+Um profiler por amostragem (stdlib, sem dependências) lê periodicamente a
+pilha das threads que trabalham para a requisição:
+- a thread do executor de retrieval enquanto roda search() e afins
+  (raiz "retrieval")
+- a thread do event loop durante toda a requisição (raiz "event_loop"; com
+  requisições concorrentes, inclui trabalho das outras)
+
+A saída é o formato "folded"/collapsed stacks (uma linha `raiz;f1;f2 N` por
+pilha), aceito por flamegraph.pl, speedscope e inferno.
+
+Quando perfilar:
+- POST /admin/profile?count=N arma as próximas N requisições
+- PROFILE_SLOW_MS > 0 amostra todas as requisições e guarda apenas as que
+  passarem do limite (custo: uma leitura de pilhas a cada PROFILE_INTERVAL_MS)
+
+Os perfis ficam em PROFILE_DIR como JSON, junto com os timings por etapa.
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Callable, Optional
+
+from . import settings
+from .tracing import get_logger
+
+logger = get_logger(__name__)
+
+
+class ProfileSession:
+    """Amostras de pilha de uma requisição."""
+
+    def __init__(self, trace_id: str, armed: bool):
+        self.trace_id = trace_id
+        self.armed = armed  # Pedido explícito (senão, só guarda se for lenta)
+        self.started_at = time.time()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._threads: dict[int, str] = {}  # thread id -> raiz da pilha
+        self.loop_thread: Optional[int] = None
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def attach_thread(self, root: str) -> int:
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._threads[thread_id] = root
+        return thread_id
+
+    def detach_thread(self, thread_id: int):
+        with self._lock:
+            self._threads.pop(thread_id, None)
+
+    def sample(self, frames: dict):
+        with self._lock:
+            threads = list(self._threads.items())
+        for thread_id, root in threads:
+            frame = frames.get(thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.append(root)
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        """Pilhas no formato collapsed (entrada de flamegraph.pl / speedscope)."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+class _Sampler:
+    """Thread única que amostra as pilhas de todas as sessões ativas."""
+
+    def __init__(self):
+        self._sessions: set[ProfileSession] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, session: ProfileSession):
+        with self._lock:
+            self._sessions.add(session)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+
+    def remove(self, session: ProfileSession):
+        with self._lock:
+            self._sessions.discard(session)
+
+    def _run(self):
+        interval = settings.PROFILE_INTERVAL_MS / 1000
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                sessions = list(self._sessions)
+                if not sessions:
+                    self._thread = None
+                    return
+            frames = sys._current_frames()
+            for session in sessions:
+                session.sample(frames)
+
+
+_sampler = _Sampler()
+_current_session: ContextVar[Optional[ProfileSession]] = ContextVar("profile_session", default=None)
+_armed_lock = threading.Lock()
+_armed_remaining = 0
+
+
+def arm(count: int) -> int:
+    """Arma o profiling das próximas `count` requisições; retorna o total armado."""
+    global _armed_remaining
+    with _armed_lock:
+        _armed_remaining = max(0, count)
+        return _armed_remaining
+
+
+def armed_remaining() -> int:
+    return _armed_remaining
+
+
+def _take_armed() -> bool:
+    global _armed_remaining
+    with _armed_lock:
+        if _armed_remaining > 0:
+            _armed_remaining -= 1
+            return True
+        return False
+
+
+def start_request_profile(trace_id: str) -> Optional[ProfileSession]:
+    """
+    Inicia o profiling da requisição atual, se ela estiver armada ou se
+    PROFILE_SLOW_MS estiver ativo. Deve ser chamada na thread do event loop.
+    """
+    armed = _take_armed()
+    if not armed and settings.PROFILE_SLOW_MS <= 0:
+        return None
+    session = ProfileSession(trace_id, armed=armed)
+    session.loop_thread = session.attach_thread("event_loop")
+    _current_session.set(session)
+    _sampler.add(session)
+    return session
+
+
+def profiled_call(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Executa `fn` amostrando a thread atual se a requisição (contexto) estiver
+    sendo perfilada. Usado pelo executor de retrieval dentro do contexto copiado.
+    """
+    session = _current_session.get()
+    if session is None:
+        return fn(*args, **kwargs)
+    thread_id = session.attach_thread("retrieval")
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        session.detach_thread(thread_id)
+
+
+def finish_request_profile(
+    session: Optional[ProfileSession],
+    endpoint: str,
+    timings: dict,
+    question: str = ""
+) -> Optional[str]:
+    """
+    Encerra a amostragem e grava o perfil se foi armado ou se a requisição
+    passou de PROFILE_SLOW_MS. Retorna o id do perfil gravado (ou None).
+    """
+    if session is None or session.finished:
+        return None
+    session.finished = True
+    _sampler.remove(session)
+    session.detach_thread(session.loop_thread)
+    _current_session.set(None)
+
+    total_ms = timings.get("total_ms", 0.0)
+    slow = settings.PROFILE_SLOW_MS > 0 and total_ms >= settings.PROFILE_SLOW_MS
+    if not (session.armed or slow):
+        return None
+
+    # O trace id pode vir do cliente (X-Request-ID): só caracteres seguros no nome do arquivo
+    safe_trace = re.sub(r"[^A-Za-z0-9_-]", "_", session.trace_id)
+    profile_id = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(session.started_at))}-{safe_trace}"
+    record = {
+        "id": profile_id,
+        "trace_id": session.trace_id,
+        "endpoint": endpoint,
+        "reason": "armed" if session.armed else "slow",
+        "question": question[:200],
+        "started_at": session.started_at,
+        "interval_ms": settings.PROFILE_INTERVAL_MS,
+        "samples": session.samples,
+        "timings": timings,
+        "folded": session.folded(),
+    }
+    try:
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        with open(os.path.join(settings.PROFILE_DIR, f"{profile_id}.json"), "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False)
+        _prune_profiles()
+    except OSError as e:
+        logger.warning("⚠️ Erro ao gravar perfil %s: %s", profile_id, e)
+        return None
+    logger.info("🔬 Perfil gravado: %s (%s, %d amostras, %.0fms)", profile_id, record["reason"], session.samples, total_ms)
+    return profile_id
+
+
+def _prune_profiles():
+    """Mantém apenas os PROFILE_MAX_FILES perfis mais recentes (no mínimo o recém-gravado)."""
+    files = sorted(f for f in os.listdir(settings.PROFILE_DIR) if f.endswith(".json"))
+    keep = max(1, settings.PROFILE_MAX_FILES)
+    for name in files[:max(0, len(files) - keep)]:
+        os.remove(os.path.join(settings.PROFILE_DIR, name))
+
+
+def list_profiles() -> list[dict]:
+    """Resumo dos perfis gravados (mais recentes primeiro)."""
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+    summaries = []
+    for name in sorted(os.listdir(settings.PROFILE_DIR), reverse=True):
+        if not name.endswith(".json"):
+            continue
+        record = load_profile(name[:-5])
+        if record:
+            summaries.append({
+                key: record.get(key)
+                for key in ("id", "trace_id", "endpoint", "reason", "samples", "started_at")
+            } | {"total_ms": record.get("timings", {}).get("total_ms")})
+    return summaries
+
+
+def load_profile(profile_id: str) -> Optional[dict]:
+    """Carrega um perfil pelo id (None se não existir)."""
+    if os.path.basename(profile_id) != profile_id:
+        return None
+    path = os.path.join(settings.PROFILE_DIR, f"{profile_id}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
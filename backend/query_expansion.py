@@ -28,6 +28,9 @@ Estratégias:
 from typing import List, Dict, Optional
 # import google.generativeai as genai  # Desabilitado - migrando para Groq
 from . import settings
+from .tracing import get_logger
+
+logger = get_logger(__name__)
 
 
 # Dicionário de sinônimos específicos do domínio de Umbanda
@@ -138,7 +141,7 @@ def expand_query_with_llm(query: str) -> List[str]:
             # return all_queries
         
     except Exception as e:
-        print(f"⚠️ Erro ao expandir query com LLM: {e}")
+        logger.warning("⚠️ Erro ao expandir query com LLM: %s", e)
         return [query]
 
 
@@ -168,7 +171,7 @@ def expand_query_hybrid(
         llm_queries = expand_query_with_llm(query)
         expanded_queries.update(llm_queries)
     
-    # Retorna como lista (máximo 5 queries)
+    # Retorna como lista (máximo 5 queries: rag.MAX_EXPANDED_QUERIES)
     return list(expanded_queries)[:5]
 
 
@@ -225,6 +228,8 @@ class QueryExpander:
         self.use_llm = use_llm
         self.use_synonyms = use_synonyms
         self.cache = {}  # Cache de expansões
+        self.hits = 0
+        self.misses = 0
     
     def expand(self, query: str, force: bool = False) -> List[str]:
         """
@@ -239,12 +244,14 @@ class QueryExpander:
         """
         # Verifica cache
         if query in self.cache:
-            print(f"💾 Query expansion cache HIT: {query}")
+            self.hits += 1
+            logger.debug("💾 Query expansion cache HIT: %s", query)
             return self.cache[query]
+        self.misses += 1
         
         # Decide se deve expandir
         if not force and not should_expand_query(query):
-            print(f"⏭️ Query expansion skipped: {query}")
+            logger.debug("⏭️ Query expansion skipped: %s", query)
             return [query]
         
         # Expande
@@ -262,7 +269,17 @@ class QueryExpander:
     def clear_cache(self):
         """Limpa cache de expansões."""
         self.cache.clear()
-        print("🧹 Query expansion cache limpo")
+        logger.info("🧹 Query expansion cache limpo")
+    
+    def stats(self) -> dict:
+        """Retorna estatísticas do cache de expansões."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
 
 
 # Singleton global
@@ -279,5 +296,5 @@ def get_query_expander(
     global _query_expander
     if _query_expander is None:
         _query_expander = QueryExpander(use_llm=use_llm, use_synonyms=use_synonyms)
-        print("✓ QueryExpander inicializado")
+        logger.info("✓ QueryExpander inicializado")
     return _query_expander
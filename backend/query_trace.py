@@ -0,0 +1,226 @@
+"""
+Registro de consultas do /ask (query traces) e replay contra outra build.
+
+Com QUERY_TRACE_ENABLED=true, cada resposta de /ask, /ask-raw e /ask/stream
+anexa uma linha JSON compacta a QUERY_TRACE_PATH:
+
+    {"ts": 1760000000.1, "trace_id": "9f2c...", "endpoint": "/ask",
+     "q": "o que é umbanda", "cache": "miss", "route": "full",
+     "chunks": ["c1a...", "77e..."], "timings": {"retrieval": 85.1, ...},
+     "tokens": {"prompt_tokens": 1830, "completion_tokens": 212, ...}}
+
+- a pergunta é gravada normalizada (a mesma normalização da chave do cache)
+- com QUERY_TRACE_HASH_QUESTIONS=true grava só `q_hash` (SHA-256 com
+  QUERY_TRACE_SALT): serve para simular caches, mas não para replay
+- o arquivo rotaciona em QUERY_TRACE_MAX_MB, mantendo QUERY_TRACE_BACKUPS
+- a escrita acontece numa thread própria (QueueListener), fora do event loop
+
+Replay (re-executa as perguntas contra um servidor e compara com o registro):
+
+    python -m backend.query_trace replay backend/data/traces/queries.jsonl \\
+        --url http://127.0.0.1:8000 --concurrency 4
+
+Compara latência (gravada × nova) e sobreposição dos chunks recuperados
+(Jaccard e fração dos chunks originais que voltaram), além de mudanças de rota.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import statistics
+import time
+from pathlib import Path
+from typing import Optional
+
+from . import settings
+from .cache import normalize_question
+from .router import ROUTE_CACHED
+from .tracing import current_trace_id, get_logger
+
+logger = get_logger(__name__)
+
+# Logger dedicado: só a linha JSON, sem passar pelos handlers da aplicação
+_trace_logger = logging.getLogger("aiye_query_trace")
+_trace_logger.propagate = False
+_listener: Optional[logging.handlers.QueueListener] = None
+# Arquivo de registro inacessível: desliga o registro neste processo (sem mexer nos settings)
+_disabled = False
+
+
+def _ensure_writer() -> bool:
+    global _listener, _disabled
+    if _listener is not None:
+        return True
+    if _disabled:
+        return False
+    try:
+        os.makedirs(os.path.dirname(settings.QUERY_TRACE_PATH) or ".", exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            settings.QUERY_TRACE_PATH,
+            maxBytes=int(settings.QUERY_TRACE_MAX_MB * 1024 * 1024),
+            backupCount=settings.QUERY_TRACE_BACKUPS,
+            encoding="utf-8",
+        )
+    except OSError as e:
+        logger.warning("⚠️ Registro de consultas desativado: %s", e)
+        _disabled = True
+        return False
+    file_handler.setFormatter(logging.Formatter("%(message)s"))
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    _trace_logger.addHandler(logging.handlers.QueueHandler(records))
+    _trace_logger.setLevel(logging.INFO)
+    _listener = logging.handlers.QueueListener(records, file_handler)
+    _listener.start()
+    logger.info("📝 Registro de consultas em %s", settings.QUERY_TRACE_PATH)
+    return True
+
+
+def close_query_trace():
+    """Esvazia a fila e fecha o arquivo (shutdown da aplicação)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _trace_logger.handlers.clear()
+        _listener = None
+
+
+def question_fields(question: str) -> dict:
+    """Pergunta normalizada, ou só o hash dela com QUERY_TRACE_HASH_QUESTIONS."""
+    normalized = normalize_question(question)
+    if settings.QUERY_TRACE_HASH_QUESTIONS:
+        digest = hashlib.sha256((settings.QUERY_TRACE_SALT + normalized).encode()).hexdigest()
+        return {"q_hash": digest[:32], "q_len": len(normalized)}
+    return {"q": normalized}
+
+
+def record_query_trace(endpoint: str, question: str, timings: dict, meta: dict, contexts: list[dict]):
+    """Anexa o registro de uma consulta respondida (no-op se QUERY_TRACE_ENABLED=false)."""
+    if not settings.QUERY_TRACE_ENABLED or not _ensure_writer():
+        return
+    record = {
+        "ts": round(time.time(), 3),
+        "trace_id": current_trace_id(),
+        "endpoint": endpoint,
+        **question_fields(question),
+        "cache": "response" if meta.get("route") == ROUTE_CACHED else "miss",
+        "route": meta.get("route"),
+        "chunks": [ctx.get("chunk_id") for ctx in contexts],
+        "timings": timings,
+        "tokens": meta.get("llm_usage"),
+    }
+    _trace_logger.info(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+
+
+def load_traces(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def chunk_overlap(recorded: list, replayed: list) -> dict:
+    before, after = set(filter(None, recorded)), set(filter(None, replayed))
+    if not before and not after:
+        return {"jaccard": 1.0, "recall": 1.0}
+    return {
+        "jaccard": round(len(before & after) / len(before | after), 4),
+        "recall": round(len(before & after) / len(before), 4) if before else 0.0,
+    }
+
+
+async def _replay(records: list[dict], url: str, concurrency: int, timeout_s: float) -> list[dict]:
+    import httpx
+
+    results: list[Optional[dict]] = [None] * len(records)
+    pending = iter(enumerate(records))
+
+    async def worker(http):
+        for position, record in pending:
+            started_at = time.perf_counter()
+            # /ask/stream é reenviado como /ask: mesma busca e cache, resposta inteira
+            endpoint = "/ask-raw" if record.get("endpoint") == "/ask-raw" else "/ask"
+            entry = {"q": record["q"], "recorded_ms": record.get("timings", {}).get("total_ms")}
+            try:
+                response = await http.post(f"{url}{endpoint}", json={"question": record["q"]})
+                entry["status"] = response.status_code
+                if response.status_code == 200:
+                    meta = response.json().get("meta", {})
+                    entry["replayed_ms"] = meta.get("latency_ms")
+                    entry["route_before"] = record.get("route")
+                    entry["route_after"] = meta.get("route")
+                    entry.update(chunk_overlap(record.get("chunks", []), meta.get("chunk_ids", [])))
+            except httpx.HTTPError as e:
+                entry["status"] = type(e).__name__
+            entry["client_ms"] = round((time.perf_counter() - started_at) * 1000, 2)
+            results[position] = entry
+
+    async with httpx.AsyncClient(timeout=timeout_s) as http:
+        await asyncio.gather(*(worker(http) for _ in range(concurrency)))
+    return results
+
+
+def _percentile(values: list[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))], 1)
+
+
+def summarize_replay(results: list[dict], skipped: int) -> dict:
+    ok = [r for r in results if r.get("status") == 200]
+    recorded = [r["recorded_ms"] for r in ok if r.get("recorded_ms") is not None]
+    replayed = [r["replayed_ms"] for r in ok if r.get("replayed_ms") is not None]
+    return {
+        "replayed": len(results),
+        "skipped_hashed": skipped,
+        "errors": len(results) - len(ok),
+        "latency_recorded": {"p50_ms": _percentile(recorded, 0.50), "p95_ms": _percentile(recorded, 0.95)},
+        "latency_replayed": {"p50_ms": _percentile(replayed, 0.50), "p95_ms": _percentile(replayed, 0.95)},
+        "mean_jaccard": round(statistics.mean(r["jaccard"] for r in ok), 4) if ok else None,
+        "mean_chunk_recall": round(statistics.mean(r["recall"] for r in ok), 4) if ok else None,
+        "identical_chunks": sum(1 for r in ok if r["jaccard"] == 1.0),
+        "route_changes": sum(1 for r in ok if r.get("route_before") != r.get("route_after")),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay do registro de consultas do /ask")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    replay = subcommands.add_parser("replay", help="Re-executa as perguntas contra um servidor")
+    replay.add_argument("trace_file")
+    replay.add_argument("--url", default=f"http://127.0.0.1:{settings.PORT}")
+    replay.add_argument("--concurrency", type=int, default=1)
+    replay.add_argument("--limit", type=int, help="Apenas as primeiras N consultas")
+    replay.add_argument("--timeout", type=float, default=60)
+    replay.add_argument("--output", help="Arquivo JSON de saída (padrão: bench_results/replay-<data>.json)")
+    args = parser.parse_args()
+
+    records = load_traces(args.trace_file)[:args.limit]
+    replayable = [r for r in records if r.get("q")]
+    skipped = len(records) - len(replayable)
+    print(f"🔁 {len(replayable)} consultas para {args.url} ({skipped} só com hash, ignoradas)")
+
+    results = asyncio.run(_replay(replayable, args.url.rstrip("/"), args.concurrency, args.timeout))
+    summary = summarize_replay(results, skipped)
+
+    print(f"\n⏱️ Latência p50/p95: gravada {summary['latency_recorded']['p50_ms']}/{summary['latency_recorded']['p95_ms']}ms"
+          f" → replay {summary['latency_replayed']['p50_ms']}/{summary['latency_replayed']['p95_ms']}ms")
+    print(f"📚 Chunks: Jaccard médio {summary['mean_jaccard']}, recall médio {summary['mean_chunk_recall']}, "
+          f"{summary['identical_chunks']} idênticos")
+    print(f"🔀 Mudanças de rota: {summary['route_changes']}   ❌ Erros: {summary['errors']}")
+
+    output = args.output or f"bench_results/replay-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"trace_file": args.trace_file, "url": args.url, "summary": summary, "results": results},
+                  f, ensure_ascii=False, indent=2)
+    print(f"\n✓ Resultado gravado em {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -40,24 +40,42 @@ Responsável por:
   - Cache de respostas frequentes
 """
 
+import asyncio
 import json
 import os
+import threading
 import uuid
 import time
 from pathlib import Path
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, AsyncIterator
 
 import numpy as np
 import fitz  # PyMuPDF
 import faiss
 from sentence_transformers import SentenceTransformer
-from openai import OpenAI, APIError, RateLimitError
+from openai import RateLimitError
 from . import settings
 from .cache import get_response_cache
 from .reranker import rerank_results
 from .chunking import chunk_text_semantic, chunk_text_hybrid
 from .hybrid_search import HybridSearch, create_hybrid_searcher
 from .query_expansion import get_query_expander
+from .llm import complete_llm, stream_llm, get_providers, retry_after_seconds, NoProviderAvailable
+from .circuit_breaker import CircuitOpenError
+from .rate_limiter import RateLimitExceeded, PRIORITY_INTERACTIVE
+from .executor import get_retrieval_executor
+from .ann_index import (
+    create_index, build_index, needs_training, load_vectors, save_vectors, search_index, full_precision_vectors, describe,
+    binary_search, binary_index_stats, binary_available, VECTORS_FILE
+)
+from .extractive import build_extractive_answer
+from .deadline import Deadline
+from .timing import timed, record_stage
+from .router import classify_query, get_router_stats, ROUTE_CACHED, ROUTE_EXTRACTIVE, ROUTE_LIGHT, ROUTE_FULL
+from .context_packer import pack_contexts, count_tokens, format_context_block, format_history_turn
+from .tracing import get_logger
+
+logger = get_logger(__name__)
 
 
 # Cache global para o embedder (evita recarregar múltiplas vezes)
@@ -66,6 +84,14 @@ _embedder: Optional[SentenceTransformer] = None
 # Cache global para hybrid searcher
 _hybrid_searcher: Optional[HybridSearch] = None
 
+# Máximo de queries devolvidas pela expansão (expand_query_hybrid)
+MAX_EXPANDED_QUERIES = 5
+
+# Cache global do índice carregado: index_dir -> (mtimes, faiss_index, metadata)
+# Compartilhado pelas threads do executor de retrieval
+_loaded_indexes: dict[str, tuple] = {}
+_index_lock = threading.Lock()
+
 
 def load_embedder() -> SentenceTransformer:
     """
@@ -74,7 +100,7 @@ def load_embedder() -> SentenceTransformer:
     """
     global _embedder
     if _embedder is None:
-        print(f"Carregando modelo de embedding: {settings.EMBEDDING_MODEL}")
+        logger.info("Carregando modelo de embedding: %s", settings.EMBEDDING_MODEL)
         _embedder = SentenceTransformer(settings.EMBEDDING_MODEL)
     return _embedder
 
@@ -92,9 +118,9 @@ def extract_text_from_pdf(pdf_path: str) -> list[str]:
             text = page.get_text("text")
             pages_text.append(text)
         pdf_document.close()
-        print(f"✓ Extraído texto de {len(pages_text)} páginas: {pdf_path}")
+        logger.info("✓ Extraído texto de %s páginas: %s", len(pages_text), pdf_path)
     except Exception as e:
-        print(f"✗ Erro ao extrair texto de {pdf_path}: {e}")
+        logger.error("✗ Erro ao extrair texto de %s: %s", pdf_path, e)
     return pages_text
 
 
@@ -150,11 +176,14 @@ def chunk_text(
     return chunks
 
 
-def load_or_create_index(index_dir: str) -> tuple[faiss.IndexFlatIP, dict]:
+def load_or_create_index(index_dir: str, load_faiss: bool = True) -> tuple[Optional[faiss.Index], dict]:
     """
     Carrega índice FAISS existente ou cria um novo.
     Também carrega metadados do JSON.
     
+    Com load_faiss=False, só os metadados (índice None): a busca binária
+    dispensa o índice float em memória.
+    
     Retorna: (faiss_index, metadata_dict)
     """
     index_path = os.path.join(index_dir, "index.faiss")
@@ -166,44 +195,108 @@ def load_or_create_index(index_dir: str) -> tuple[faiss.IndexFlatIP, dict]:
         try:
             with open(metadata_path, "r", encoding="utf-8") as f:
                 metadata = json.load(f)
-            print(f"✓ Metadados carregados: {len(metadata.get('documents', []))} docs, {len(metadata.get('chunks', []))} chunks")
+            logger.info("✓ Metadados carregados: %s docs, %s chunks", len(metadata.get('documents', [])), len(metadata.get('chunks', [])))
         except Exception as e:
-            print(f"✗ Erro ao carregar metadados: {e}")
+            logger.error("✗ Erro ao carregar metadados: %s", e)
     
     # Carrega ou cria índice FAISS
-    if os.path.exists(index_path):
+    if not load_faiss:
+        faiss_index = None
+        logger.info("✓ Índice FAISS não carregado (DENSE_RETRIEVER=binary)")
+    elif os.path.exists(index_path):
         try:
             faiss_index = faiss.read_index(index_path)
-            print(f"✓ Índice FAISS carregado: {faiss_index.ntotal} vetores")
+            logger.info("✓ Índice FAISS carregado: %s vetores", faiss_index.ntotal)
         except Exception as e:
-            print(f"✗ Erro ao carregar índice FAISS: {e}")
-            faiss_index = faiss.IndexFlatIP(384)  # all-MiniLM-L6-v2 tem 384 dimensões
+            logger.error("✗ Erro ao carregar índice FAISS: %s", e)
+            faiss_index = create_index(spec="Flat")
     else:
-        # Cria novo índice
-        faiss_index = faiss.IndexFlatIP(384)  # all-MiniLM-L6-v2 tem 384 dimensões
-        print("✓ Novo índice FAISS criado (384 dimensões)")
+        # Cria novo índice (vazio; um índice que precisa de treino nasce na primeira ingestão)
+        spec = "Flat" if needs_training() else settings.FAISS_INDEX_FACTORY
+        faiss_index = create_index(spec=spec)
+        logger.info("✓ Novo índice FAISS criado (%s, 384 dimensões)", spec)
     
     return faiss_index, metadata
 
 
+def get_index(index_dir: str) -> tuple[Optional[faiss.Index], dict]:
+    """
+    Retorna índice FAISS e metadados já carregados em memória.
+    
+    Evita reler o metadata.json (~22MB) a cada busca; recarrega apenas quando
+    os arquivos em disco mudam (ex.: após uma nova ingestão). Com
+    DENSE_RETRIEVER=binary e vectors.npy presente, o índice FAISS não é
+    carregado (None).
+    """
+    paths = [
+        os.path.join(index_dir, "index.faiss"),
+        os.path.join(index_dir, "metadata.json"),
+        os.path.join(index_dir, VECTORS_FILE),
+    ]
+    mtimes = tuple(os.path.getmtime(p) if os.path.exists(p) else None for p in paths)
+    
+    cached = _loaded_indexes.get(index_dir)
+    if cached and cached[0] == mtimes:
+        return cached[1], cached[2]
+    
+    with _index_lock:
+        cached = _loaded_indexes.get(index_dir)
+        if cached and cached[0] == mtimes:
+            return cached[1], cached[2]
+        binary_only = settings.DENSE_RETRIEVER == "binary" and binary_available(index_dir)
+        faiss_index, metadata = load_or_create_index(index_dir, load_faiss=not binary_only)
+        _loaded_indexes[index_dir] = (mtimes, faiss_index, metadata)
+        return faiss_index, metadata
+
+
+def index_stats() -> dict:
+    """Tamanho dos índices já carregados (FAISS por diretório e vocabulário do BM25)."""
+    return {
+        "faiss": {
+            index_dir: {
+                **(describe(faiss_index) if faiss_index is not None
+                   else {"type": "binary", "ntotal": len(metadata.get("chunks", []))}),
+                "chunks": len(metadata.get("chunks", []))
+            }
+            for index_dir, (_, faiss_index, metadata) in list(_loaded_indexes.items())
+        },
+        "faiss_binary": binary_index_stats(),
+        "bm25_vocab": len(_hybrid_searcher.bm25.idf) if _hybrid_searcher else None,
+        "bm25_docs": len(_hybrid_searcher.corpus) if _hybrid_searcher else None,
+    }
+
+
+def loaded_components() -> dict:
+    """Objetos pesados já carregados em memória (para a contabilidade de backend/memory.py)."""
+    return {
+        "embedder": _embedder,
+        "indexes": {index_dir: (faiss_index, metadata) for index_dir, (_, faiss_index, metadata) in list(_loaded_indexes.items())},
+        "hybrid_searcher": _hybrid_searcher,
+    }
+
+
 def save_index_and_metadata(
-    faiss_index: faiss.IndexFlatIP,
+    faiss_index: faiss.Index,
     metadata: dict,
-    index_dir: str
+    index_dir: str,
+    vectors: Optional[np.ndarray] = None
 ) -> None:
-    """Salva o índice FAISS e os metadados em disco."""
+    """Salva o índice FAISS, os metadados e (se dados) os vetores originais em disco."""
     os.makedirs(index_dir, exist_ok=True)
     
+    if vectors is not None:
+        save_vectors(index_dir, vectors)
+    
     # Salva índice FAISS
     index_path = os.path.join(index_dir, "index.faiss")
     faiss.write_index(faiss_index, index_path)
-    print(f"✓ Índice FAISS salvo: {index_path}")
+    logger.info("✓ Índice FAISS salvo: %s", index_path)
     
     # Salva metadados
     metadata_path = os.path.join(index_dir, "metadata.json")
     with open(metadata_path, "w", encoding="utf-8") as f:
         json.dump(metadata, f, ensure_ascii=False, indent=2)
-    print(f"✓ Metadados salvos: {metadata_path}")
+    logger.info("✓ Metadados salvos: %s", metadata_path)
 
 
 def add_document_to_index(
@@ -230,7 +323,7 @@ def add_document_to_index(
         max_chunk_size=1200,
         min_chunk_size=200
     )
-    print(f"  → {len(chunks)} chunks semânticos criados")
+    logger.info("  → %s chunks semânticos criados", len(chunks))
     
     # Carrega índice e metadados
     faiss_index, metadata = load_or_create_index(index_dir)
@@ -271,14 +364,22 @@ def add_document_to_index(
         metadata["chunks"].append(chunk_metadata)
     
     # Adiciona embeddings ao índice
+    vectors = load_vectors(index_dir, faiss_index)
     if embeddings_list:
         embeddings_array = np.array(embeddings_list, dtype=np.float32)
         faiss.normalize_L2(embeddings_array)
-        faiss_index.add(embeddings_array)  # type: ignore
-        print(f"  → {len(embeddings_list)} embeddings adicionados ao índice")
+        vectors = np.vstack([vectors, embeddings_array])
+        spec = settings.FAISS_INDEX_FACTORY
+        if needs_training(spec) or metadata.get("index_factory", "Flat") != spec:
+            # IVF: re-treina com o acervo inteiro; troca de tipo: reconstrói do zero
+            faiss_index, metadata["index_factory"] = build_index(vectors, spec)
+            logger.info("  → Índice %s reconstruído com %s vetores", metadata["index_factory"], len(vectors))
+        else:
+            faiss_index.add(embeddings_array)  # type: ignore
+            logger.info("  → %s embeddings adicionados ao índice", len(embeddings_list))
     
-    # Salva índice e metadados
-    save_index_and_metadata(faiss_index, metadata, index_dir)
+    # Salva índice, metadados e vetores originais
+    save_index_and_metadata(faiss_index, metadata, index_dir, vectors=vectors)
 
 
 def search(
@@ -289,7 +390,9 @@ def search(
     embedder: Optional[SentenceTransformer] = None,
     use_reranking: bool = True,
     use_hybrid: bool = True,
-    use_query_expansion: bool = True
+    use_query_expansion: bool = True,
+    deadline: Optional[Deadline] = None,
+    dense_hits: Optional[dict] = None
 ) -> list[dict]:
     """
     Busca chunks relevantes com técnicas avançadas de RAG.
@@ -308,44 +411,82 @@ def search(
         use_reranking: Se True, aplica re-ranking multi-signal
         use_hybrid: Se True, usa hybrid search (BM25 + Dense)
         use_query_expansion: Se True, expande query com sinônimos/LLM
+        deadline: Prazo da requisição; etapas opcionais (expansão, BM25,
+            re-ranking) são puladas quando o tempo restante fica curto
+        dense_hits: Buscas densas já feitas (query -> (embedding, scores, ids)),
+            reaproveitadas em vez de re-embedar e re-consultar o índice; as
+            novas são anotadas no dict (sondagem do roteador → busca completa)
     
     Returns:
         Lista de dicts com contextos relevantes ordenados por relevância
     """
     global _hybrid_searcher
     
+    # A busca pode ter esperado na fila do executor: confere o prazo antes de começar
+    if deadline is not None:
+        deadline.check("embedding")
+    
     embedder = embedder or load_embedder()
     
-    # Carrega índice e metadados
-    faiss_index, metadata = load_or_create_index(index_dir)
+    # Índice e metadados já carregados (compartilhados entre requisições)
+    faiss_index, metadata = get_index(index_dir)
     
-    if faiss_index.ntotal == 0:
+    chunks_metadata = metadata.get("chunks", [])
+    if (faiss_index.ntotal if faiss_index is not None else len(chunks_metadata)) == 0:
         return []
     
-    chunks_metadata = metadata.get("chunks", [])
     docs_metadata = {doc["document_id"]: doc for doc in metadata.get("documents", [])}
     
     # === ETAPA 1: Query Expansion ===
     queries_to_search = [query]
-    if use_query_expansion:
-        expander = get_query_expander(use_llm=settings.ENABLE_LLM_EXPANSION, use_synonyms=True)
-        queries_to_search = expander.expand(query)
-        print(f"🔄 Query Expansion: 1 query → {len(queries_to_search)} queries")
+    if use_query_expansion and (deadline is None or deadline.allows("expansion")):
+        with timed("expansion"):
+            expander = get_query_expander(use_llm=settings.ENABLE_LLM_EXPANSION, use_synonyms=True)
+            queries_to_search = expander.expand(query)
+        logger.debug("🔄 Query Expansion: 1 query → %s queries", len(queries_to_search))
     
     # === ETAPA 2: Dense Search (FAISS) para cada query ===
     all_results = {}  # dict para deduplicar por content
     
-    for q in queries_to_search:
-        # Embed a query
-        query_embedding = embedder.encode(q, convert_to_numpy=True)
-        query_embedding = np.array([query_embedding], dtype=np.float32)
-        faiss.normalize_L2(query_embedding)
+    for i, q in enumerate(queries_to_search):
+        # Queries expandidas são opcionais; a original é obrigatória
+        if deadline is not None:
+            if i == 0:
+                deadline.check("embedding")
+            elif not deadline.allows("expansion"):
+                break
         
         # Busca no FAISS (pega mais resultados para filtrar depois)
         search_k = top_k * len(queries_to_search)  # Busca mais se tem expansão
-        distances, indices = faiss_index.search(query_embedding, search_k)  # type: ignore
-        distances = distances[0]
-        indices = indices[0]
+        cached = dense_hits.get(q) if dense_hits is not None else None
+        if cached is not None and cached[2].shape[1] >= search_k:
+            _, distances, indices = cached
+        else:
+            # Embed a query
+            if cached is not None:
+                query_embedding = cached[0]
+            else:
+                with timed("embedding"):
+                    query_embedding = embedder.encode(q, convert_to_numpy=True)
+                    query_embedding = np.array([query_embedding], dtype=np.float32)
+                    faiss.normalize_L2(query_embedding)
+            if dense_hits is not None:
+                # Anotada para reuso: já busca o suficiente para a expansão máxima
+                search_k = max(search_k, top_k * MAX_EXPANDED_QUERIES)
+            with timed("faiss"):
+                dense = None
+                if settings.DENSE_RETRIEVER == "binary":
+                    dense = binary_search(index_dir, query_embedding, search_k)
+                if dense is None and faiss_index is None:
+                    # vectors.npy sumiu depois do carregamento: o próximo get_index recarrega o FAISS
+                    faiss_index, _ = get_index(index_dir)
+                if dense is None:
+                    dense = search_index(faiss_index, query_embedding, search_k, vectors=full_precision_vectors(index_dir))
+                distances, indices = dense
+            if dense_hits is not None:
+                dense_hits[q] = (query_embedding, distances, indices)
+        distances = distances[0][:top_k * len(queries_to_search)]
+        indices = indices[0][:top_k * len(queries_to_search)]
         
         # Processa resultados desta query
         for distance, idx in zip(distances, indices):
@@ -366,6 +507,7 @@ def search(
             if content not in all_results or score > all_results[content]["score"]:
                 all_results[content] = {
                     "content": content,
+                    "chunk_id": chunk_meta.get("chunk_id") or str(idx),
                     "title": doc_meta.get("title", "Unknown"),
                     "page_start": chunk_meta["page_start"],
                     "page_end": chunk_meta["page_end"],
@@ -375,85 +517,86 @@ def search(
                 }
     
     results = list(all_results.values())
-    print(f"🔍 Dense Search: {len(results)} resultados únicos (min_sim={min_sim})")
+    logger.debug("🔍 Dense Search: %s resultados únicos (min_sim=%s)", len(results), min_sim)
     
     if not results:
         return []
     
     # === ETAPA 3: Hybrid Search (BM25 + Dense) ===
-    if use_hybrid:
-        # Inicializa ou reutiliza hybrid searcher
-        if _hybrid_searcher is None or len(_hybrid_searcher.corpus) != len(chunks_metadata):
-            _hybrid_searcher = create_hybrid_searcher(chunks_metadata, alpha=0.65)
+    if use_hybrid and (deadline is None or deadline.allows("bm25")):
+        # Inicializa ou reutiliza hybrid searcher (lock: várias threads de retrieval)
+        with _index_lock:
+            if _hybrid_searcher is None or len(_hybrid_searcher.corpus) != len(chunks_metadata):
+                _hybrid_searcher = create_hybrid_searcher(chunks_metadata, alpha=settings.HYBRID_ALPHA)
+            hybrid_searcher = _hybrid_searcher
         
-        results = _hybrid_searcher.search(query, results, top_k=top_k*2)
-        print(f"🔀 Hybrid Search: {len(results)} resultados após BM25 fusion")
+        with timed("bm25"):
+            results = hybrid_searcher.search(query, results, top_k=top_k*2)
+        logger.debug("🔀 Hybrid Search: %s resultados após BM25 fusion", len(results))
     
     # === ETAPA 4: Re-ranking Multi-Signal ===
-    if use_reranking and results:
-        results = rerank_results(query, results)
-        print(f"📊 Re-ranking: {len(results)} resultados re-ordenados")
+    if use_reranking and results and (deadline is None or deadline.allows("rerank")):
+        with timed("rerank"):
+            results = rerank_results(query, results)
+        logger.debug("📊 Re-ranking: %s resultados re-ordenados", len(results))
     
     # Retorna top-k finais
     final_results = results[:top_k]
-    print(f"✅ Retornando {len(final_results)} resultados finais")
+    logger.debug("✅ Retornando %s resultados finais", len(final_results))
     
     return final_results
 
 
-def generate_answer(question: str, contexts: list[dict], conversation_history: list[dict] = None) -> str:
+# Resposta padrão quando o acervo não cobre a pergunta
+NO_INFO_ANSWER = "Não encontrei essa informação no acervo, entre em contato com o administrador da plataforma."
+
+# Resposta quando a quota do Groq se esgota após os retries
+RATE_LIMIT_ANSWER = (
+    "🕐 **Limite de requisições atingido**\n\n"
+    "Nosso sistema utiliza o endpoint Groq (free tier).\n\n"
+    "**Por favor, aguarde 1 minuto e tente novamente.**\n\n"
+    "💡 *Dica: Perguntas já feitas recentemente são respondidas instantaneamente do cache.*"
+)
+
+# Resposta imediata quando o circuit breaker do LLM está aberto
+LLM_UNAVAILABLE_ANSWER = (
+    "⚠️ Erro ao gerar resposta: o serviço de geração está temporariamente indisponível.\n\n"
+    "**Por favor, tente novamente em alguns instantes.**"
+)
+
+# Resposta quando a chamada ao LLM estoura um timeout sem prazo da requisição definido
+LLM_TIMEOUT_ANSWER = "⚠️ Erro ao gerar resposta: o serviço de geração não respondeu a tempo."
+
+
+# Resposta quando o prazo da requisição acaba antes da geração
+DEADLINE_ANSWER = (
+    "⏱️ **Resposta não gerada:** o tempo limite da requisição se esgotou.\n\n"
+    "**Por favor, tente novamente.**"
+)
+
+# Nota anexada quando o prazo interrompe uma resposta em streaming
+DEADLINE_TRUNCATED_NOTE = "\n\n⏱️ *Resposta interrompida: tempo limite da requisição esgotado.*"
+
+
+def build_prompt(question: str, contexts: list[dict], conversation_history: list[dict] = None) -> str:
     """
-    Gera uma resposta coerente e sintetizada usando Groq (endpoint OpenAI-compatible).
-    
-    Estratégia:
-    1. Se não houver contextos, avisa que precisa consultar dirigente
-    2. Se houver contextos, envia para o modelo sintetizar uma resposta
-    3. Modelo gera resposta em português, bem estruturada
-    4. Adiciona citações de fontes (documentos e páginas)
-    5. Considera histórico de conversa para perguntas de seguimento
-    
-    Integração: Groq Llama 3.x via client OpenAI-compatible
+    Monta o prompt de geração a partir dos contextos recuperados e do histórico.
     """
-    if not contexts:
-        return "Não encontrei essa informação no acervo, entre em contato com o administrador da plataforma."
+    # Monta contexto para Gemini (combina todos os chunks com fontes)
+    context_text = "CONTEXTOS RELEVANTES DO ACERVO:\n\n"
+    for ctx in contexts:
+        context_text += format_context_block(ctx)
     
-    try:
-        # Configura Groq com a API key
-        if not settings.GROQ_API_KEY:
-            return "⚠️ Erro: GROQ_API_KEY não configurada. Por favor, defina a variável de ambiente."
-
-        client = OpenAI(
-            api_key=settings.GROQ_API_KEY,
-            base_url=settings.GROQ_BASE_URL,
-        )
-        model_name = settings.GROQ_MODEL or "llama-3.3-70b-versatile"
-        
-        # Monta contexto para Gemini (combina todos os chunks com fontes)
-        context_text = "CONTEXTOS RELEVANTES DO ACERVO:\n\n"
-        sources = set()
-        
-        for i, ctx in enumerate(contexts, 1):
-            title = ctx.get("title", "Desconhecido")
-            page_start = ctx.get("page_start", "?")
-            page_end = ctx.get("page_end", "?")
-            content = ctx.get("content", "").strip()
-            score = ctx.get("final_score", ctx.get("score", 0))
-            
-            # Mantém estrutura interna mas não aparece na resposta ao usuário
-            context_text += f"[DOCUMENTO] {title} (pp. {page_start}-{page_end}) | Relevância: {score:.2f}\n{content}\n\n"
-            sources.add(f"{title} (pp. {page_start}-{page_end})")
-        
-        # Monta histórico de conversa se existir
-        history_text = ""
-        if conversation_history and len(conversation_history) > 0:
-            history_text = "HISTÓRICO DA CONVERSA (para contexto):\n\n"
-            for i, msg in enumerate(conversation_history[-3:], 1):  # Últimas 3 mensagens
-                history_text += f"Pergunta {i}: {msg.get('question', '')}\n"
-                history_text += f"Resposta {i}: {msg.get('answer', '')}\n\n"
-            history_text += "---\n\n"
-        
-        # Prompt original (versão que funcionava bem) + proteção contra "Contexto X" + histórico
-        prompt = f"""Com base nos documentos abaixo, responda a pergunta de forma clara e objetiva.
+    # Monta histórico de conversa se existir
+    history_text = ""
+    if conversation_history and len(conversation_history) > 0:
+        history_text = "HISTÓRICO DA CONVERSA (para contexto):\n\n"
+        for i, msg in enumerate(conversation_history[-3:], 1):  # Últimas 3 mensagens
+            history_text += format_history_turn(i, msg)
+        history_text += "---\n\n"
+    
+    # Prompt original (versão que funcionava bem) + proteção contra "Contexto X" + histórico
+    return f"""Com base nos documentos abaixo, responda a pergunta de forma clara e objetiva.
 
 {history_text}DOCUMENTOS:
 {context_text}
@@ -469,86 +612,165 @@ INSTRUÇÕES IMPORTANTES:
 - Se a informação não estiver nos documentos, responda: "Os documentos disponíveis tratam de [temas principais], mas não abordam especificamente [tema perguntado]."
 - Seja claro, didático e fiel ao conteúdo dos documentos"""
 
-        # Chama Groq com retry e exponential backoff
+
+def prepare_prompt(
+    question: str,
+    contexts: list[dict],
+    conversation_history: list[dict] = None,
+    meta: Optional[dict] = None
+) -> str:
+    """
+    Empacota contextos e histórico no orçamento de tokens e monta o prompt.
+    Registra em `meta` os tokens do prompt e o resultado do empacotamento.
+    """
+    with timed("prompt_build"):
+        packed = pack_contexts(contexts, conversation_history)
+        prompt = build_prompt(question, packed.contexts, packed.history)
+    if meta is not None:
+        meta.update(packed.to_meta())
+        meta["prompt_tokens_est"] = count_tokens(prompt)
+    return prompt
+
+
+def validate_answer(answer: str, contexts: list[dict]) -> str:
+    """
+    Valida a resposta do modelo (tamanho mínimo e indícios de alucinação).
+    Retorna a resposta final a ser entregue ao usuário.
+    """
+    # Validação básica
+    if len(answer.strip()) < 15:
+        logger.warning("⚠️ Resposta muito curta")
+        return NO_INFO_ANSWER
+    
+    # Validação 3: Detecta frases que indicam conhecimento prévio (alucinação)
+    hallucination_indicators = [
+        "de acordo com a tradição",
+        "na umbanda tradicional",
+        "geralmente se diz que",
+        "é sabido que",
+        "segundo especialistas",
+        "historicamente",
+        "na prática comum",
+        "tipicamente",
+        "usualmente"
+    ]
+    
+    answer_lower = answer.lower()
+    for indicator in hallucination_indicators:
+        if indicator in answer_lower:
+            # Verifica se o indicador aparece nos contextos
+            context_combined = " ".join([ctx.get("content", "").lower() for ctx in contexts])
+            if indicator not in context_combined:
+                logger.warning("⚠️ ALERTA: Possível alucinação detectada - frase '%s' não está nos contextos", indicator)
+                # Não bloqueia, mas loga o alerta
+    
+    logger.debug("✅ Resposta gerada (%s caracteres)", len(answer))
+    return answer
+
+
+async def generate_answer(
+    question: str,
+    contexts: list[dict],
+    conversation_history: list[dict] = None,
+    priority: int = PRIORITY_INTERACTIVE,
+    meta: Optional[dict] = None,
+    small_model: bool = False,
+    deadline: Optional[Deadline] = None
+) -> str:
+    """
+    Gera uma resposta coerente e sintetizada usando os provedores LLM configurados.
+    
+    Estratégia:
+    1. Se não houver contextos, avisa que precisa consultar dirigente
+    2. Se houver contextos, envia para o modelo sintetizar uma resposta
+    3. Modelo gera resposta em português, bem estruturada
+    4. Adiciona citações de fontes (documentos e páginas)
+    5. Considera histórico de conversa para perguntas de seguimento
+    
+    Cada tentativa passa pelo rate limiter do provedor com a prioridade
+    informada; `meta`, se fornecido, recebe provedor vencedor, hedge/failover,
+    posição/espera na fila e tokens usados. Com `small_model`, usa o modelo
+    menor de cada provedor (rota light do roteador). Com `deadline`, a geração
+    (fila + resposta) é limitada ao tempo restante da requisição e, se ele não
+    bastar, a resposta extrativa é usada.
+    
+    Integração: provedores OpenAI-compatible com failover e hedging (backend/llm.py)
+    """
+    if not contexts:
+        return NO_INFO_ANSWER
+    
+    try:
+        if not get_providers():
+            return "⚠️ Erro: GROQ_API_KEY não configurada. Por favor, defina a variável de ambiente."
+
+        if not _deadline_allows_llm(deadline):
+            return _fallback_answer(question, contexts, DEADLINE_ANSWER, "deadline", meta)
+
+        prompt = prepare_prompt(question, contexts, conversation_history, meta)
+
+        # Failover/hedging entre provedores acontece dentro de complete_llm();
+        # aqui só re-tentamos quando todos falharam
         max_retries = 3
         retry_delay = 2  # segundos
         answer = None
 
         for attempt in range(max_retries):
             try:
-                response = client.chat.completions.create(
-                    model=model_name,
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0.2,
-                    max_tokens=800,
+                answer = await asyncio.wait_for(
+                    complete_llm(
+                        prompt,
+                        max_tokens=settings.LLM_MAX_TOKENS,
+                        temperature=0.2,
+                        priority=priority,
+                        meta=meta,
+                        small_model=small_model,
+                        max_queue_wait_s=_queue_wait_budget(deadline)
+                    ),
+                    timeout=deadline.remaining() if deadline is not None else None
                 )
-                answer = response.choices[0].message.content.strip()
                 break  # Sucesso, sai do loop
+            except asyncio.TimeoutError:
+                if deadline is None:
+                    # Sem prazo da requisição o timeout veio de outra camada: é erro do LLM
+                    logger.error("✗ Timeout ao chamar LLM (tentativa %s)", attempt + 1)
+                    return _fallback_answer(question, contexts, LLM_TIMEOUT_ANSWER, "llm_error", meta)
+                deadline.degrade("llm")
+                return _fallback_answer(question, contexts, DEADLINE_ANSWER, "deadline", meta)
+            except (NoProviderAvailable, CircuitOpenError) as e:
+                # Circuitos abertos: fast-fail sem gastar quota nem esperar timeouts
+                logger.error("⛔ LLM indisponível: %s", e)
+                return _fallback_answer(question, contexts, LLM_UNAVAILABLE_ANSWER, "llm_unavailable", meta)
+            except RateLimitExceeded as e:
+                logger.warning("⚠️ Fila do LLM cheia: %s", e)
+                return _fallback_answer(question, contexts, RATE_LIMIT_ANSWER, "rate_limited", meta)
             except RateLimitError as e:
-                # Erro 429 - Quota excedida
-                if attempt < max_retries - 1:
-                    wait_time = retry_delay * (2 ** attempt)  # Exponential backoff
-                    print(f"⚠️ Quota Groq excedida. Tentativa {attempt + 1}/{max_retries}. Aguardando {wait_time}s...")
-                    time.sleep(wait_time)
+                # Erro 429 apesar do limiter (outro cliente, quota diária...)
+                wait_s = _rate_limit_wait(e, retry_delay * 2 ** attempt)
+                if attempt < max_retries - 1 and not _all_circuits_open() and _deadline_allows_llm(deadline, wait_s):
+                    logger.warning("⚠️ Quota LLM excedida. Tentativa %s/%s. Aguardando %.1fs...", attempt + 1, max_retries, wait_s)
+                    if wait_s:
+                        await asyncio.sleep(wait_s)
                 else:
-                    print(f"✗ Quota Groq esgotada após {max_retries} tentativas")
-                    return (
-                        "🕐 **Limite de requisições atingido**\n\n"
-                        "Nosso sistema utiliza o endpoint Groq (free tier).\n\n"
-                        "**Por favor, aguarde 1 minuto e tente novamente.**\n\n"
-                        "💡 *Dica: Perguntas já feitas recentemente são respondidas instantaneamente do cache.*"
-                    )
-            except APIError as e:
-                print(f"✗ Erro de API Groq (tentativa {attempt + 1}): {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
-                else:
-                    return f"⚠️ Erro ao gerar resposta: {str(e)}"
+                    logger.error("✗ Quota LLM esgotada após %s tentativas", max_retries)
+                    return _fallback_answer(question, contexts, RATE_LIMIT_ANSWER, "rate_limited", meta)
             except Exception as e:
-                print(f"✗ Erro ao chamar Groq (tentativa {attempt + 1}): {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
+                logger.error("✗ Erro ao chamar LLM (tentativa %s): %s", attempt + 1, e)
+                if attempt < max_retries - 1 and not _all_circuits_open() and _deadline_allows_llm(deadline, retry_delay):
+                    await asyncio.sleep(retry_delay)
                 else:
-                    return f"⚠️ Erro ao gerar resposta: {str(e)}"
+                    return _fallback_answer(
+                        question, contexts, f"⚠️ Erro ao gerar resposta: {str(e)}", "llm_error", meta
+                    )
 
         # Se não conseguiu resposta após retries
         if answer is None:
             return "Erro ao processar a pergunta. Por favor, tente novamente."
         
-        # Validação básica
-        if len(answer.strip()) < 15:
-            print("⚠️ Resposta muito curta")
-            return "Não encontrei essa informação no acervo, entre em contato com o administrador da plataforma."
-        
-        # Validação 3: Detecta frases que indicam conhecimento prévio (alucinação)
-        hallucination_indicators = [
-            "de acordo com a tradição",
-            "na umbanda tradicional",
-            "geralmente se diz que",
-            "é sabido que",
-            "segundo especialistas",
-            "historicamente",
-            "na prática comum",
-            "tipicamente",
-            "usualmente"
-        ]
-        
-        answer_lower = answer.lower()
-        for indicator in hallucination_indicators:
-            if indicator in answer_lower:
-                # Verifica se o indicador aparece nos contextos
-                context_combined = " ".join([ctx.get("content", "").lower() for ctx in contexts])
-                if indicator not in context_combined:
-                    print(f"⚠️ ALERTA: Possível alucinação detectada - frase '{indicator}' não está nos contextos")
-                    # Não bloqueia, mas loga o alerta
-        
-        print(f"✅ Resposta gerada ({len(answer)} caracteres)")
-
         # Retorna resposta do modelo (as fontes são exibidas pelo frontend)
-        return answer
+        return validate_answer(answer, contexts)
 
     except Exception as e:
-        print(f"Erro ao chamar LLM: {e}")
+        logger.error("✗ Erro ao chamar LLM: %s", e)
         # Fallback: resposta simples se falhar
         return (
             f"Desculpe, ocorreu um erro ao processar sua pergunta: {str(e)}. "
@@ -556,18 +778,273 @@ INSTRUÇÕES IMPORTANTES:
         )
 
 
-def ask_with_cache(
+def _fallback_answer(
+    question: str,
+    contexts: list[dict],
+    error_answer: str,
+    reason: str,
+    meta: Optional[dict] = None
+) -> str:
+    """
+    Resposta quando o LLM não pode responder (sem quota, circuito aberto, erro):
+    usa a resposta extrativa dos contextos, se habilitada e possível, senão
+    a mensagem de erro. `meta` indica o modo da resposta e o motivo.
+    """
+    if settings.EXTRACTIVE_FALLBACK:
+        started_at = time.perf_counter()
+        bm25 = _hybrid_searcher.bm25 if _hybrid_searcher is not None else None
+        with timed("extractive"):
+            answer = build_extractive_answer(question, contexts, bm25=bm25)
+        if answer:
+            elapsed_ms = round((time.perf_counter() - started_at) * 1000, 2)
+            logger.info("📄 Resposta extrativa (%s) em %sms", reason, elapsed_ms)
+            if meta is not None:
+                meta["answer_mode"] = "extractive"
+                meta["extractive_reason"] = reason
+                meta["extractive_ms"] = elapsed_ms
+            return answer
+    return error_answer
+
+
+def is_cacheable_result(meta: Optional[dict], deadline: Optional[Deadline] = None) -> bool:
+    """
+    Admissão no cache a partir dos metadados do pipeline: respostas extrativas
+    de fallback (LLM sem quota, indisponível ou com erro) ficam de fora; as da
+    rota extractive do roteador, que não têm `extractive_reason`, entram.
+    Respostas de requisições com alguma etapa degradada pelo prazo (inclusive
+    DEADLINE_ANSWER e streams cortados) também não entram.
+    """
+    if deadline is not None and deadline.degraded:
+        return False
+    return not (meta and meta.get("extractive_reason"))
+
+
+def _deadline_allows_llm(deadline: Optional[Deadline], extra_s: float = 0.0) -> bool:
+    """Indica se ainda há tempo para (mais) uma chamada ao LLM; senão marca 'llm' como degradada."""
+    if deadline is None:
+        return True
+    return deadline.allows("llm", reserve_s=settings.DEADLINE_MIN_LLM_S + extra_s)
+
+
+def _queue_wait_budget(deadline: Optional[Deadline]) -> float:
+    """Espera máxima na fila do LLM: LLM_QUEUE_MAX_WAIT_S limitado pelo prazo restante."""
+    if deadline is None:
+        return settings.LLM_QUEUE_MAX_WAIT_S
+    return max(0.0, min(settings.LLM_QUEUE_MAX_WAIT_S, deadline.remaining() - settings.DEADLINE_MIN_LLM_S))
+
+
+def _rate_limit_wait(error: Exception, backoff_s: float) -> float:
+    """
+    Espera antes de re-tentar após um 429. Se todos os provedores têm rate
+    limiter, a própria fila segura a nova tentativa (o limiter já foi esvaziado
+    pelo 429); senão, respeita o Retry-After do provedor ou o backoff.
+    """
+    if all(provider.limiter for provider in get_providers()):
+        return 0.0
+    return retry_after_seconds(error) or backoff_s
+
+
+def _all_circuits_open() -> bool:
+    return all(provider.breaker.is_open for provider in get_providers())
+
+
+async def generate_answer_stream(
+    question: str,
+    contexts: list[dict],
+    conversation_history: list[dict] = None,
+    priority: int = PRIORITY_INTERACTIVE,
+    meta: Optional[dict] = None,
+    small_model: bool = False,
+    deadline: Optional[Deadline] = None
+) -> AsyncIterator[str]:
+    """
+    Versão streaming de generate_answer(): produz os tokens da resposta à medida
+    que o provedor vencedor os envia.
+    
+    Erros antes do primeiro token são re-tentados como em generate_answer();
+    se persistirem, a mensagem de erro é emitida como único "token". Se o prazo
+    acabar no meio do streaming, a resposta é encerrada com uma nota.
+    """
+    if not contexts:
+        yield NO_INFO_ANSWER
+        return
+    
+    if not get_providers():
+        yield "⚠️ Erro: GROQ_API_KEY não configurada. Por favor, defina a variável de ambiente."
+        return
+
+    if not _deadline_allows_llm(deadline):
+        yield _fallback_answer(question, contexts, DEADLINE_ANSWER, "deadline", meta)
+        return
+
+    prompt = prepare_prompt(question, contexts, conversation_history, meta)
+
+    max_retries = 3
+    retry_delay = 2  # segundos
+    emitted = False
+
+    for attempt in range(max_retries):
+        stream = stream_llm(
+            prompt,
+            max_tokens=settings.LLM_MAX_TOKENS,
+            temperature=0.2,
+            priority=priority,
+            meta=meta,
+            small_model=small_model,
+            max_queue_wait_s=_queue_wait_budget(deadline)
+        )
+        try:
+            while True:
+                try:
+                    delta = await asyncio.wait_for(
+                        stream.__anext__(),
+                        timeout=deadline.remaining() if deadline is not None else None
+                    )
+                except StopAsyncIteration:
+                    return
+                emitted = True
+                yield delta
+        except asyncio.TimeoutError:
+            if deadline is None:
+                # Sem prazo da requisição o timeout veio de outra camada: é erro do LLM
+                logger.error("✗ Timeout no stream LLM (tentativa %s/%s)", attempt + 1, max_retries)
+                if emitted:
+                    yield f"\n\n{LLM_TIMEOUT_ANSWER}"
+                else:
+                    yield _fallback_answer(question, contexts, LLM_TIMEOUT_ANSWER, "llm_error", meta)
+                return
+            deadline.degrade("llm")
+            if emitted:
+                yield DEADLINE_TRUNCATED_NOTE
+            else:
+                yield _fallback_answer(question, contexts, DEADLINE_ANSWER, "deadline", meta)
+            return
+        except (NoProviderAvailable, CircuitOpenError) as e:
+            logger.error("⛔ LLM indisponível: %s", e)
+            yield _fallback_answer(question, contexts, LLM_UNAVAILABLE_ANSWER, "llm_unavailable", meta)
+            return
+        except RateLimitExceeded as e:
+            logger.warning("⚠️ Fila do LLM cheia: %s", e)
+            yield _fallback_answer(question, contexts, RATE_LIMIT_ANSWER, "rate_limited", meta)
+            return
+        except Exception as e:
+            if emitted:
+                # Não dá para re-tentar depois de enviar tokens ao cliente
+                logger.error("✗ Stream LLM interrompido: %s", e)
+                yield f"\n\n⚠️ Erro ao gerar resposta: {str(e)}"
+                return
+            is_rate_limit = isinstance(e, RateLimitError)
+            wait_s = _rate_limit_wait(e, retry_delay * 2 ** attempt) if is_rate_limit else retry_delay
+            logger.error("✗ Erro no stream LLM (tentativa %s/%s): %s", attempt + 1, max_retries, e)
+            if attempt < max_retries - 1 and not _all_circuits_open() and _deadline_allows_llm(deadline, wait_s):
+                if wait_s:
+                    await asyncio.sleep(wait_s)
+            elif is_rate_limit:
+                yield _fallback_answer(question, contexts, RATE_LIMIT_ANSWER, "rate_limited", meta)
+            else:
+                yield _fallback_answer(
+                    question, contexts, f"⚠️ Erro ao gerar resposta: {str(e)}", "llm_error", meta
+                )
+        finally:
+            # Encerra as tentativas em andamento (prazo, erro ou cliente desconectado)
+            await stream.aclose()
+
+
+async def retrieve_with_routing(
+    question: str,
+    top_k: int = 8,
+    min_sim: float = 0.30,
+    index_dir: str = None,
+    use_reranking: bool = True,
+    conversation_history: list[dict] = None,
+    meta: Optional[dict] = None,
+    deadline: Optional[Deadline] = None
+) -> tuple[str, list[dict]]:
+    """
+    Escolhe a rota da pergunta (backend/router.py) e executa a busca correspondente.
+
+    Uma busca densa de sondagem (sem expansão, BM25 ou re-ranking) alimenta o
+    roteador; nas rotas light/extractive ela já é o resultado final, na rota
+    full a busca completa é executada em seguida, reaproveitando o embedding
+    e os hits densos da pergunta original (só as queries expandidas são novas).
+
+    Returns:
+        Tupla (rota, contextos)
+    """
+    if index_dir is None:
+        index_dir = settings.INDEX_DIR
+    executor = get_retrieval_executor()
+
+    route, reason = ROUTE_FULL, "router desabilitado"
+    # Embedding e hits densos da sondagem, reaproveitados pela busca completa
+    dense_hits = {}
+    if settings.ROUTER_ENABLED:
+        routing_start = time.perf_counter()
+        probe = await executor.run(
+            search,
+            query=question,
+            top_k=top_k,
+            min_sim=min_sim,
+            index_dir=index_dir,
+            use_reranking=False,
+            use_hybrid=False,
+            use_query_expansion=False,
+            deadline=deadline,
+            dense_hits=dense_hits
+        )
+        route, reason = classify_query(question, probe, bool(conversation_history))
+        record_stage("routing", (time.perf_counter() - routing_start) * 1000)
+
+    if route == ROUTE_FULL:
+        contexts = await executor.run(
+            search,
+            query=question,
+            top_k=top_k,
+            min_sim=min_sim,
+            index_dir=index_dir,
+            use_reranking=use_reranking,
+            deadline=deadline,
+            dense_hits=dense_hits
+        )
+    else:
+        contexts = probe[:settings.ROUTER_LIGHT_TOP_K]
+
+    logger.debug("🧭 Rota '%s': %s", route, reason)
+    if meta is not None:
+        meta["route"] = route
+        meta["route_reason"] = reason
+    return route, contexts
+
+
+def build_routed_extractive_answer(question: str, contexts: list[dict]) -> str:
+    """Resposta da rota extractive (consulta direta respondida sem LLM)."""
+    bm25 = _hybrid_searcher.bm25 if _hybrid_searcher is not None else None
+    with timed("extractive"):
+        answer = build_extractive_answer(
+            question, contexts, bm25=bm25, note="trechos do acervo mais relevantes para a sua pergunta"
+        )
+    return answer or NO_INFO_ANSWER
+
+
+async def ask_with_cache(
     question: str,
     top_k: int = 8,
     min_sim: float = 0.30,
     use_cache: bool = True,
     use_reranking: bool = True,
     index_dir: str = None,
-    conversation_history: list[dict] = None
+    conversation_history: list[dict] = None,
+    priority: int = PRIORITY_INTERACTIVE,
+    meta: Optional[dict] = None,
+    deadline: Optional[Deadline] = None
 ) -> tuple[str, list[dict]]:
     """
     Função principal que integra cache, busca, re-ranking e geração de resposta.
     
+    O roteador (backend/router.py) escolhe entre cache, resposta extrativa,
+    pipeline leve com modelo pequeno e pipeline completo. A busca é CPU-bound e
+    roda no executor dedicado de retrieval; a geração é assíncrona.
+    
     Args:
         question: Pergunta do usuário
         top_k: Número de documentos a recuperar
@@ -576,34 +1053,63 @@ def ask_with_cache(
         use_reranking: Se True, aplica re-ranking
         index_dir: Diretório do índice (opcional, usa settings.INDEX_DIR se None)
         conversation_history: Histórico de perguntas/respostas anteriores
+        priority: Prioridade na fila do LLM (interativa ou batch/warmup)
+        meta: Dict opcional preenchido com metadados do pipeline (fila, tokens)
+        deadline: Prazo da requisição, verificado por todas as etapas
+    
+    Raises:
+        DeadlineExceeded: se o prazo vencer antes de uma etapa obrigatória da busca
     
     Returns:
         Tupla (resposta, contextos)
     """
-    if index_dir is None:
-        index_dir = settings.INDEX_DIR
-    
+    started_at = time.perf_counter()
     cache = get_response_cache()
+    if meta is None:
+        meta = {}  # A admissão no cache depende dos metadados do pipeline
     
     # Tenta recuperar do cache
     if use_cache:
-        cached = cache.get(question)
+        with timed("cache_lookup"):
+            cached = cache.get(question)
         if cached:
+            if meta is not None:
+                meta["route"] = ROUTE_CACHED
+            get_router_stats().record(ROUTE_CACHED, (time.perf_counter() - started_at) * 1000)
             return cached['answer'], cached['contexts']
     
-    # Cache miss: busca + gera resposta
-    contexts = search(
-        query=question,
+    # Cache miss: roteador escolhe a profundidade da busca (no executor de retrieval)
+    route, contexts = await retrieve_with_routing(
+        question,
         top_k=top_k,
         min_sim=min_sim,
         index_dir=index_dir,
-        use_reranking=use_reranking
+        use_reranking=use_reranking,
+        conversation_history=conversation_history,
+        meta=meta,
+        deadline=deadline
     )
     
-    answer = generate_answer(question, contexts, conversation_history=conversation_history)
+    if route == ROUTE_EXTRACTIVE:
+        answer = build_routed_extractive_answer(question, contexts)
+        if meta is not None:
+            meta["answer_mode"] = "extractive"
+    else:
+        answer = await generate_answer(
+            question,
+            contexts,
+            conversation_history=conversation_history,
+            priority=priority,
+            meta=meta,
+            small_model=(route == ROUTE_LIGHT),
+            deadline=deadline
+        )
     
     # Armazena no cache
     if use_cache:
-        cache.set(question, answer, contexts)
+        cache.set(question, answer, contexts, cacheable=is_cacheable_result(meta, deadline))
     
+    if meta is not None and deadline is not None:
+        meta.update(deadline.to_meta())
+    get_router_stats().record(route, (time.perf_counter() - started_at) * 1000)
     return answer, contexts
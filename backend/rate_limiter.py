@@ -0,0 +1,265 @@
+"""
+Rate limiter client-side para provedores LLM com fila de prioridade.
+
+Em vez de descobrir a quota via erros 429, cada geração reserva antes de ser
+enviada:
+- 1 requisição do balde de requests-per-minute (rpm do provedor)
+- N tokens estimados do balde de tokens-per-minute (tpm do provedor)
+
+Quando os baldes estão vazios, as gerações esperam numa fila ordenada por
+prioridade (interativa antes de warmup/batch) e, dentro da mesma prioridade,
+por ordem de chegada. Posição na fila e espera estimada ficam expostas em
+stats() e no `meta` das respostas.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Optional
+
+from . import settings
+
+
+# Prioridades (menor = atendido primeiro)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BATCH: "batch"}
+
+
+class RateLimitExceeded(RuntimeError):
+    """A espera estimada na fila excede o máximo aceitável para a requisição."""
+
+    def __init__(self, estimated_wait_s: float):
+        super().__init__(f"Espera estimada de {estimated_wait_s:.1f}s na fila do LLM")
+        self.estimated_wait_s = estimated_wait_s
+
+
+class TokenBucket:
+    """Balde de tokens com reposição contínua (capacidade = orçamento por minuto)."""
+
+    def __init__(self, capacity: float, refill_per_s: float):
+        self.capacity = capacity
+        self.refill_per_s = refill_per_s
+        self.tokens = capacity
+        self._last = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.refill_per_s)
+        self._last = now
+
+    def available(self) -> float:
+        self._refill()
+        return self.tokens
+
+    def time_until(self, amount: float) -> float:
+        """Segundos até haver `amount` tokens disponíveis (0 se já houver)."""
+        self._refill()
+        missing = min(amount, self.capacity) - self.tokens
+        if missing <= 0:
+            return 0.0
+        return missing / self.refill_per_s
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def drain(self):
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+class Ticket:
+    """Reserva de uma geração na fila do rate limiter."""
+
+    def __init__(self, priority: int, seq: int, tokens: int):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+        self.granted_at: Optional[float] = None
+        self.position = 0  # Posição na fila ao entrar (0 = atendido imediatamente)
+        self.future: Optional[asyncio.Future] = None
+
+    def __lt__(self, other: "Ticket") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    @property
+    def wait_ms(self) -> float:
+        end = self.granted_at if self.granted_at is not None else time.monotonic()
+        return round((end - self.enqueued_at) * 1000, 2)
+
+
+class LLMRateLimiter:
+    """Limita requisições e tokens por minuto com fila de prioridade assíncrona."""
+
+    def __init__(self, rpm: int = 30, tpm: int = 6000):
+        """
+        Args:
+            rpm: Orçamento de requisições por minuto
+            tpm: Orçamento de tokens (prompt + completion) por minuto
+        """
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = TokenBucket(rpm, rpm / 60.0)
+        self._tokens = TokenBucket(tpm, tpm / 60.0)
+        self._heap: list[Ticket] = []
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._granted = 0
+        self._rejected = 0
+        self._rate_limited = 0
+        self._total_wait_ms = 0.0
+        self._paused_until = 0.0  # time.monotonic() até quando o retry-after de um 429 vale
+
+    def _pause_remaining(self) -> float:
+        return max(0.0, self._paused_until - time.monotonic())
+
+    def _wait_for(self, tokens: float) -> float:
+        return max(
+            self._pause_remaining(),
+            self._requests.time_until(1),
+            self._tokens.time_until(tokens)
+        )
+
+    def _pending(self) -> list[Ticket]:
+        return sorted(t for t in self._heap if not t.future.done())
+
+    def estimate_wait(self, tokens: int, priority: int = PRIORITY_INTERACTIVE) -> float:
+        """
+        Estima em segundos quanto uma nova geração esperaria na fila,
+        considerando quem já está à frente (mesma prioridade ou maior).
+        """
+        ahead = [t for t in self._pending() if t.priority <= priority]
+        need_requests = len(ahead) + 1
+        need_tokens = sum(min(t.tokens, self.tpm) for t in ahead) + min(tokens, self.tpm)
+        request_wait = max(0.0, need_requests - self._requests.available()) / self._requests.refill_per_s
+        token_wait = max(0.0, need_tokens - self._tokens.available()) / self._tokens.refill_per_s
+        return max(self._pause_remaining(), request_wait, token_wait)
+
+    async def acquire(
+        self,
+        tokens: int,
+        priority: int = PRIORITY_INTERACTIVE,
+        max_wait_s: Optional[float] = None
+    ) -> Ticket:
+        """
+        Reserva 1 requisição e `tokens` tokens, aguardando na fila se necessário.
+
+        Raises:
+            RateLimitExceeded: se a espera estimada for maior que `max_wait_s`
+        """
+        if max_wait_s is not None:
+            estimated = self.estimate_wait(tokens, priority)
+            if estimated > max_wait_s:
+                self._rejected += 1
+                raise RateLimitExceeded(estimated)
+
+        ticket = Ticket(priority, next(self._seq), tokens)
+        ticket.future = asyncio.get_running_loop().create_future()
+        ticket.position = sum(1 for t in self._pending() if t < ticket)
+        heapq.heappush(self._heap, ticket)
+        self._ensure_dispatcher()
+        self._wakeup.set()
+
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            # Requisição abandonada: devolve a reserva se ela já tinha sido concedida
+            if ticket.granted_at is not None:
+                self.release(ticket, used_tokens=0)
+            raise
+        return ticket
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+
+    async def _dispatch(self):
+        """Libera tickets em ordem de prioridade conforme os baldes se reabastecem."""
+        while self._heap:
+            head = self._heap[0]
+            if head.future.done():
+                heapq.heappop(self._heap)
+                continue
+
+            wait = self._wait_for(head.tokens)
+            if wait <= 0:
+                heapq.heappop(self._heap)
+                self._requests.consume(1)
+                self._tokens.consume(head.tokens)
+                head.granted_at = time.monotonic()
+                self._granted += 1
+                self._total_wait_ms += head.wait_ms
+                head.future.set_result(None)
+                continue
+
+            # Dorme até haver orçamento ou chegar um ticket novo (pode ter prioridade maior)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def release(self, ticket: Ticket, used_tokens: Optional[int] = None):
+        """
+        Ajusta o balde de tokens com o consumo real reportado pela API.
+        Sem `used_tokens`, mantém a estimativa reservada.
+        """
+        if used_tokens is None:
+            return
+        difference = ticket.tokens - used_tokens
+        if difference > 0:
+            self._tokens.refund(difference)
+        elif difference < 0:
+            self._tokens.consume(-difference)
+
+    def on_rate_limited(self, retry_after_s: Optional[float] = None, token_quota: bool = False):
+        """
+        Chamado quando a API responde 429 apesar do limiter.
+
+        Com retry-after, pausa a liberação de tickets até ele expirar e deixa
+        os baldes como estão: a API já disse quanto esperar. O balde de tokens
+        só é esvaziado quando o 429 é de quota de tokens (TPM); sem nenhuma
+        das duas informações, esvazia o balde de requisições.
+        """
+        self._rate_limited += 1
+        if retry_after_s:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after_s)
+        if token_quota:
+            self._tokens.drain()
+        elif not retry_after_s:
+            self._requests.drain()
+
+    def stats(self) -> dict:
+        """Retorna estado dos baldes e da fila."""
+        pending = self._pending()
+        by_priority = {name: 0 for name in PRIORITY_NAMES.values()}
+        for ticket in pending:
+            by_priority[PRIORITY_NAMES.get(ticket.priority, str(ticket.priority))] += 1
+        return {
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "available_requests": round(self._requests.available(), 2),
+            "available_tokens": round(self._tokens.available(), 1),
+            "paused_s": round(self._pause_remaining(), 2),
+            "queued": len(pending),
+            "queued_by_priority": by_priority,
+            "estimated_wait_s": {
+                name: round(self.estimate_wait(settings.LLM_MAX_TOKENS, priority), 2)
+                for priority, name in PRIORITY_NAMES.items()
+            },
+            "granted": self._granted,
+            "rejected": self._rejected,
+            "rate_limited_429": self._rate_limited,
+            "avg_wait_ms": round(self._total_wait_ms / self._granted, 2) if self._granted else 0.0,
+        }
+
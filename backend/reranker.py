@@ -6,6 +6,10 @@ Melhora a relevância dos resultados usando múltiplos sinais.
 from typing import List, Dict
 import re
 
+from .tracing import get_logger, detail_enabled
+
+logger = get_logger(__name__)
+
 
 def calculate_keyword_overlap(query: str, content: str) -> float:
     """
@@ -117,8 +121,10 @@ def rerank_results(
     
     weights = weights or default_weights
     
-    print(f"\n🔄 Re-ranking {len(results)} resultados...")
-    print(f"   Pesos: {weights}")
+    # Saída por candidato só em DEBUG e em requisições amostradas
+    detail = detail_enabled(logger)
+    if detail:
+        logger.debug("🔄 Re-ranking %d resultados (pesos: %s)", len(results), weights)
     
     # Calcula scores compostos
     for i, result in enumerate(results):
@@ -150,16 +156,17 @@ def rerank_results(
             'quality': quality_score
         }
         
-        print(f"   [{i}] Score: {semantic_score:.3f} → {final_score:.3f} "
-              f"(kw:{keyword_score:.2f} pos:{position_score:.2f} qual:{quality_score:.2f})")
+        if detail:
+            logger.debug(
+                "   [%d] Score: %.3f → %.3f (kw:%.2f pos:%.2f qual:%.2f)",
+                i, semantic_score, final_score, keyword_score, position_score, quality_score
+            )
     
     # Re-ordena por score final
     reranked = sorted(results, key=lambda x: x['final_score'], reverse=True)
     
-    print(f"   ✓ Re-ranking concluído")
-    print(f"   Top-3 após re-rank:")
-    for i, result in enumerate(reranked[:3]):
-        print(f"      {i+1}. {result.get('title', 'Unknown')[:40]} "
-              f"(score: {result['final_score']:.3f})")
+    if detail:
+        for i, result in enumerate(reranked[:3]):
+            logger.debug("   Top-%d: %s (score: %.3f)", i + 1, result.get('title', 'Unknown')[:40], result['final_score'])
     
     return reranked
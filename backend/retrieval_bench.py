@@ -0,0 +1,303 @@
+"""
+Benchmark offline do retrieval: qualidade (recall@k, MRR, nDCG) e latência por etapa.
+
+Roda search() sobre um conjunto rotulado de perguntas, sem rede (modelo de
+embedding do cache local do HuggingFace, expansão por LLM desligada), e grava
+um JSON por execução para comparar mudanças em chunking, alpha do
+HybridSearch ou pesos do re-ranking.
+
+Formato do conjunto (JSONL, uma pergunta por linha):
+
+    {"question": "O que é um ponto riscado?",
+     "expected": [{"title": "Livro X", "page": 42}, {"title": "Livro Y"}]}
+
+Um resultado é relevante quando o título coincide e, se `page` for informado,
+a página está entre page_start e page_end do chunk. Sem `page`, qualquer chunk
+do documento conta.
+
+Uso:
+    python -m backend.retrieval_bench --generate 50 --dataset bench/perguntas.jsonl
+    python -m backend.retrieval_bench --dataset bench/perguntas.jsonl
+    python -m backend.retrieval_bench --dataset bench/perguntas.jsonl --alpha 0.5 \\
+        --compare bench_results/retrieval-base.json
+
+--generate cria um conjunto sintético "known-item" (primeira sentença de
+chunks sorteados → documento/página do chunk); útil como linha de base, mas
+um conjunto escrito à mão mede melhor perguntas reais.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Sem rede: o modelo precisa estar no cache local do HuggingFace
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+from . import settings
+
+DEFAULT_KS = (1, 3, 5, 8)
+
+
+def load_dataset(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        items = [json.loads(line) for line in f if line.strip()]
+    for i, item in enumerate(items):
+        if not item.get("question") or not item.get("expected"):
+            raise ValueError(f"Linha {i + 1} de {path}: 'question' e 'expected' são obrigatórios")
+    return items
+
+
+def generate_dataset(path: str, count: int, seed: int = 13):
+    """Gera perguntas known-item a partir de chunks sorteados do índice."""
+    from .chunking import split_into_sentences
+    from .rag import get_index
+
+    _, metadata = get_index(settings.INDEX_DIR)
+    titles = {doc["document_id"]: doc.get("title", "Unknown") for doc in metadata.get("documents", [])}
+    chunks = metadata.get("chunks", [])
+    rng = random.Random(seed)
+
+    items = []
+    for chunk in rng.sample(chunks, min(count * 3, len(chunks))):
+        sentences = [s for s in split_into_sentences(chunk["content"]) if 40 <= len(s) <= 300]
+        if not sentences:
+            continue
+        items.append({
+            "question": sentences[0],
+            "expected": [{"title": titles.get(chunk["document_id"], "Unknown"), "page": chunk["page_start"]}],
+            "synthetic": True,
+        })
+        if len(items) >= count:
+            break
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for item in items:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+    print(f"✓ {len(items)} perguntas sintéticas gravadas em {path}")
+
+
+def is_relevant(result: dict, expected: dict) -> bool:
+    if result.get("title") != expected.get("title"):
+        return False
+    page = expected.get("page")
+    if page is None:
+        return True
+    try:
+        return int(result["page_start"]) <= int(page) <= int(result["page_end"])
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+def score_question(results: list[dict], expected: list[dict], ks: tuple) -> dict:
+    """recall@k (fração dos alvos cobertos), MRR e nDCG@k com relevância binária."""
+    # Para cada posição, quais alvos ela cobre
+    covers = [{i for i, target in enumerate(expected) if is_relevant(r, target)} for r in results]
+
+    first_hit = next((rank for rank, hits in enumerate(covers, start=1) if hits), None)
+    scores = {"mrr": 1.0 / first_hit if first_hit else 0.0, "first_hit_rank": first_hit}
+    for k in ks:
+        found = set().union(*covers[:k]) if covers[:k] else set()
+        scores[f"recall@{k}"] = len(found) / len(expected)
+
+        # Ganho só na primeira vez que cada alvo aparece (repetições não contam)
+        seen, dcg = set(), 0.0
+        for rank, hits in enumerate(covers[:k], start=1):
+            new = hits - seen
+            if new:
+                dcg += 1.0 / math.log2(rank + 1)
+                seen |= new
+        ideal = sum(1.0 / math.log2(rank + 1) for rank in range(1, min(k, len(expected)) + 1))
+        scores[f"ndcg@{k}"] = dcg / ideal if ideal else 0.0
+    return scores
+
+
+def percentile(values: list[float], p: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))], 2)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmark(items: list[dict], args) -> dict:
+    from .memory import memory_report
+    from .rag import load_embedder, get_index, search
+    from .timing import start_request_timer
+
+    load_embedder()
+    get_index(settings.INDEX_DIR)
+
+    # Aquecimento: carrega BM25 e caminhos frios fora das medidas
+    search(items[0]["question"], top_k=args.top_k, min_sim=args.min_sim, index_dir=settings.INDEX_DIR)
+
+    per_question = []
+    stage_samples: dict[str, list[float]] = {}
+    for item in items:
+        timer = start_request_timer()
+        started_at = time.perf_counter()
+        results = search(
+            item["question"],
+            top_k=args.top_k,
+            min_sim=args.min_sim,
+            index_dir=settings.INDEX_DIR,
+            use_reranking=not args.no_rerank,
+            use_hybrid=not args.no_hybrid,
+            use_query_expansion=not args.no_expansion,
+        )
+        timer.add("total", (time.perf_counter() - started_at) * 1000)
+        durations = timer.durations()
+        for stage, ms in durations.items():
+            stage_samples.setdefault(stage, []).append(ms)
+
+        scores = score_question(results, item["expected"], args.ks)
+        per_question.append({
+            "question": item["question"],
+            **scores,
+            "num_results": len(results),
+            "timings_ms": {stage: round(ms, 2) for stage, ms in durations.items()},
+        })
+
+    n = len(per_question)
+    quality = {"mrr": round(sum(q["mrr"] for q in per_question) / n, 4)}
+    for k in args.ks:
+        quality[f"recall@{k}"] = round(sum(q[f"recall@{k}"] for q in per_question) / n, 4)
+        quality[f"ndcg@{k}"] = round(sum(q[f"ndcg@{k}"] for q in per_question) / n, 4)
+
+    latency = {
+        stage: {
+            "p50_ms": percentile(values, 0.50),
+            "p95_ms": percentile(values, 0.95),
+            "mean_ms": round(sum(values) / len(values), 2),
+            "count": len(values),
+        }
+        for stage, values in stage_samples.items()
+    }
+    memory = memory_report(include_allocators=False)
+
+    return {
+        "run": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": git_revision(),
+            "dataset": args.dataset,
+            "questions": n,
+            "config": {
+                "top_k": args.top_k,
+                "min_sim": args.min_sim,
+                "hybrid_alpha": settings.HYBRID_ALPHA,
+                "faiss_index": settings.FAISS_INDEX_FACTORY,
+                "ef_search": settings.FAISS_EF_SEARCH,
+                "nprobe": settings.FAISS_NPROBE,
+                "dense_retriever": settings.DENSE_RETRIEVER,
+                "rerank": not args.no_rerank,
+                "hybrid": not args.no_hybrid,
+                "query_expansion": not args.no_expansion,
+                "embedding_model": settings.EMBEDDING_MODEL,
+                "index_dir": settings.INDEX_DIR,
+            },
+        },
+        "quality": quality,
+        "latency": latency,
+        "memory": {"rss_bytes": memory["rss_bytes"], "components": memory["components"]},
+        "per_question": per_question,
+    }
+
+
+def compare(current: dict, baseline_path: str, tolerance: float) -> bool:
+    """Mostra a diferença para uma execução anterior; False se alguma métrica de qualidade caiu além da tolerância."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    print(f"\n📐 Comparação com {baseline_path} ({baseline['run'].get('git_revision')})")
+    ok = True
+    for metric, value in current["quality"].items():
+        before = baseline["quality"].get(metric)
+        if before is None:
+            continue
+        delta = value - before
+        flag = ""
+        if delta < -tolerance:
+            flag = "  ⚠️ regressão"
+            ok = False
+        print(f"   {metric:<12} {before:.4f} → {value:.4f} ({delta:+.4f}){flag}")
+    for stage, stats in current["latency"].items():
+        before = baseline["latency"].get(stage)
+        if before and before.get("p95_ms") and stats.get("p95_ms") is not None:
+            print(f"   {stage + ' p95':<12} {before['p95_ms']:.1f}ms → {stats['p95_ms']:.1f}ms")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline do retrieval (recall@k, MRR, nDCG, latência)")
+    parser.add_argument("--dataset", required=True, help="JSONL com question/expected")
+    parser.add_argument("--generate", type=int, metavar="N", help="Gera N perguntas sintéticas em --dataset e sai")
+    parser.add_argument("--top-k", type=int, default=settings.TOP_K)
+    parser.add_argument("--min-sim", type=float, default=settings.MIN_SIM)
+    parser.add_argument("--ks", default=",".join(map(str, DEFAULT_KS)), help="Cortes de recall/nDCG (ex.: 1,3,5,8)")
+    parser.add_argument("--alpha", type=float, help="Sobrescreve HYBRID_ALPHA")
+    parser.add_argument("--ef-search", type=int, help="Sobrescreve FAISS_EF_SEARCH (índices HNSW)")
+    parser.add_argument("--nprobe", type=int, help="Sobrescreve FAISS_NPROBE (índices IVF)")
+    parser.add_argument("--dense-retriever", choices=["faiss", "binary"], help="Sobrescreve DENSE_RETRIEVER")
+    parser.add_argument("--no-rerank", action="store_true")
+    parser.add_argument("--no-hybrid", action="store_true")
+    parser.add_argument("--no-expansion", action="store_true")
+    parser.add_argument("--output", help="Arquivo JSON de saída (padrão: bench_results/retrieval-<data>.json)")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.01, help="Queda máxima aceita por métrica no --compare")
+    args = parser.parse_args()
+    args.ks = tuple(int(k) for k in args.ks.split(","))
+
+    # Nada de rede: expansão só por sinônimos
+    settings.ENABLE_LLM_EXPANSION = False
+    if args.alpha is not None:
+        settings.HYBRID_ALPHA = args.alpha
+    if args.ef_search:
+        settings.FAISS_EF_SEARCH = args.ef_search
+    if args.nprobe:
+        settings.FAISS_NPROBE = args.nprobe
+    if args.dense_retriever:
+        settings.DENSE_RETRIEVER = args.dense_retriever
+
+    if args.generate:
+        generate_dataset(args.dataset, args.generate)
+        return
+
+    items = load_dataset(args.dataset)
+    print(f"🔬 {len(items)} perguntas de {args.dataset}")
+    report = run_benchmark(items, args)
+
+    print("\n📊 Qualidade")
+    for metric, value in report["quality"].items():
+        print(f"   {metric:<12} {value:.4f}")
+    print("\n⏱️ Latência por etapa")
+    for stage, stats in report["latency"].items():
+        print(f"   {stage:<12} p50={stats['p50_ms']}ms  p95={stats['p95_ms']}ms  (n={stats['count']})")
+    print(f"\n🧠 RSS: {report['memory']['rss_bytes'] / 1024 / 1024:.1f} MB")
+
+    output = args.output or f"bench_results/retrieval-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✓ Resultado gravado em {output}")
+
+    if args.compare and not compare(report, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Roteador de consultas: escolhe a profundidade do pipeline por pergunta.
+
+Rotas (da mais barata para a mais cara):
+- cached: resposta já está no cache
+- extractive: consulta direta com um chunk dominante; resposta extrativa,
+  sem chamar o LLM
+- light: busca densa confiante; pula expansão, BM25 e re-ranking e gera com
+  o modelo pequeno (LLM_SMALL_MODEL)
+- full: expansão + dense + hybrid + re-ranking + modelo principal
+
+A decisão usa heurísticas no estilo de should_expand_query() (tamanho e tipo
+da pergunta) e a margem entre os dois melhores scores de uma busca densa
+barata (sem expansão). Contagem e latência por rota ficam em /router/stats.
+"""
+
+from collections import deque
+from typing import Optional
+
+from . import settings
+from .query_expansion import should_expand_query
+
+
+ROUTE_CACHED = "cached"
+ROUTE_EXTRACTIVE = "extractive"
+ROUTE_LIGHT = "light"
+ROUTE_FULL = "full"
+
+ROUTES = (ROUTE_CACHED, ROUTE_EXTRACTIVE, ROUTE_LIGHT, ROUTE_FULL)
+
+# Perguntas que pedem síntese/raciocínio sempre vão para o pipeline completo
+COMPLEX_INDICATORS = (
+    "diferença entre", "diferenças entre", "compare", "comparar", "relação entre",
+    "por que", "porque", "como fazer", "passo a passo", "explique", "explica",
+    "aprofunde", "detalhe",
+)
+
+
+def classify_query(
+    question: str,
+    probe_results: list[dict],
+    has_history: bool = False
+) -> tuple[str, str]:
+    """
+    Classifica a pergunta em uma rota a partir da busca densa de sondagem.
+
+    Args:
+        question: Pergunta do usuário
+        probe_results: Resultados da busca densa (sem expansão/hybrid/re-ranking)
+        has_history: Se há histórico (perguntas de seguimento dependem dele)
+
+    Returns:
+        Tupla (rota, motivo)
+    """
+    if not settings.ROUTER_ENABLED:
+        return ROUTE_FULL, "router desabilitado"
+    if has_history:
+        return ROUTE_FULL, "pergunta de seguimento"
+    if not probe_results:
+        return ROUTE_FULL, "sem resultados densos (expansão pode recuperar)"
+
+    question_lower = question.lower()
+    if any(indicator in question_lower for indicator in COMPLEX_INDICATORS):
+        return ROUTE_FULL, "pergunta complexa"
+
+    top1 = probe_results[0].get("score", 0.0)
+    top2 = probe_results[1].get("score", 0.0) if len(probe_results) > 1 else 0.0
+    margin = top1 - top2
+    words = len(question.split())
+
+    if (
+        settings.ROUTER_EXTRACTIVE
+        and words <= settings.ROUTER_LOOKUP_MAX_WORDS
+        and top1 >= settings.ROUTER_EXTRACTIVE_MIN_SIM
+        and margin >= settings.ROUTER_EXTRACTIVE_MARGIN
+    ):
+        return ROUTE_EXTRACTIVE, f"consulta direta com chunk dominante (top1={top1:.2f}, margem={margin:.2f})"
+
+    if top1 >= settings.ROUTER_LIGHT_MIN_SIM and margin >= settings.ROUTER_LIGHT_MARGIN:
+        return ROUTE_LIGHT, f"busca densa confiante (top1={top1:.2f}, margem={margin:.2f})"
+
+    if should_expand_query(question):
+        return ROUTE_FULL, "pergunta genérica (beneficia de expansão)"
+    return ROUTE_FULL, f"busca densa ambígua (top1={top1:.2f}, margem={margin:.2f})"
+
+
+class RouterStats:
+    """Contagem e latência (média, p50, p95) por rota."""
+
+    def __init__(self, window: int = 500):
+        self._counts = {route: 0 for route in ROUTES}
+        self._latencies = {route: deque(maxlen=window) for route in ROUTES}
+
+    def record(self, route: str, elapsed_ms: float):
+        self._counts[route] = self._counts.get(route, 0) + 1
+        self._latencies.setdefault(route, deque(maxlen=500)).append(elapsed_ms)
+
+    @staticmethod
+    def _percentile(ordered: list, p: float) -> Optional[float]:
+        if not ordered:
+            return None
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))], 2)
+
+    def stats(self) -> dict:
+        """Retorna, por rota, contagem, fração do tráfego e latências."""
+        total = sum(self._counts.values())
+        routes = {}
+        for route, count in self._counts.items():
+            ordered = sorted(self._latencies[route])
+            routes[route] = {
+                "count": count,
+                "share": round(count / total, 3) if total else 0.0,
+                "avg_ms": round(sum(ordered) / len(ordered), 2) if ordered else None,
+                "p50_ms": self._percentile(ordered, 0.50),
+                "p95_ms": self._percentile(ordered, 0.95),
+            }
+        return {"enabled": settings.ROUTER_ENABLED, "total": total, "routes": routes}
+
+
+# Instância global (singleton)
+_router_stats: Optional[RouterStats] = None
+
+
+def get_router_stats() -> RouterStats:
+    """Retorna as estatísticas globais do roteador."""
+    global _router_stats
+    if _router_stats is None:
+        _router_stats = RouterStats()
+    return _router_stats
@@ -24,6 +24,107 @@ GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "")
 GROQ_API_KEY: str = os.getenv("GROQ_API_KEY", "")
 GROQ_MODEL: str = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
 GROQ_BASE_URL: str = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+LLM_TIMEOUT_S: float = float(os.getenv("LLM_TIMEOUT_S", "30"))
+LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_TOKENS: int = int(os.getenv("LLM_MAX_TOKENS", "800"))
+
+# Orçamento de tokens do prompt (contextos + histórico)
+# LLM_TOKENIZER é um encoding do tiktoken usado como APROXIMAÇÃO: o Llama 3 tem
+# tokenizer próprio, e o cl100k_base diverge dele em ~10-15% em texto em português
+# (sem tiktoken, a estimativa de 4 caracteres por token erra ~30%). Deixe essa
+# folga em CONTEXT_TOKEN_BUDGET e nos orçamentos TPM dos provedores.
+LLM_TOKENIZER: str = os.getenv("LLM_TOKENIZER", "cl100k_base")
+CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2500"))
+HISTORY_TOKEN_BUDGET: int = int(os.getenv("HISTORY_TOKEN_BUDGET", "400"))
+
+# Rate limit client-side do Groq (orçamentos por minuto do plano)
+GROQ_RPM: int = int(os.getenv("GROQ_RPM", "30"))
+GROQ_TPM: int = int(os.getenv("GROQ_TPM", "6000"))
+LLM_QUEUE_MAX_WAIT_S: float = float(os.getenv("LLM_QUEUE_MAX_WAIT_S", "20"))
+
+# Circuit breaker do provedor LLM
+LLM_BREAKER_FAILURES: int = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RECOVERY_S: float = float(os.getenv("LLM_BREAKER_RECOVERY_S", "30"))
+
+# Provedores LLM (JSON com lista ordenada; vazio = só Groq via GROQ_*) e hedging
+LLM_PROVIDERS: str = os.getenv("LLM_PROVIDERS", "")
+LLM_HEDGING: bool = os.getenv("LLM_HEDGING", "true").lower() == "true"
+LLM_HEDGE_DELAY_S: float = float(os.getenv("LLM_HEDGE_DELAY_S", "2.0"))
+LLM_HEDGE_MIN_SAMPLES: int = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+# Prazo de ponta a ponta por requisição (o frontend desiste em 30s)
+REQUEST_DEADLINE_S: float = float(os.getenv("REQUEST_DEADLINE_S", "25"))
+DEADLINE_LLM_RESERVE_S: float = float(os.getenv("DEADLINE_LLM_RESERVE_S", "12"))
+DEADLINE_MIN_LLM_S: float = float(os.getenv("DEADLINE_MIN_LLM_S", "3"))
+
+# Retrieval executor (pool de threads para embedding/FAISS/BM25)
+RETRIEVAL_WORKERS: int = int(os.getenv("RETRIEVAL_WORKERS", "2"))
+RETRIEVAL_MAX_QUEUE: int = int(os.getenv("RETRIEVAL_MAX_QUEUE", "32"))
+
+# Resposta extrativa quando o LLM está sem quota/indisponível
+EXTRACTIVE_FALLBACK: bool = os.getenv("EXTRACTIVE_FALLBACK", "true").lower() == "true"
+EXTRACTIVE_MAX_SENTENCES: int = int(os.getenv("EXTRACTIVE_MAX_SENTENCES", "4"))
+
+# Roteador de consultas (profundidade do pipeline por pergunta)
+ROUTER_ENABLED: bool = os.getenv("ROUTER_ENABLED", "true").lower() == "true"
+ROUTER_EXTRACTIVE: bool = os.getenv("ROUTER_EXTRACTIVE", "true").lower() == "true"
+ROUTER_LOOKUP_MAX_WORDS: int = int(os.getenv("ROUTER_LOOKUP_MAX_WORDS", "6"))
+ROUTER_EXTRACTIVE_MIN_SIM: float = float(os.getenv("ROUTER_EXTRACTIVE_MIN_SIM", "0.75"))
+ROUTER_EXTRACTIVE_MARGIN: float = float(os.getenv("ROUTER_EXTRACTIVE_MARGIN", "0.10"))
+ROUTER_LIGHT_MIN_SIM: float = float(os.getenv("ROUTER_LIGHT_MIN_SIM", "0.55"))
+ROUTER_LIGHT_MARGIN: float = float(os.getenv("ROUTER_LIGHT_MARGIN", "0.05"))
+ROUTER_LIGHT_TOP_K: int = int(os.getenv("ROUTER_LIGHT_TOP_K", "4"))
+LLM_SMALL_MODEL: str = os.getenv("LLM_SMALL_MODEL", "llama-3.1-8b-instant")
+
+# Logging estruturado (trace id por requisição)
+LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text").lower()  # text | json
+LOG_DEBUG_SAMPLE_RATE: float = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.1"))
+
+# Endpoints administrativos (header X-Admin-Token); vazio desabilita
+ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+
+# Profiling por amostragem de /ask (ver backend/profiling.py)
+PROFILE_DIR: str = os.getenv("PROFILE_DIR", "backend/data/profiles")
+PROFILE_INTERVAL_MS: float = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_SLOW_MS: float = float(os.getenv("PROFILE_SLOW_MS", "0"))  # 0 = só sob demanda
+PROFILE_MAX_FILES: int = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+# Contabilidade de memória (ver backend/memory.py)
+MEMORY_SAMPLE_INTERVAL_S: float = float(os.getenv("MEMORY_SAMPLE_INTERVAL_S", "300"))  # 0 desabilita
+MEMORY_HISTORY_PATH: str = os.getenv("MEMORY_HISTORY_PATH", "backend/data/memory_history.jsonl")
+# Relatórios mantidos no histórico (~1-2 KB cada; 2016 = 7 dias a cada 300s). 0 = sem limite
+MEMORY_HISTORY_MAX_ENTRIES: int = int(os.getenv("MEMORY_HISTORY_MAX_ENTRIES", "2016"))
+MEMORY_TRACEMALLOC: bool = os.getenv("MEMORY_TRACEMALLOC", "false").lower() == "true"
+MEMORY_TRACEMALLOC_FRAMES: int = int(os.getenv("MEMORY_TRACEMALLOC_FRAMES", "1"))
+
+# Entradas do cache de respostas (0 desliga o cache)
+RESPONSE_CACHE_SIZE: int = int(os.getenv("RESPONSE_CACHE_SIZE", "100"))
+
+# Peso da busca densa na fusão com o BM25 (1-alpha para o BM25)
+HYBRID_ALPHA: float = float(os.getenv("HYBRID_ALPHA", "0.65"))
+
+# Tipo do índice vetorial (string do faiss.index_factory: Flat, HNSW32, IVF256,Flat...)
+FAISS_INDEX_FACTORY: str = os.getenv("FAISS_INDEX_FACTORY", "Flat")
+FAISS_EF_SEARCH: int = int(os.getenv("FAISS_EF_SEARCH", "64"))
+FAISS_NPROBE: int = int(os.getenv("FAISS_NPROBE", "16"))
+FAISS_RECALL_SAMPLE: int = int(os.getenv("FAISS_RECALL_SAMPLE", "200"))
+# Índices quantizados (SQ8, PQ...): re-score exato de top_k × fator candidatos (0 desliga)
+FAISS_RESCORE_FACTOR: int = int(os.getenv("FAISS_RESCORE_FACTOR", "0"))
+# Busca densa: "faiss" (índice acima) ou "binary" (Hamming + re-score exato de BINARY_CANDIDATES).
+# "binary" precisa de vectors.npy no INDEX_DIR (gravado na ingestão/rebuild) e então não carrega
+# o index.faiss; sem o arquivo, avisa e continua no índice FAISS
+DENSE_RETRIEVER: str = os.getenv("DENSE_RETRIEVER", "faiss").lower()
+BINARY_CANDIDATES: int = int(os.getenv("BINARY_CANDIDATES", "200"))
+
+# Registro de consultas do /ask para replay e simulações (rotacionado)
+QUERY_TRACE_ENABLED: bool = os.getenv("QUERY_TRACE_ENABLED", "false").lower() == "true"
+QUERY_TRACE_PATH: str = os.getenv("QUERY_TRACE_PATH", "backend/data/traces/queries.jsonl")
+QUERY_TRACE_MAX_MB: float = float(os.getenv("QUERY_TRACE_MAX_MB", "50"))
+QUERY_TRACE_BACKUPS: int = int(os.getenv("QUERY_TRACE_BACKUPS", "5"))
+# Grava só o hash (com sal) da pergunta normalizada, nunca o texto
+QUERY_TRACE_HASH_QUESTIONS: bool = os.getenv("QUERY_TRACE_HASH_QUESTIONS", "false").lower() == "true"
+QUERY_TRACE_SALT: str = os.getenv("QUERY_TRACE_SALT", "")
 
 # Features
 ENABLE_LLM_EXPANSION: bool = os.getenv("ENABLE_LLM_EXPANSION", "false").lower() == "true"
@@ -0,0 +1,89 @@
+"""
+Breakdown de latência por etapa do pipeline.
+
+Cada requisição /ask cria um StageTimer que fica num contextvar: as etapas
+(cache, expansão, embedding, FAISS, BM25/fusão, re-ranking, prompt, LLM)
+registram sua duração com `timed("etapa")` sem precisar receber o timer por
+parâmetro. O executor de retrieval copia o contexto para a thread da busca,
+então o mesmo timer acumula as etapas que rodam fora do event loop.
+
+O resultado vai para `meta["timings"]` e para o header Server-Timing
+(visível na aba Network/Timing do devtools do navegador).
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+
+class StageTimer:
+    """Acumula a duração (ms) de cada etapa de uma requisição."""
+
+    def __init__(self):
+        self._stages: dict[str, float] = {}  # Ordem de primeira ocorrência
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, elapsed_ms: float):
+        """Soma `elapsed_ms` à etapa (ex.: embedding de várias queries expandidas)."""
+        with self._lock:
+            self._stages[stage] = self._stages.get(stage, 0.0) + elapsed_ms
+
+    @contextmanager
+    def stage(self, stage: str):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, (time.perf_counter() - started_at) * 1000)
+
+    def get(self, stage: str) -> Optional[float]:
+        return self._stages.get(stage)
+
+    def durations(self) -> dict[str, float]:
+        """Cópia das durações acumuladas ({etapa: ms})."""
+        with self._lock:
+            return dict(self._stages)
+
+    def to_meta(self) -> dict:
+        """Durações no formato de `meta["timings"]` ({etapa}_ms)."""
+        with self._lock:
+            return {f"{stage}_ms": round(ms, 2) for stage, ms in self._stages.items()}
+
+    def server_timing(self) -> str:
+        """Valor do header Server-Timing (ex.: 'embedding;dur=12.3, faiss;dur=0.8')."""
+        with self._lock:
+            return ", ".join(f"{stage};dur={ms:.2f}" for stage, ms in self._stages.items())
+
+
+_current_timer: ContextVar[Optional[StageTimer]] = ContextVar("stage_timer", default=None)
+
+
+def start_request_timer() -> StageTimer:
+    """Cria o timer da requisição atual e o torna visível para as etapas."""
+    timer = StageTimer()
+    _current_timer.set(timer)
+    return timer
+
+
+def current_timer() -> Optional[StageTimer]:
+    return _current_timer.get()
+
+
+@contextmanager
+def timed(stage: str):
+    """Mede a etapa no timer da requisição atual (no-op fora de uma requisição)."""
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    with timer.stage(stage):
+        yield
+
+
+def record_stage(stage: str, elapsed_ms: float):
+    """Registra uma duração já medida no timer da requisição atual."""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.add(stage, elapsed_ms)
@@ -0,0 +1,104 @@
+"""
+Logging estruturado com trace id por requisição.
+
+- Cada requisição HTTP recebe um trace id (X-Request-ID do cliente ou um novo)
+  guardado num contextvar; o executor de retrieval copia o contexto para as
+  threads, então todas as linhas da requisição saem com o mesmo id
+- Nível global em LOG_LEVEL; LOG_FORMAT=json emite uma linha JSON por evento
+  (campos extras passados em `extra=` viram chaves do objeto)
+- Saída detalhada por candidato (re-ranking, fusão) só em DEBUG e apenas para
+  uma fração das requisições (LOG_DEBUG_SAMPLE_RATE), decidida uma vez por
+  requisição para que o rastro de uma requisição amostrada venha completo
+
+Os módulos usam `logger = get_logger(__name__)` e mensagens no estilo
+`logger.info("✓ ... %s", valor)`: com o nível desabilitado, nenhuma string é
+formatada.
+"""
+
+import json
+import logging
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+from . import settings
+
+
+_trace_id: ContextVar[str] = ContextVar("trace_id", default="-")
+_trace_sampled: ContextVar[bool] = ContextVar("trace_sampled", default=False)
+
+# Atributos padrão de LogRecord (o resto veio de `extra=` e vai para o JSON)
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "trace_id"}
+
+_configured = False
+
+
+def start_trace(incoming_id: Optional[str] = None) -> str:
+    """Define o trace id da requisição atual e sorteia se ela terá log detalhado."""
+    trace_id = (incoming_id or "").strip()[:64] or uuid.uuid4().hex[:16]
+    _trace_id.set(trace_id)
+    _trace_sampled.set(random.random() < settings.LOG_DEBUG_SAMPLE_RATE)
+    return trace_id
+
+
+def current_trace_id() -> str:
+    return _trace_id.get()
+
+
+def detail_enabled(logger: logging.Logger) -> bool:
+    """
+    Indica se a saída por candidato deve ser emitida: DEBUG habilitado e
+    requisição amostrada. Use antes de loops de log para não formatar nada.
+    """
+    return logger.isEnabledFor(logging.DEBUG) and _trace_sampled.get()
+
+
+class _TraceIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = _trace_id.get()
+        return True
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "trace_id": getattr(record, "trace_id", "-"),
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def configure_logging():
+    """Configura o logger raiz da aplicação ("aiye"); idempotente."""
+    global _configured
+    if _configured:
+        return
+    _configured = True
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.addFilter(_TraceIdFilter())
+    if settings.LOG_FORMAT == "json":
+        handler.setFormatter(_JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)-5s [%(trace_id)s] %(message)s"))
+
+    root = logging.getLogger("aiye")
+    root.addHandler(handler)
+    root.setLevel(settings.LOG_LEVEL)
+    root.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger do módulo sob a hierarquia "aiye" (ex.: aiye.rag, aiye.reranker)."""
+    configure_logging()
+    return logging.getLogger(f"aiye.{name.rsplit('.', 1)[-1]}")
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Testes do rate limiter do LLM (backend/rate_limiter.py) para 429 da API
+
+Uso:
+    python test_rate_limiter.py
+    # ou: python -m pytest test_rate_limiter.py
+
+Não precisa do backend rodando nem de provedor LLM configurado.
+"""
+
+import asyncio
+import time
+
+from backend.rate_limiter import LLMRateLimiter
+
+
+def test_429_with_retry_after_pauses_without_draining():
+    """429 com retry-after pausa a fila só pelo retry-after e não esvazia os baldes"""
+    limiter = LLMRateLimiter(rpm=30, tpm=6000)
+    assert limiter.estimate_wait(1440) == 0.0
+
+    limiter.on_rate_limited(retry_after_s=1.0)
+
+    stats = limiter.stats()
+    assert stats["available_requests"] == 30
+    assert stats["available_tokens"] == 6000
+    wait = limiter.estimate_wait(1440)
+    assert 0.9 < wait <= 1.0, f"espera estimada {wait:.2f}s deveria ser o retry-after (1s)"
+
+
+def test_429_with_retry_after_holds_dispatch():
+    """Nenhum ticket é liberado antes do retry-after expirar, e logo depois sim"""
+    async def scenario():
+        limiter = LLMRateLimiter(rpm=30, tpm=6000)
+        limiter.on_rate_limited(retry_after_s=0.3)
+        start = time.monotonic()
+        await limiter.acquire(1440, max_wait_s=5)
+        return time.monotonic() - start
+
+    elapsed = asyncio.run(scenario())
+    assert 0.25 <= elapsed < 0.6, f"ticket liberado em {elapsed:.2f}s (retry-after de 0.3s)"
+
+
+def test_429_token_quota_drains_tokens():
+    """429 de quota de tokens esvazia o balde de tokens"""
+    limiter = LLMRateLimiter(rpm=30, tpm=6000)
+    limiter.on_rate_limited(retry_after_s=1.0, token_quota=True)
+
+    assert limiter.stats()["available_tokens"] < 1
+    assert limiter.estimate_wait(1440) > 14
+
+
+if __name__ == "__main__":
+    tests = [
+        test_429_with_retry_after_pauses_without_draining,
+        test_429_with_retry_after_holds_dispatch,
+        test_429_token_quota_drains_tokens,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__doc__}: {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} testes passaram")
+    raise SystemExit(1 if failed else 0)